@@ -0,0 +1,376 @@
+import asyncio
+import signal
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import asyncpg
+import grpc
+from prometheus_client import Counter
+
+from proto import service_pb2, service_pb2_grpc
+from redis.exceptions import RedisError
+
+from db_pool import DB_QUERY_LATENCY, statement_kind
+from projection import SUPPLIER_COLUMNS, select_list, supplier_columns
+from rpc_metrics import AsyncRpcMetricsInterceptor, wrap_handler
+from tracing import AsyncRpcTracingInterceptor, record_db_span
+from search import search_query
+from events import RETURNED_COLUMNS, supplier_event, upsert_event
+
+GRPC_REJECTED = Counter('grpc_rejected_requests_total', 'RPCs rejected with RESOURCE_EXHAUSTED before running',
+                        ['method', 'reason'])
+
+
+# Parse "GetSuppliers=4,GetSuppliersPage=32" into per-method concurrency limits
+def parse_method_limits(value):
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        method, limit = item.split('=', 1)
+        limits[method.strip()] = int(limit)
+    return limits
+
+
+# Server-side keepalive: ping idle clients, and accept the gateway's keepalive
+# pings (GRPC keepalive_time_ms=30000) instead of answering them with GOAWAY
+def server_options(keepalive_ms=30000, min_ping_interval_ms=10000, max_connection_idle_ms=0):
+    options = [
+        ('grpc.keepalive_time_ms', keepalive_ms),
+        ('grpc.keepalive_timeout_ms', 10000),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.min_recv_ping_interval_without_data_ms', min_ping_interval_ms),
+        ('grpc.http2.max_ping_strikes', 0),
+    ]
+    if max_connection_idle_ms:
+        options.append(('grpc.max_connection_idle_ms', max_connection_idle_ms))
+    return options
+
+
+# Compress the response of this call with gzip when it is worth it. gRPC only
+# uses an algorithm the client listed in grpc-accept-encoding, otherwise the
+# message goes out uncompressed, so this is negotiated per call.
+def compress_if_large(context, message, min_bytes):
+    if min_bytes and message.ByteSize() >= min_bytes:
+        context.set_compression(grpc.Compression.Gzip)
+    return message
+
+
+# grpc.aio only applies set_compression to a unary response if the initial
+# metadata is sent after it, so send it explicitly
+async def compress_if_large_aio(context, message, min_bytes):
+    if min_bytes and message.ByteSize() >= min_bytes:
+        context.set_compression(grpc.Compression.Gzip)
+        await context.send_initial_metadata(())
+    return message
+
+
+# asyncpg records carry their column names, so a projected row sets only the selected fields
+def _supplier(row):
+    return service_pb2.Supplier(**dict(row))
+
+
+# Rejects a call immediately with RESOURCE_EXHAUSTED once its method already has
+# `limit` calls in flight, so an expensive method cannot take every DB connection.
+# This one is for the threaded server, where a running call also holds one of the
+# GRPC_WORKERS threads: StreamSuppliers holds it for the whole export.
+class ConcurrencyLimitInterceptor(grpc.ServerInterceptor):
+    def __init__(self, limits):
+        self._slots = {method: threading.BoundedSemaphore(limit) for method, limit in limits.items()}
+
+    def intercept_service(self, continuation, handler_call_details):
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        slots = self._slots.get(method)
+        handler = continuation(handler_call_details)
+        if slots is None:
+            return handler
+
+        def acquire(context):
+            if not slots.acquire(blocking=False):
+                GRPC_REJECTED.labels(method=method, reason='method_limit').inc()
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"too many concurrent {method} calls")
+
+        def unary(behavior):
+            def limited(request, context):
+                acquire(context)
+                try:
+                    return behavior(request, context)
+                finally:
+                    slots.release()
+            return limited
+
+        def stream(behavior):
+            def limited(request, context):
+                acquire(context)
+                try:
+                    yield from behavior(request, context)
+                finally:
+                    slots.release()
+            return limited
+
+        return wrap_handler(handler, unary, stream)
+
+
+# The same for grpc.aio
+class AsyncConcurrencyLimitInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, limits):
+        self._limits = dict(limits)
+        self._in_flight = defaultdict(int)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        limit = self._limits.get(method)
+        if handler is None or limit is None:
+            return handler
+
+        async def reject_if_full(context):
+            if self._in_flight[method] >= limit:
+                GRPC_REJECTED.labels(method=method, reason='method_limit').inc()
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"too many concurrent {method} calls")
+
+        if handler.unary_unary is not None:
+            behavior = handler.unary_unary
+
+            async def limited(request, context):
+                await reject_if_full(context)
+                self._in_flight[method] += 1
+                try:
+                    return await behavior(request, context)
+                finally:
+                    self._in_flight[method] -= 1
+
+            return grpc.unary_unary_rpc_method_handler(limited, request_deserializer=handler.request_deserializer,
+                                                       response_serializer=handler.response_serializer)
+
+        if handler.unary_stream is not None:
+            behavior = handler.unary_stream
+
+            async def limited_stream(request, context):
+                await reject_if_full(context)
+                self._in_flight[method] += 1
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                finally:
+                    self._in_flight[method] -= 1
+
+            return grpc.unary_stream_rpc_method_handler(limited_stream,
+                                                        request_deserializer=handler.request_deserializer,
+                                                        response_serializer=handler.response_serializer)
+        return handler
+
+
+# DB_QUERY_LATENCY and statement spans for asyncpg: every pooled connection
+# reports its queries to a logger, called with the context of the RPC
+def _observe_query(record):
+    kind = statement_kind(record.query)
+    DB_QUERY_LATENCY.labels(statement=kind).observe(record.elapsed)
+    record_db_span(kind, record.elapsed)
+
+
+async def _init_connection(conn):
+    conn.add_query_logger(_observe_query)
+
+
+# Supplier RPCs on grpc.aio with asyncpg. Queued writes still arrive through
+# RabbitMQ and are applied by the thread-based batching consumers.
+# on_committed (a blocking callable, run in a thread) receives the change events of each write.
+class AsyncSupplierService(service_pb2_grpc.SupplierServiceServicer):
+    def __init__(self, pool, default_page_size=100, max_page_size=1000, stream_batch_size=500, acquire_timeout=1.0,
+                 compression_min_bytes=1024, on_committed=None, change_feed=None, watch_block_ms=5000):
+        self._pool = pool
+        self._on_committed = on_committed
+        self._change_feed = change_feed
+        self._watch_block_ms = watch_block_ms
+        self._stream_batch_size = stream_batch_size
+        self._default_page_size = default_page_size
+        self._max_page_size = max_page_size
+        self._acquire_timeout = acquire_timeout
+        self._compression_min_bytes = compression_min_bytes
+
+    # Fail fast instead of queueing when the asyncpg pool has no free connection
+    @asynccontextmanager
+    async def _connection(self, context, method):
+        try:
+            conn = await self._pool.acquire(timeout=self._acquire_timeout)
+        except asyncio.TimeoutError:
+            GRPC_REJECTED.labels(method=method, reason='db_pool').inc()
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "no database connection available")
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    async def _publish(self, events):
+        if self._on_committed is not None:
+            await asyncio.to_thread(self._on_committed, events)
+
+    # Columns selected for the request's read_mask (id is always included)
+    async def _columns(self, request, context):
+        try:
+            return select_list(supplier_columns(request.read_mask))
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+    async def GetSuppliers(self, request, context):
+        columns = await self._columns(request, context)
+        async with self._connection(context, 'GetSuppliers') as conn:
+            rows = await conn.fetch(f"SELECT {columns} FROM suppliers ORDER BY id")
+        response = service_pb2.SuppliersResponse(suppliers=[_supplier(row) for row in rows])
+        return await compress_if_large_aio(context, response, self._compression_min_bytes)
+
+    async def GetSupplier(self, request, context):
+        columns = await self._columns(request, context)
+        async with self._connection(context, 'GetSupplier') as conn:
+            row = await conn.fetchrow(f"SELECT {columns} FROM suppliers WHERE id = $1", request.id)
+        if row is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        return _supplier(row)
+
+    async def GetSuppliersPage(self, request, context):
+        columns = await self._columns(request, context)
+        page_size = min(request.page_size or self._default_page_size, self._max_page_size)
+        try:
+            after_id = int(request.page_token) if request.page_token else 0
+        except ValueError:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "invalid page_token")
+
+        async with self._connection(context, 'GetSuppliersPage') as conn:
+            rows = await conn.fetch(f"SELECT {columns} FROM suppliers WHERE id > $1 ORDER BY id LIMIT $2",
+                                    after_id, page_size + 1)
+        next_page_token = str(rows[page_size - 1]['id']) if len(rows) > page_size else ""
+        response = service_pb2.SuppliersPage(suppliers=[_supplier(row) for row in rows[:page_size]],
+                                             next_page_token=next_page_token)
+        return await compress_if_large_aio(context, response, self._compression_min_bytes)
+
+    # asyncpg cursors are server-side: only one batch of rows is held at a time
+    async def StreamSuppliers(self, request, context):
+        columns = await self._columns(request, context)
+        batch_size = min(request.batch_size or self._stream_batch_size, self._max_page_size)
+        context.set_compression(grpc.Compression.Gzip)
+        await context.send_initial_metadata(())
+        async with self._connection(context, 'StreamSuppliers') as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(f"SELECT {columns} FROM suppliers ORDER BY id")
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield service_pb2.SuppliersResponse(suppliers=[_supplier(row) for row in rows])
+
+    # Same contract as SupplierService.WatchSuppliers
+    async def WatchSuppliers(self, request, context):
+        if self._change_feed is None:
+            await context.abort(grpc.StatusCode.UNIMPLEMENTED, "change feed is not configured")
+        batch_size = min(request.batch_size or self._stream_batch_size, self._max_page_size)
+        context.set_compression(grpc.Compression.Gzip)
+        await context.send_initial_metadata(())
+        try:
+            version = request.since_version
+            if version and await self._change_feed.covers(version):
+                yield service_pb2.SupplierChanges(version=version, live=True)
+            else:
+                version = await self._change_feed.last_version()
+                async for changes in self._snapshot(context, version, batch_size):
+                    yield changes
+            while True:
+                version, changes = await self._change_feed.read(version, batch_size, self._watch_block_ms)
+                if changes:
+                    yield service_pb2.SupplierChanges(changes=changes, version=version)
+        except RedisError as e:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, f"change feed unavailable: {e}")
+
+    async def _snapshot(self, context, version, batch_size):
+        async with self._connection(context, 'WatchSuppliers') as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(f"SELECT {select_list(SUPPLIER_COLUMNS)} FROM suppliers ORDER BY id")
+                rows, reset = await cursor.fetch(batch_size), True
+                while True:
+                    next_rows = await cursor.fetch(batch_size) if rows else []
+                    changes = [service_pb2.SupplierChange(supplier=_supplier(row), version=row['version'])
+                               for row in rows]
+                    yield service_pb2.SupplierChanges(changes=changes, version=version, reset=reset,
+                                                      live=not next_rows)
+                    if not next_rows:
+                        break
+                    rows, reset = next_rows, False
+
+    async def SearchSuppliers(self, request, context):
+        columns = await self._columns(request, context)
+        page_size = min(request.page_size or self._default_page_size, self._max_page_size)
+        try:
+            after_id = int(request.page_token) if request.page_token else 0
+        except ValueError:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "invalid page_token")
+        try:
+            sql, params = search_query(request, columns, after_id, page_size + 1, lambda n: f"${n}")
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        async with self._connection(context, 'SearchSuppliers') as conn:
+            rows = await conn.fetch(sql, *params)
+        next_page_token = str(rows[page_size - 1]['id']) if len(rows) > page_size else ""
+        response = service_pb2.SuppliersPage(suppliers=[_supplier(row) for row in rows[:page_size]],
+                                             next_page_token=next_page_token)
+        return await compress_if_large_aio(context, response, self._compression_min_bytes)
+
+    async def CreateSupplier(self, request, context):
+        async with self._connection(context, 'CreateSupplier') as conn:
+            row = await conn.fetchrow("INSERT INTO suppliers (company_name, contact_person, phone) VALUES ($1, $2, $3) "
+                                      f"RETURNING {select_list(RETURNED_COLUMNS)}",
+                                      request.company_name, request.contact_person, request.phone)
+        await self._publish([upsert_event('create', row)])
+        return _supplier(row)
+
+    async def UpdateSupplier(self, request, context):
+        async with self._connection(context, 'UpdateSupplier') as conn:
+            row = await conn.fetchrow("UPDATE suppliers SET company_name = $1, contact_person = $2, phone = $3, "
+                                      "version = nextval('supplier_version_seq') "
+                                      f"WHERE id = $4 RETURNING {select_list(RETURNED_COLUMNS)}",
+                                      request.company_name, request.contact_person, request.phone, request.id)
+        if row is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        await self._publish([upsert_event('update', row)])
+        return _supplier(row)
+
+    async def DeleteSupplier(self, request, context):
+        async with self._connection(context, 'DeleteSupplier') as conn:
+            version = await conn.fetchval("DELETE FROM suppliers WHERE id = $1 RETURNING nextval('supplier_version_seq')",
+                                          request.id)
+        if version is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        await self._publish([supplier_event('delete', request.id, version)])
+        return service_pb2.Empty()
+
+
+# Runs the grpc.aio server until SIGTERM/SIGINT, then stops it gracefully
+async def serve_aio(database, address='[::]:50051', pool_min=2, pool_max=20, pool_max_idle=300,
+                    maximum_concurrent_rpcs=None, method_limits=None, options=(), service_settings=None):
+    pool = await asyncpg.create_pool(database=database['dbname'], user=database['user'],
+                                     password=database['password'], host=database['host'], port=database['port'],
+                                     min_size=pool_min, max_size=pool_max,
+                                     max_inactive_connection_lifetime=pool_max_idle, init=_init_connection)
+    interceptors = [AsyncRpcMetricsInterceptor(), AsyncRpcTracingInterceptor()]
+    if method_limits:
+        interceptors.append(AsyncConcurrencyLimitInterceptor(method_limits))
+    server = grpc.aio.server(
+        interceptors=interceptors,
+        options=list(options),
+        maximum_concurrent_rpcs=maximum_concurrent_rpcs,
+    )
+    service_pb2_grpc.add_SupplierServiceServicer_to_server(AsyncSupplierService(pool, **(service_settings or {})),
+                                                           server)
+    server.add_insecure_port(address)
+    await server.start()
+    print(f"grpc.aio server listening on {address}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+    print("Shutting down...")
+    await server.stop(grace=5)
+    await pool.close()
@@ -1,37 +1,276 @@
 import sys
 sys.path.append('/app/proto')
+import asyncio
 from concurrent import futures
 import grpc
-import psycopg2
+from psycopg2.extras import execute_values
 import pika
+import redis
+import redis.asyncio as aioredis
 import json
+import os
+import signal
+import threading
+from prometheus_client import start_http_server
 from proto import service_pb2, service_pb2_grpc
+from db_pool import ConnectionPool
+from rpc_metrics import RpcMetricsInterceptor
+from tracing import RpcTracingInterceptor, setup_tracing
+from projection import SUPPLIER_COLUMNS, select_list, supplier_columns, supplier_from_row
+from search import search_query
+from events import (RETURNED_COLUMNS, AsyncSupplierChangeFeed, SupplierChangeFeed, SupplierEventPublisher,
+                    supplier_event, upsert_event)
+from migrations import apply_migrations
+from aio_server import ConcurrencyLimitInterceptor, compress_if_large, parse_method_limits, serve_aio, server_options
+from consumer import (BatchingConsumer, ConsumerPool, LEGACY_QUEUES, declare_legacy_queues,
+                      declare_supplier_topology, shard_queue_name, traced_callback)
 
 DATABASE = {
-    "dbname": "main_db",
-    "user": "postgres",
-    "password": "example",
-    "host": "db",
-    "port": 5432,
+    "dbname": os.getenv("DB_NAME", "main_db"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "example"),
+    "host": os.getenv("DB_HOST", "db"),
+    "port": int(os.getenv("DB_PORT", "5432")),
 }
 
+# Bulk import jobs are tracked by the gateway in Redis; we add the rows we committed
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+BULK_JOB_TTL = 24 * 60 * 60
 
-def get_db_connection():
-    return psycopg2.connect(**DATABASE)
+
+# Change events (id, operation, version) go to a Redis stream after every commit;
+# the gateway updates or invalidates its cache entries from them
+supplier_events = SupplierEventPublisher(redis_client, maxlen=int(os.getenv("SUPPLIER_EVENTS_MAXLEN", "100000")))
+SUPPLIER_EVENTS_ENABLED = os.getenv("SUPPLIER_EVENTS", "1") == "1"
+
+
+def publish_supplier_events(events):
+    if SUPPLIER_EVENTS_ENABLED:
+        supplier_events.publish(events)
+
+
+# WatchSuppliers reads the same stream; an idle watch re-checks every WATCH_BLOCK_MS
+# whether its client is still there
+change_feed = SupplierChangeFeed(redis_client)
+WATCH_BLOCK_MS = int(os.getenv("WATCH_BLOCK_MS", "5000"))
+
+
+# counter is rows_applied for committed rows or rows_failed for dropped ones
+def report_bulk_progress(jobs, counter="rows_applied"):
+    with redis_client.pipeline() as pipe:
+        for job_id, rows in jobs.items():
+            pipe.hincrby(f"bulk:job:{job_id}", counter, rows)
+            pipe.expire(f"bulk:job:{job_id}", BULK_JOB_TTL)
+        pipe.execute()
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# gRPC server settings. Calls over GRPC_MAX_CONCURRENT_RPCS or over a per-method
+# limit from GRPC_METHOD_CONCURRENCY fail with RESOURCE_EXHAUSTED instead of
+# queueing. Responses of at least GRPC_COMPRESSION_MIN_BYTES are gzipped.
+GRPC_SERVER_MODE = os.getenv("GRPC_SERVER_MODE", "thread")  # thread or aio
+GRPC_WORKERS = int(os.getenv("GRPC_WORKERS", "10"))
+GRPC_MAX_CONCURRENT_RPCS = int(os.getenv("GRPC_MAX_CONCURRENT_RPCS", "0")) or None
+GRPC_METHOD_CONCURRENCY = parse_method_limits(os.getenv("GRPC_METHOD_CONCURRENCY", ""))
+GRPC_COMPRESSION_MIN_BYTES = int(os.getenv("GRPC_COMPRESSION_MIN_BYTES", "1024"))
+GRPC_OPTIONS = server_options(
+    keepalive_ms=int(os.getenv("GRPC_KEEPALIVE_TIME_MS", "30000")),
+    min_ping_interval_ms=int(os.getenv("GRPC_MIN_PING_INTERVAL_MS", "10000")),
+    max_connection_idle_ms=int(os.getenv("GRPC_MAX_CONNECTION_IDLE_MS", "0")),
+)
+
+# Shared by the gRPC ThreadPoolExecutor workers and the RabbitMQ consumer
+db_pool = ConnectionPool(
+    minconn=int(os.getenv("DB_POOL_MIN", "2")),
+    maxconn=int(os.getenv("DB_POOL_MAX", "20")),
+    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+    checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    **DATABASE,
+)
 
 
 class SupplierService(service_pb2_grpc.SupplierServiceServicer):
     # GET suppliers (synchronous)
     def GetSuppliers(self, request, context):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM suppliers")
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        suppliers = [service_pb2.Supplier(id=row[0], company_name=row[1], contact_person=row[2], phone=row[3]) for row
-                     in rows]
-        return service_pb2.SuppliersResponse(suppliers=suppliers)
+        columns = self._columns(request, context)
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {select_list(columns)} FROM suppliers ORDER BY id")
+            rows = cur.fetchall()
+            cur.close()
+            conn.rollback()
+        suppliers = [supplier_from_row(columns, row) for row in rows]
+        return compress_if_large(context, service_pb2.SuppliersResponse(suppliers=suppliers),
+                                 GRPC_COMPRESSION_MIN_BYTES)
+
+    # GET supplier by id (synchronous)
+    def GetSupplier(self, request, context):
+        columns = self._columns(request, context)
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {select_list(columns)} FROM suppliers WHERE id = %s", (request.id,))
+            row = cur.fetchone()
+            cur.close()
+            conn.rollback()
+        if row is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        return supplier_from_row(columns, row)
+
+    # GET suppliers page (keyset pagination on id)
+    def GetSuppliersPage(self, request, context):
+        columns = self._columns(request, context)
+        page_size = min(request.page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        try:
+            after_id = int(request.page_token) if request.page_token else 0
+        except ValueError:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "invalid page_token")
+
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            # Fetch one extra row to know whether there is a next page
+            cur.execute(f"SELECT {select_list(columns)} FROM suppliers WHERE id > %s ORDER BY id LIMIT %s",
+                        (after_id, page_size + 1))
+            rows = cur.fetchall()
+            cur.close()
+            conn.rollback()
+        next_page_token = str(rows[page_size - 1][0]) if len(rows) > page_size else ""
+        suppliers = [supplier_from_row(columns, row) for row in rows[:page_size]]
+        return compress_if_large(context, service_pb2.SuppliersPage(suppliers=suppliers, next_page_token=next_page_token),
+                                 GRPC_COMPRESSION_MIN_BYTES)
+
+    # Full export as a stream: a named (server-side) cursor keeps only one batch
+    # of rows in memory, and each batch is sent as soon as it is fetched
+    def StreamSuppliers(self, request, context):
+        columns = self._columns(request, context)
+        batch_size = min(request.batch_size or STREAM_BATCH_SIZE, MAX_PAGE_SIZE)
+        context.set_compression(grpc.Compression.Gzip)
+        with db_pool.connection() as conn:
+            cur = conn.cursor(name="stream_suppliers")
+            cur.execute(f"SELECT {select_list(columns)} FROM suppliers ORDER BY id")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield service_pb2.SuppliersResponse(suppliers=[supplier_from_row(columns, row) for row in rows])
+            cur.close()
+            conn.rollback()
+
+    # Change feed: a snapshot, then deltas from the events stream. The feed version
+    # is taken before the snapshot is read, so a change committed during the
+    # snapshot is replayed after it; clients apply changes by row version, so the
+    # overlap is harmless. A watch holds a worker thread for as long as it is open.
+    def WatchSuppliers(self, request, context):
+        batch_size = min(request.batch_size or STREAM_BATCH_SIZE, MAX_PAGE_SIZE)
+        context.set_compression(grpc.Compression.Gzip)
+        try:
+            version = request.since_version
+            if version and change_feed.covers(version):
+                yield service_pb2.SupplierChanges(version=version, live=True)
+            else:
+                version = change_feed.last_version()
+                yield from self._snapshot(version, batch_size)
+            while context.is_active():
+                version, changes = change_feed.read(version, batch_size, WATCH_BLOCK_MS)
+                if changes:
+                    yield service_pb2.SupplierChanges(changes=changes, version=version)
+        except redis.RedisError as e:
+            context.abort(grpc.StatusCode.UNAVAILABLE, f"change feed unavailable: {e}")
+
+    # Every supplier as upserts; the first batch resets the client's view, the last one makes it live
+    def _snapshot(self, version, batch_size):
+        with db_pool.connection() as conn:
+            cur = conn.cursor(name="watch_suppliers")
+            cur.execute(f"SELECT {select_list(SUPPLIER_COLUMNS)} FROM suppliers ORDER BY id")
+            rows, reset = cur.fetchmany(batch_size), True
+            while True:
+                next_rows = cur.fetchmany(batch_size) if rows else []
+                suppliers = [supplier_from_row(SUPPLIER_COLUMNS, row) for row in rows]
+                changes = [service_pb2.SupplierChange(supplier=supplier, version=supplier.version)
+                           for supplier in suppliers]
+                yield service_pb2.SupplierChanges(changes=changes, version=version, reset=reset, live=not next_rows)
+                if not next_rows:
+                    break
+                rows, reset = next_rows, False
+            cur.close()
+            conn.rollback()
+
+    # Search by company_name/contact_person (prefix or substring) and/or exact phone, paginated by id
+    def SearchSuppliers(self, request, context):
+        columns = self._columns(request, context)
+        page_size = min(request.page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        try:
+            after_id = int(request.page_token) if request.page_token else 0
+        except ValueError:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "invalid page_token")
+        try:
+            sql, params = search_query(request, select_list(columns), after_id, page_size + 1, lambda n: "%s")
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
+            conn.rollback()
+        next_page_token = str(rows[page_size - 1][0]) if len(rows) > page_size else ""
+        suppliers = [supplier_from_row(columns, row) for row in rows[:page_size]]
+        return compress_if_large(context, service_pb2.SuppliersPage(suppliers=suppliers, next_page_token=next_page_token),
+                                 GRPC_COMPRESSION_MIN_BYTES)
+
+    # Columns selected for the request's read_mask (id is always included)
+    def _columns(self, request, context):
+        try:
+            return supplier_columns(request.read_mask)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+    # CREATE supplier (synchronous write mode of the gateway): returns the committed row
+    def CreateSupplier(self, request, context):
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("INSERT INTO suppliers (company_name, contact_person, phone) VALUES (%s, %s, %s) "
+                        f"RETURNING {select_list(RETURNED_COLUMNS)}",
+                        (request.company_name, request.contact_person, request.phone))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        publish_supplier_events([upsert_event('create', row)])
+        return supplier_from_row(RETURNED_COLUMNS, row)
+
+    # UPDATE supplier (synchronous write mode of the gateway)
+    def UpdateSupplier(self, request, context):
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE suppliers SET company_name = %s, contact_person = %s, phone = %s, "
+                        "version = nextval('supplier_version_seq') "
+                        f"WHERE id = %s RETURNING {select_list(RETURNED_COLUMNS)}",
+                        (request.company_name, request.contact_person, request.phone, request.id))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        if row is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        publish_supplier_events([upsert_event('update', row)])
+        return supplier_from_row(RETURNED_COLUMNS, row)
+
+    # DELETE supplier (synchronous write mode of the gateway)
+    def DeleteSupplier(self, request, context):
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM suppliers WHERE id = %s RETURNING nextval('supplier_version_seq')", (request.id,))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        if row is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"supplier {request.id} not found")
+        publish_supplier_events([supplier_event('delete', request.id, row[0])])
+        return service_pb2.Empty()
 
     # CREATE supplier (asynchronous via RabbitMQ with gRPC binary)
     def create_supplier_from_message(self, message):
@@ -40,15 +279,33 @@ class SupplierService(service_pb2_grpc.SupplierServiceServicer):
         contact_person = grpc_request.contact_person
         phone = grpc_request.phone
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO suppliers (company_name, contact_person, phone) VALUES (%s, %s, %s) RETURNING id",
-                    (company_name, contact_person, phone))
-        supplier_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Supplier created: {supplier_id}")
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("INSERT INTO suppliers (company_name, contact_person, phone) VALUES (%s, %s, %s) "
+                        f"RETURNING {select_list(RETURNED_COLUMNS)}",
+                        (company_name, contact_person, phone))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        publish_supplier_events([upsert_event('create', row)])
+        print(f"Supplier created: {row[0]}")
+
+    # CREATE suppliers in bulk (bulk import chunk via RabbitMQ)
+    def create_suppliers_from_batch_message(self, message):
+        grpc_request = service_pb2.CreateSuppliersBatchRequest.FromString(message)
+
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            rows = execute_values(cur, "INSERT INTO suppliers (company_name, contact_person, phone) VALUES %s "
+                                       f"RETURNING {select_list(RETURNED_COLUMNS)}",
+                                  [(s.company_name, s.contact_person, s.phone) for s in grpc_request.suppliers],
+                                  page_size=len(grpc_request.suppliers) or 1, fetch=True)
+            conn.commit()
+            cur.close()
+        publish_supplier_events([upsert_event('create', row) for row in rows])
+        if grpc_request.job_id:
+            report_bulk_progress({grpc_request.job_id: len(grpc_request.suppliers)})
+        print(f"Suppliers created in bulk: {len(grpc_request.suppliers)}")
 
     # UPDATE supplier (asynchronous via RabbitMQ with gRPC binary)
     def update_supplier_from_message(self, message):
@@ -58,13 +315,17 @@ class SupplierService(service_pb2_grpc.SupplierServiceServicer):
         contact_person = grpc_request.contact_person
         phone = grpc_request.phone
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE suppliers SET company_name = %s, contact_person = %s, phone = %s WHERE id = %s",
-                    (company_name, contact_person, phone, supplier_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE suppliers SET company_name = %s, contact_person = %s, phone = %s, "
+                        "version = nextval('supplier_version_seq') "
+                        f"WHERE id = %s RETURNING {select_list(RETURNED_COLUMNS)}",
+                        (company_name, contact_person, phone, supplier_id))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        if row is not None:
+            publish_supplier_events([upsert_event('update', row)])
         print(f"Supplier updated: {supplier_id}")
 
     # DELETE supplier (asynchronous via RabbitMQ with gRPC binary)
@@ -72,12 +333,14 @@ class SupplierService(service_pb2_grpc.SupplierServiceServicer):
         grpc_request = service_pb2.DeleteSupplierRequest.FromString(message)
         supplier_id = grpc_request.id
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM suppliers WHERE id = %s", (supplier_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM suppliers WHERE id = %s RETURNING nextval('supplier_version_seq')", (supplier_id,))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        if row is not None:
+            publish_supplier_events([supplier_event('delete', supplier_id, row[0])])
         print(f"Supplier deleted: {supplier_id}")
 
 
@@ -106,25 +369,134 @@ def rabbitmq_consumer():
         SupplierService().delete_supplier_from_message(body)
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
-    channel.basic_consume(queue='create_supplier', on_message_callback=callback_create_supplier)
-    channel.basic_consume(queue='update_supplier', on_message_callback=callback_update_supplier)
-    channel.basic_consume(queue='delete_supplier', on_message_callback=callback_delete_supplier)
+    channel.basic_consume(queue='create_supplier',
+                          on_message_callback=traced_callback('create_supplier', callback_create_supplier))
+    channel.basic_consume(queue='update_supplier',
+                          on_message_callback=traced_callback('update_supplier', callback_update_supplier))
+    channel.basic_consume(queue='delete_supplier',
+                          on_message_callback=traced_callback('delete_supplier', callback_delete_supplier))
+
+    def callback_create_suppliers_batch(ch, method, properties, body):
+        print("Received Create Suppliers Batch gRPC message")
+        SupplierService().create_suppliers_from_batch_message(body)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    # Shard queues carry all operations; the operation is in the message type
+    callbacks = {
+        'create_supplier': callback_create_supplier,
+        'update_supplier': callback_update_supplier,
+        'delete_supplier': callback_delete_supplier,
+        'create_suppliers_batch': callback_create_suppliers_batch,
+    }
+
+    def callback_shard(ch, method, properties, body):
+        callbacks[properties.type](ch, method, properties, body)
+
+    shards = int(os.getenv("SUPPLIER_SHARDS", "8"))
+    declare_supplier_topology(channel, shards)
+    for shard in range(shards):
+        channel.basic_consume(queue=shard_queue_name(shard),
+                              on_message_callback=traced_callback(shard_queue_name(shard), callback_shard))
 
     print('Waiting for messages...')
     channel.start_consuming()
 
 
+# Pool of batching RabbitMQ consumers: bulk INSERT/UPDATE/DELETE per transaction,
+# each worker with its own connection, channel and prefetch window. There is one
+# worker per shard queue, so writes to one supplier are applied strictly in order
+# while different suppliers are written in parallel.
+def batching_consumer_pool():
+    shards = int(os.getenv("SUPPLIER_SHARDS", "8"))
+    parameters = pika.ConnectionParameters('rabbitmq')
+    settings = dict(
+        db_pool=db_pool,
+        batch_size=int(os.getenv("CONSUMER_BATCH_SIZE", "100")),
+        batch_timeout=float(os.getenv("CONSUMER_BATCH_TIMEOUT_MS", "50")) / 1000,
+        prefetch=int(os.getenv("CONSUMER_PREFETCH", "0")) or None,
+        on_applied=report_bulk_progress,
+        on_committed=publish_supplier_events,
+    )
+    consumers = [
+        BatchingConsumer(parameters, queues=[shard_queue_name(shard)],
+                         topology=lambda channel: declare_supplier_topology(channel, shards), **settings)
+        for shard in range(shards)
+    ]
+    consumers.append(BatchingConsumer(parameters, queues=LEGACY_QUEUES, topology=declare_legacy_queues, **settings))
+    return ConsumerPool(consumers)
+
+
 def serve():
+    # Expose Prometheus metrics (served on every path, /metrics included)
+    start_http_server(int(os.getenv("METRICS_PORT", "8000")))
+    setup_tracing("domain-service")
+    if os.getenv("DB_MIGRATE", "1") == "1":
+        apply_migrations(DATABASE)
+    db_pool.open()
+
+    if GRPC_SERVER_MODE == "aio":
+        serve_with_aio()
+        return
+
     # Start gRPC server
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    interceptors = [RpcMetricsInterceptor(), RpcTracingInterceptor()]
+    if GRPC_METHOD_CONCURRENCY:
+        interceptors.append(ConcurrencyLimitInterceptor(GRPC_METHOD_CONCURRENCY))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_WORKERS), options=GRPC_OPTIONS,
+                         interceptors=interceptors,
+                         maximum_concurrent_rpcs=GRPC_MAX_CONCURRENT_RPCS)
     service_pb2_grpc.add_SupplierServiceServicer_to_server(SupplierService(), server)
     server.add_insecure_port('[::]:50051')
     server.start()
 
-    # Start RabbitMQ consumer in parallel
-    rabbitmq_consumer()
+    if os.getenv("CONSUMER_MODE", "batch") != "batch":
+        # Start RabbitMQ consumer in parallel
+        rabbitmq_consumer()
+        server.wait_for_termination()
+        return
+
+    consumers = batching_consumer_pool()
+    consumers.start()
+
+    # Graceful shutdown on SIGTERM/SIGINT: drain consumers, then stop the gRPC server
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    stopping.wait()
+    print("Shutting down...")
+    consumers.stop()
+    server.stop(grace=5).wait()
+    db_pool.closeall()
+
 
-    server.wait_for_termination()
+# asyncio gRPC server on asyncpg for the read RPCs; the batching consumers keep
+# running on their own threads with the psycopg2 pool
+def serve_with_aio():
+    consumers = batching_consumer_pool()
+    consumers.start()
+    try:
+        asyncio.run(serve_aio(
+            DATABASE,
+            pool_min=int(os.getenv("DB_POOL_MIN", "2")),
+            pool_max=int(os.getenv("DB_POOL_MAX", "20")),
+            pool_max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            maximum_concurrent_rpcs=GRPC_MAX_CONCURRENT_RPCS,
+            method_limits=GRPC_METHOD_CONCURRENCY,
+            options=GRPC_OPTIONS,
+            service_settings=dict(
+                default_page_size=DEFAULT_PAGE_SIZE,
+                max_page_size=MAX_PAGE_SIZE,
+                stream_batch_size=STREAM_BATCH_SIZE,
+                acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "1.0")),
+                compression_min_bytes=GRPC_COMPRESSION_MIN_BYTES,
+                on_committed=publish_supplier_events,
+                change_feed=AsyncSupplierChangeFeed(aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT)),
+                watch_block_ms=WATCH_BLOCK_MS,
+            ),
+        ))
+    finally:
+        consumers.stop()
+        db_pool.closeall()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,428 @@
+import functools
+import threading
+import time
+
+import pika
+from pika.exceptions import AMQPConnectionError, AMQPError
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
+from prometheus_client import Counter, Gauge, Histogram
+from opentelemetry import trace
+
+from events import RETURNED_COLUMNS, supplier_event, upsert_event
+from proto import service_pb2
+from tracing import batch_span, end_consume_span, start_consume_span
+
+BATCH_SIZE = Histogram('consumer_batch_size', 'Messages applied per consumer batch',
+                       buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+BATCH_FLUSH_LATENCY = Histogram('consumer_flush_latency_seconds', 'Time to apply and commit a consumer batch')
+ROWS_PER_COMMIT = Histogram('consumer_rows_per_commit', 'Rows written per consumer commit',
+                            buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+COALESCED_MESSAGES = Counter('consumer_coalesced_messages_total',
+                             'Messages acked without their own DB write because a later one superseded them', ['kind'])
+REJECTED_MESSAGES = Counter('consumer_rejected_messages_total', 'Messages rejected because they could not be applied',
+                            ['kind'])
+# Per queue: delivery to ack (waiting for the batch, applying and committing it),
+# publish to delivery (time spent in the queue), and messages still waiting
+CONSUME_LATENCY = Histogram('consumer_message_latency_seconds', 'Time from delivery to ack of a message', ['queue'],
+                            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+QUEUE_LAG = Histogram('consumer_queue_lag_seconds', 'Time a message spent in the queue before delivery', ['queue'],
+                      buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300))
+QUEUE_DEPTH = Gauge('consumer_queue_depth', 'Messages ready in the queue', ['queue'])
+
+# Publish time set by the gateway (milliseconds since the epoch). Must match the gateway's publisher.
+PUBLISHED_AT_HEADER = 'x-published-at'
+# Job and row count of a bulk import chunk, so even an undecodable chunk is
+# accounted to its job. Must match the gateway's publisher.
+BULK_JOB_HEADER = 'x-bulk-job-id'
+BULK_ROWS_HEADER = 'x-bulk-rows'
+
+# Errors that say nothing about the messages being applied: they are requeued, never rejected
+DB_UNAVAILABLE = (psycopg2.OperationalError, PoolError)
+
+
+def published_at(properties):
+    value = (properties.headers or {}).get(PUBLISHED_AT_HEADER)
+    return value if isinstance(value, (int, float)) else None
+
+
+# Wraps a pika on_message_callback so the message is handled inside its consume span
+def traced_callback(queue_name, callback):
+    def traced(channel, method, properties, body):
+        span = start_consume_span(queue_name, properties, published_at(properties))
+        with trace.use_span(span, end_on_exit=True):
+            callback(channel, method, properties, body)
+    return traced
+
+# Supplier writes arrive through one exchange, routed by the gateway to shard
+# queues by a consistent hash of the supplier id. Must match the gateway's declaration.
+SUPPLIERS_EXCHANGE = 'suppliers'
+# Per-operation queues used before sharding; still drained so no message is lost on upgrade
+LEGACY_QUEUES = ['create_supplier', 'update_supplier', 'delete_supplier']
+
+
+def shard_queue_name(shard):
+    return f"suppliers.shard.{shard}"
+
+
+# x-single-active-consumer keeps exactly one active consumer per shard even with
+# several domain-service replicas, which is what preserves per-supplier ordering
+def declare_supplier_topology(channel, shards):
+    channel.exchange_declare(exchange=SUPPLIERS_EXCHANGE, exchange_type='direct')
+    for shard in range(shards):
+        queue_name = shard_queue_name(shard)
+        channel.queue_declare(queue=queue_name, arguments={'x-single-active-consumer': True})
+        channel.queue_bind(queue=queue_name, exchange=SUPPLIERS_EXCHANGE, routing_key=str(shard))
+
+
+def declare_legacy_queues(channel):
+    for queue_name in LEGACY_QUEUES:
+        channel.queue_declare(queue=queue_name)
+
+
+MESSAGE_TYPES = {
+    'create_supplier': service_pb2.CreateSupplierRequest,
+    'update_supplier': service_pb2.UpdateSupplierRequest,
+    'delete_supplier': service_pb2.DeleteSupplierRequest,
+    'create_suppliers_batch': service_pb2.CreateSuppliersBatchRequest,
+}
+
+
+def _insert(cur, requests):
+    rows = execute_values(cur, "INSERT INTO suppliers (company_name, contact_person, phone) VALUES %s "
+                               f"RETURNING {', '.join(RETURNED_COLUMNS)}",
+                          [(r.company_name, r.contact_person, r.phone) for r in requests], page_size=len(requests),
+                          fetch=True)
+    return [upsert_event('create', row) for row in rows]
+
+
+# One UPDATE ... FROM (VALUES ...) for the whole run; ids are unique here because
+# coalesce_operations keeps a single update per supplier
+def _update(cur, requests):
+    rows = execute_values(cur, "UPDATE suppliers AS s SET company_name = v.company_name, "
+                               "contact_person = v.contact_person, phone = v.phone, "
+                               "version = nextval('supplier_version_seq') "
+                               "FROM (VALUES %s) AS v (id, company_name, contact_person, phone) WHERE s.id = v.id "
+                               f"RETURNING {', '.join('s.' + column for column in RETURNED_COLUMNS)}",
+                          [(r.id, r.company_name, r.contact_person, r.phone) for r in requests],
+                          page_size=len(requests), fetch=True)
+    return [upsert_event('update', row) for row in rows]
+
+
+def _delete(cur, requests):
+    cur.execute("DELETE FROM suppliers WHERE id = ANY(%s) RETURNING id, nextval('supplier_version_seq')",
+                ([r.id for r in requests],))
+    return [supplier_event('delete', supplier_id, version) for supplier_id, version in cur.fetchall()]
+
+
+APPLIERS = {
+    'create_supplier': _insert,
+    'update_supplier': _update,
+    'delete_supplier': _delete,
+}
+
+
+# Apply decoded (kind, request) operations in the given order. Consecutive
+# operations of the same kind are sent as one statement batch; a batch from
+# coalesce_operations is grouped as creates, updates, deletes, so it takes at
+# most three statements. Returns a change event per written row, to be
+# published once the transaction commits.
+def apply_operations(cur, operations):
+    events = []
+    run_kind, run = None, []
+    for kind, grpc_request in operations:
+        if kind != run_kind and run:
+            events += APPLIERS[run_kind](cur, run)
+            run = []
+        run_kind = kind
+        run.append(grpc_request)
+    if run:
+        events += APPLIERS[run_kind](cur, run)
+    return events
+
+
+# Collapse the operations of one batch to the final state per supplier id: the
+# last update wins and a delete overrides every update of that supplier. Updates
+# carry the full row, so applying only the survivor gives the same result.
+# Creates have no id yet and are all kept. The result is reordered as creates,
+# then updates, then deletes: every id has a single survivor and a create
+# cannot touch an existing id, so the order between the groups does not matter.
+def coalesce_operations(operations):
+    creates, final = [], {}
+    for kind, grpc_request in operations:
+        if kind == 'create_supplier':
+            creates.append((kind, grpc_request))
+            continue
+        previous = final.get(grpc_request.id)
+        if previous is not None:
+            if previous[0] == 'delete_supplier':
+                COALESCED_MESSAGES.labels(kind=kind).inc()
+                continue
+            COALESCED_MESSAGES.labels(kind=previous[0]).inc()
+        final[grpc_request.id] = (kind, grpc_request)
+    updates = [operation for operation in final.values() if operation[0] == 'update_supplier']
+    deletes = [operation for operation in final.values() if operation[0] == 'delete_supplier']
+    return creates + updates + deletes
+
+
+# Consumes one or more queues on its own connection, collecting up to batch_size
+# messages or batch_timeout seconds, then applies them in one transaction and
+# acks the whole batch with multiple=True. on_committed receives the change
+# events of each committed transaction, on_applied(jobs, counter) the rows of
+# bulk import jobs committed (rows_applied) or dropped (rows_failed). Every message has a consume span from
+# delivery to ack in its publisher's trace; the batch is applied in a flush span
+# linked to all of them.
+class BatchingConsumer:
+    def __init__(self, connection_parameters, queues, db_pool, batch_size=100, batch_timeout=0.05, prefetch=None,
+                 topology=None, on_applied=None, on_committed=None, depth_interval=15):
+        self._parameters = connection_parameters
+        self._queues = list(queues)
+        self._topology = topology
+        self._db_pool = db_pool
+        self._on_applied = on_applied
+        self._on_committed = on_committed
+        self._batch_size = batch_size
+        self._batch_timeout = batch_timeout
+        self._prefetch = prefetch or batch_size * 2
+        self._depth_interval = depth_interval
+        self._pending = []
+        self._deadline = None
+        self._channel = None
+        self._stopping = threading.Event()
+
+    def _on_message(self, queue_name, channel, method, properties, body):
+        received = time.monotonic()
+        if not self._pending:
+            self._deadline = received + self._batch_timeout
+        published = published_at(properties)
+        if published is not None:
+            QUEUE_LAG.labels(queue=queue_name).observe(max(time.time() - published / 1000, 0))
+        span = start_consume_span(queue_name, properties, published)
+        self._pending.append((method, properties, body, queue_name, received, span))
+
+    def _report_depth(self):
+        for queue_name in self._queues:
+            declared = self._channel.queue_declare(queue=queue_name, passive=True)
+            QUEUE_DEPTH.labels(queue=queue_name).set(declared.method.message_count)
+
+    # Decode one delivery into its operations; a bulk import chunk expands into many creates
+    def _decode(self, method, properties, body):
+        kind = properties.type or method.routing_key
+        grpc_request = MESSAGE_TYPES[kind].FromString(body)
+        if kind == 'create_suppliers_batch':
+            return kind, [('create_supplier', supplier) for supplier in grpc_request.suppliers], grpc_request.job_id
+        return kind, [(kind, grpc_request)], None
+
+    def _commit(self, messages):
+        operations = coalesce_operations([operation for _, _, ops, _ in messages for operation in ops])
+        with self._db_pool.connection() as conn:
+            cur = conn.cursor()
+            events = apply_operations(cur, operations)
+            conn.commit()
+            cur.close()
+        ROWS_PER_COMMIT.observe(len(events))
+        self._report_applied(messages)
+        self._report_committed(events)
+
+    def _report_committed(self, events):
+        if events and self._on_committed is not None:
+            try:
+                self._on_committed(events)
+            except Exception as e:
+                print(f"Failed to publish supplier change events: {e}")
+
+    def _report_applied(self, messages):
+        jobs = {}
+        for _, _, operations, job_id in messages:
+            if job_id:
+                jobs[job_id] = jobs.get(job_id, 0) + len(operations)
+        self._report_jobs(jobs, 'rows_applied')
+
+    # Tell the caller how many rows of each bulk import job were committed or dropped
+    def _report_jobs(self, jobs, counter):
+        jobs = {job_id: rows for job_id, rows in jobs.items() if job_id and rows}
+        if jobs and self._on_applied is not None:
+            try:
+                self._on_applied(jobs, counter)
+            except Exception as e:
+                print(f"Failed to report bulk import progress: {e}")
+
+    # Applies a multi-row message (a bulk import chunk) in one transaction with a
+    # savepoint per row, so a bad row is dropped and reported as failed instead
+    # of taking the rest of the chunk with it. A lost connection is not the row's
+    # fault: it propagates before anything is reported and the caller requeues
+    # the whole message.
+    def _commit_rows(self, message):
+        method, kind, operations, job_id = message
+        events, failed = [], 0
+        with self._db_pool.connection() as conn:
+            cur = conn.cursor()
+            for operation in operations:
+                cur.execute("SAVEPOINT consumer_row")
+                try:
+                    events += apply_operations(cur, [operation])
+                except DB_UNAVAILABLE:
+                    raise
+                except psycopg2.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT consumer_row")
+                    print(f"Dropping {operation[0]} row of {kind} message: {e}")
+                    failed += 1
+                else:
+                    cur.execute("RELEASE SAVEPOINT consumer_row")
+            conn.commit()
+            cur.close()
+        ROWS_PER_COMMIT.observe(len(events))
+        self._report_jobs({job_id: len(operations) - failed}, 'rows_applied')
+        self._report_jobs({job_id: failed}, 'rows_failed')
+        self._report_committed(events)
+
+    # Rows of a bulk import chunk that could not be decoded, from its headers
+    def _report_undecodable(self, properties):
+        headers = properties.headers or {}
+        rows = headers.get(BULK_ROWS_HEADER)
+        if isinstance(rows, int):
+            self._report_jobs({headers.get(BULK_JOB_HEADER): rows}, 'rows_failed')
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        try:
+            with batch_span('consumer flush', [span for *_, span in batch]):
+                outcomes = self._apply_batch(batch)
+        except AMQPError:
+            # The connection is lost; the broker redelivers whatever was not acked
+            self._end_spans(batch, 'requeue')
+            raise
+        acked = time.monotonic()
+        for method, _, _, queue_name, received, span in batch:
+            CONSUME_LATENCY.labels(queue=queue_name).observe(acked - received)
+            end_consume_span(span, outcomes.get(method.delivery_tag, 'ack'))
+
+    # The database is unreachable, not the messages' fault: put them back (every
+    # earlier message of the batch is already settled) and back off
+    def _requeue(self, messages, outcomes, error):
+        print(f"Database unavailable ({error}), requeueing {len(messages)} messages")
+        if messages:
+            self._channel.basic_nack(delivery_tag=messages[-1][0].delivery_tag, multiple=True, requeue=True)
+        outcomes.update((message[0].delivery_tag, 'requeue') for message in messages)
+        time.sleep(1)
+
+    def _end_spans(self, batch, outcome):
+        for *_, span in batch:
+            end_consume_span(span, outcome)
+
+    # Applies, acks and nacks a batch; returns the outcome of every message not simply acked
+    def _apply_batch(self, batch):
+        start = time.perf_counter()
+        outcomes = {}
+        messages = []
+        for method, properties, body, _, _, _ in batch:
+            try:
+                messages.append((method, *self._decode(method, properties, body)))
+            except Exception as e:
+                print(f"Rejecting undecodable message from {method.routing_key}: {e}")
+                REJECTED_MESSAGES.labels(kind=method.routing_key).inc()
+                self._channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                outcomes[method.delivery_tag] = 'reject'
+                self._report_undecodable(properties)
+
+        try:
+            self._commit(messages)
+        except DB_UNAVAILABLE as e:
+            self._requeue(messages, outcomes, e)
+        except psycopg2.Error as e:
+            # One bad message must not block the whole batch: retry the original messages
+            # one by one, and the rows of a bulk import chunk one by one within it
+            print(f"Batch of {len(messages)} failed ({e}), applying messages individually")
+            for index, message in enumerate(messages):
+                method, kind, operations, job_id = message
+                try:
+                    if len(operations) > 1:
+                        self._commit_rows(message)
+                    else:
+                        self._commit([message])
+                    self._channel.basic_ack(delivery_tag=method.delivery_tag)
+                except DB_UNAVAILABLE as e:
+                    # The database went away during the fallback: only data errors reject
+                    self._requeue(messages[index:], outcomes, e)
+                    break
+                except psycopg2.Error as e:
+                    print(f"Rejecting {kind} message: {e}")
+                    REJECTED_MESSAGES.labels(kind=kind).inc()
+                    self._channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    outcomes[method.delivery_tag] = 'reject'
+                    self._report_jobs({job_id: len(operations)}, 'rows_failed')
+        else:
+            if messages:
+                self._channel.basic_ack(delivery_tag=messages[-1][0].delivery_tag, multiple=True)
+        BATCH_SIZE.observe(len(batch))
+        BATCH_FLUSH_LATENCY.observe(time.perf_counter() - start)
+        return outcomes
+
+    def _consume(self):
+        connection = pika.BlockingConnection(self._parameters)
+        try:
+            self._channel = connection.channel()
+            self._channel.basic_qos(prefetch_count=self._prefetch)
+            if self._topology is not None:
+                self._topology(self._channel)
+            for queue_name in self._queues:
+                self._channel.basic_consume(queue=queue_name,
+                                            on_message_callback=functools.partial(self._on_message, queue_name))
+
+            print(f"Batching consumer waiting for messages on {', '.join(self._queues)}...")
+            next_depth = 0
+            while not self._stopping.is_set():
+                timeout = 1.0 if not self._pending else max(self._deadline - time.monotonic(), 0)
+                connection.process_data_events(time_limit=timeout)
+                if self._pending and (len(self._pending) >= self._batch_size or time.monotonic() >= self._deadline):
+                    self._flush()
+                if time.monotonic() >= next_depth:
+                    self._report_depth()
+                    next_depth = time.monotonic() + self._depth_interval
+
+            # Graceful shutdown: stop deliveries, finish what was already received
+            self._channel.stop_consuming()
+            if self._pending:
+                self._flush()
+        finally:
+            self._end_spans(self._pending, 'requeue')
+            self._pending = []
+            if connection.is_open:
+                connection.close()
+
+    # Runs until stop() is called, reconnecting with backoff if RabbitMQ goes away.
+    # Unacked messages of a lost connection are redelivered by the broker.
+    def run(self):
+        backoff = 1
+        while not self._stopping.is_set():
+            try:
+                self._consume()
+                backoff = 1
+            except (AMQPConnectionError, AMQPError) as e:
+                print(f"Consumer for {', '.join(self._queues)} lost connection: {e}")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stop(self):
+        self._stopping.set()
+
+
+# Runs several consumers, each on its own thread with its own connection and channel
+class ConsumerPool:
+    def __init__(self, consumers):
+        self._consumers = list(consumers)
+        self._threads = []
+
+    def start(self):
+        for index, consumer in enumerate(self._consumers):
+            thread = threading.Thread(target=consumer.run, name=f"consumer-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        for consumer in self._consumers:
+            consumer.stop()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
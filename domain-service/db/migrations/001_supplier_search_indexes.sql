@@ -0,0 +1,18 @@
+-- Indexes for SearchSuppliers.
+-- Substring search (ILIKE '%q%') uses the trigram GIN indexes,
+-- prefix search (lower(col) LIKE 'q%') uses the text_pattern_ops btree indexes,
+-- and phone is an exact match.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_company_name_trgm_idx
+    ON suppliers USING gin (company_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_contact_person_trgm_idx
+    ON suppliers USING gin (contact_person gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_company_name_prefix_idx
+    ON suppliers (lower(company_name) text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_contact_person_prefix_idx
+    ON suppliers (lower(contact_person) text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_phone_idx
+    ON suppliers (phone);
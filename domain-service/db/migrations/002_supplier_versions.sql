@@ -0,0 +1,6 @@
+-- Row versions for change events. Every write sets version from the sequence,
+-- so versions of one supplier only grow and the gateway can ignore stale copies.
+-- Adding the column with a volatile default rewrites the table once.
+CREATE SEQUENCE IF NOT EXISTS supplier_version_seq;
+
+ALTER TABLE suppliers ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT nextval('supplier_version_seq');
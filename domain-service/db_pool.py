@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+from prometheus_client import Gauge, Histogram
+
+from tracing import db_span
+
+DB_POOL_SIZE = Gauge('db_pool_size', 'Open connections in the PostgreSQL pool')
+DB_POOL_IN_USE = Gauge('db_pool_in_use', 'PostgreSQL connections currently checked out')
+DB_POOL_MAX = Gauge('db_pool_max_size', 'Maximum size of the PostgreSQL pool')
+DB_POOL_WAIT = Histogram('db_pool_wait_seconds', 'Time spent waiting to check out a PostgreSQL connection',
+                         buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Time to execute a PostgreSQL statement', ['statement'],
+                             buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+
+STATEMENT_KINDS = ('select', 'insert', 'update', 'delete')
+
+
+# Label for a statement: its leading keyword, so the metric has a handful of series
+def statement_kind(query):
+    if isinstance(query, bytes):
+        query = query[:16].decode('ascii', 'ignore')
+    keyword = query.lstrip()[:6].lower()
+    return keyword if keyword in STATEMENT_KINDS else 'other'
+
+
+# Cursor that records DB_QUERY_LATENCY and a span for every execute (execute_values
+# included). For a named cursor this is the DECLARE; its fetches are not measured.
+class TimedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        kind = statement_kind(query)
+        start = time.perf_counter()
+        try:
+            with db_span(kind):
+                return super().execute(query, vars)
+        finally:
+            DB_QUERY_LATENCY.labels(statement=kind).observe(time.perf_counter() - start)
+
+
+# Commits get a span of their own: for queued writes that is where the row becomes visible
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def commit(self):
+        with db_span('commit'):
+            super().commit()
+
+
+# Thread-safe connection pool shared by the gRPC workers and the RabbitMQ consumer.
+# Connections are validated on checkout and recycled once they reach max_lifetime.
+class ConnectionPool:
+    def __init__(self, minconn=1, maxconn=10, max_lifetime=1800, health_check_after=30, checkout_timeout=10,
+                 **connect_kwargs):
+        self._connect_kwargs = connect_kwargs
+        self._minconn = minconn
+        self._maxconn = maxconn
+        self._max_lifetime = max_lifetime
+        self._health_check_after = health_check_after
+        self._checkout_timeout = checkout_timeout
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        DB_POOL_MAX.set(maxconn)
+
+    def _connect(self):
+        return psycopg2.connect(connection_factory=PooledConnection, **self._connect_kwargs)
+
+    def open(self):
+        for _ in range(self._minconn - self._size):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+                self._cond.notify()
+            DB_POOL_SIZE.set(self._size)
+
+    def _expired(self, conn):
+        return time.monotonic() - conn.created_at > self._max_lifetime
+
+    def _healthy(self, conn):
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - conn.last_used < self._health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self._checkout_timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self._maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError("timed out waiting for a database connection")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._healthy(conn):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            DB_POOL_SIZE.set(self._size)
+            raise
+
+        DB_POOL_WAIT.observe(time.monotonic() - start)
+        DB_POOL_SIZE.set(self._size)
+        DB_POOL_IN_USE.inc()
+        return conn
+
+    def putconn(self, conn, discard=False):
+        DB_POOL_IN_USE.dec()
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or self._expired(conn):
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+        else:
+            conn.last_used = time.monotonic()
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+        DB_POOL_SIZE.set(self._size)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        # BaseException: a streaming RPC generator closed by a cancelled call raises GeneratorExit here
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            self.putconn(conn, discard=conn.closed != 0)
+            raise
+        self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop())
+                self._size -= 1
+        DB_POOL_SIZE.set(self._size)
@@ -0,0 +1,138 @@
+import json
+
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+
+from proto import service_pb2
+
+# Change events for the gateway's cache, one stream entry per committed write.
+# Must match the gateway's listener.
+SUPPLIER_EVENTS_STREAM = 'suppliers:events'
+SUPPLIER_FIELDS = ('id', 'company_name', 'contact_person', 'phone')
+# Columns every write RETURNs, so its event carries the new row and its version
+RETURNED_COLUMNS = (*SUPPLIER_FIELDS, 'version')
+
+EVENTS_PUBLISHED = Counter('supplier_events_published_total', 'Supplier change events published', ['operation'])
+EVENTS_FAILED = Counter('supplier_events_failed_total', 'Supplier change events that could not be published')
+
+
+# Event for a committed write. `row` maps column names to values; upserts carry
+# the supplier as the gateway caches it (NULLs as empty strings, like protobuf)
+def supplier_event(operation, supplier_id, version, row=None):
+    event = {'id': supplier_id, 'operation': operation, 'version': version, 'supplier': ''}
+    if row is not None:
+        event['supplier'] = json.dumps({field: '' if row[field] is None else row[field] for field in SUPPLIER_FIELDS})
+    return event
+
+
+# Event for a RETURNING row (a tuple in RETURNED_COLUMNS order or a mapping)
+def upsert_event(operation, row):
+    if not hasattr(row, 'keys'):
+        row = dict(zip(RETURNED_COLUMNS, row))
+    return supplier_event(operation, row['id'], row['version'], row)
+
+
+# Appends change events to a Redis stream after the write is committed. The
+# stream is capped (approximately) at maxlen entries; gateways read it through
+# a consumer group, so events survive a gateway restart. A failed publish is
+# logged and counted but never fails the write: cache TTLs are the fallback.
+class SupplierEventPublisher:
+    def __init__(self, redis_client, stream=SUPPLIER_EVENTS_STREAM, maxlen=100000):
+        self._redis = redis_client
+        self._stream = stream
+        self._maxlen = maxlen
+
+    def publish(self, events):
+        if not events:
+            return
+        try:
+            with self._redis.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(self._stream, event, maxlen=self._maxlen, approximate=True)
+                pipe.execute()
+        except RedisError as e:
+            EVENTS_FAILED.inc(len(events))
+            print(f"Failed to publish {len(events)} supplier events: {e}")
+            return
+        for event in events:
+            EVENTS_PUBLISHED.labels(operation=event['operation']).inc()
+
+
+def _position(stream_id):
+    if isinstance(stream_id, bytes):
+        stream_id = stream_id.decode()
+    milliseconds, _, sequence = stream_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
+
+
+# SupplierChange for a stream entry
+def change_from_event(fields):
+    supplier_id, version = int(fields[b'id']), int(fields[b'version'])
+    if fields[b'operation'] == b'delete':
+        return service_pb2.SupplierChange(operation=service_pb2.SupplierChange.DELETE,
+                                          supplier=service_pb2.Supplier(id=supplier_id), version=version)
+    row = json.loads(fields[b'supplier'])
+    return service_pb2.SupplierChange(operation=service_pb2.SupplierChange.UPSERT,
+                                      supplier=service_pb2.Supplier(**row, version=version), version=version)
+
+
+# The events stream read as a change feed for WatchSuppliers. A feed version is a
+# stream entry id. A client can resume from a version only while the stream
+# still holds it: not trimmed away by MAXLEN and not ahead of the stream (the
+# stream was lost with Redis data). Otherwise it needs a new snapshot. '0-0' (a
+# snapshot taken while the stream was empty) is never resumed from: an empty
+# stream cannot tell whether events were published and lost since.
+class SupplierChangeFeed:
+    def __init__(self, redis_client, stream=SUPPLIER_EVENTS_STREAM):
+        self._redis = redis_client
+        self._stream = stream
+
+    def last_version(self):
+        entries = self._redis.xrevrange(self._stream, count=1)
+        return entries[0][0].decode() if entries else '0-0'
+
+    def covers(self, version):
+        try:
+            position = _position(version)
+        except ValueError:
+            return False
+        first = self._redis.xrange(self._stream, count=1)
+        if not first or position == (0, 0):
+            return False
+        return _position(first[0][0]) <= position <= _position(self.last_version())
+
+    # Changes after `version`, waiting up to block_ms for new ones: (last read version, changes)
+    def read(self, version, count, block_ms):
+        response = self._redis.xread({self._stream: version}, count=count, block=block_ms)
+        entries = response[0][1] if response else []
+        if not entries:
+            return version, []
+        return entries[-1][0].decode(), [change_from_event(fields) for _, fields in entries if fields]
+
+
+# The same over redis.asyncio for the grpc.aio server
+class AsyncSupplierChangeFeed:
+    def __init__(self, redis_client, stream=SUPPLIER_EVENTS_STREAM):
+        self._redis = redis_client
+        self._stream = stream
+
+    async def last_version(self):
+        entries = await self._redis.xrevrange(self._stream, count=1)
+        return entries[0][0].decode() if entries else '0-0'
+
+    async def covers(self, version):
+        try:
+            position = _position(version)
+        except ValueError:
+            return False
+        first = await self._redis.xrange(self._stream, count=1)
+        if not first or position == (0, 0):
+            return False
+        return _position(first[0][0]) <= position <= _position(await self.last_version())
+
+    async def read(self, version, count, block_ms):
+        response = await self._redis.xread({self._stream: version}, count=count, block=block_ms)
+        entries = response[0][1] if response else []
+        if not entries:
+            return version, []
+        return entries[-1][0].decode(), [change_from_event(fields) for _, fields in entries if fields]
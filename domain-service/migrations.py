@@ -0,0 +1,74 @@
+import os
+import re
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'migrations')
+# Held while migrating so replicas starting together do not apply the same file twice
+MIGRATION_LOCK_ID = 5_107_001
+
+
+# Statements of a migration file: "--" comment lines are dropped and the rest is
+# split on ";", so migrations must not contain semicolons inside literals or bodies
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+                              re.IGNORECASE)
+
+
+# Name of the index a CREATE INDEX CONCURRENTLY statement builds, None for other statements
+def concurrent_index_name(statement):
+    match = CONCURRENT_INDEX.match(statement)
+    return match.group(1) if match else None
+
+
+# A failed concurrent build leaves an INVALID index behind, which IF NOT EXISTS would then skip
+def _index_is_invalid(cur, name):
+    cur.execute("SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", (name,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _execute(cur, statement):
+    index = concurrent_index_name(statement)
+    if index is not None and _index_is_invalid(cur, index):
+        print(f"Dropping invalid index {index} left by a failed concurrent build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+    cur.execute(statement)
+    if index is not None and _index_is_invalid(cur, index):
+        raise RuntimeError(f"index {index} is invalid after CREATE INDEX CONCURRENTLY")
+
+
+# Applies db/migrations/*.sql that are not recorded in schema_migrations yet, in
+# file name order. db/init.sql only runs on an empty volume; migrations also
+# reach existing databases. Statements run in autocommit so that CREATE INDEX
+# CONCURRENTLY does not block writes, which is why migrations are written to be
+# re-runnable (IF NOT EXISTS) rather than relying on a transaction. An invalid
+# index from an earlier failed build is dropped and built again, and one that
+# is still invalid afterwards fails the migration.
+def apply_migrations(connect_kwargs, directory=MIGRATIONS_DIR):
+    conn = psycopg2.connect(**connect_kwargs)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute("CREATE TABLE IF NOT EXISTS schema_migrations "
+                        "(name TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())")
+            cur.execute("SELECT name FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.sql') or name in applied:
+                    continue
+                with open(os.path.join(directory, name)) as f:
+                    statements = split_statements(f.read())
+                for statement in statements:
+                    _execute(cur, statement)
+                cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                print(f"Applied migration {name}")
+    finally:
+        # Closing the session releases the advisory lock
+        conn.close()
@@ -0,0 +1,25 @@
+from proto import service_pb2
+
+# Supplier columns a read_mask may select. SQL column lists are only ever built from these names.
+SUPPLIER_COLUMNS = ('id', 'company_name', 'contact_person', 'phone', 'version')
+
+
+# Columns for a read_mask. id is always selected: keyset pagination and the
+# gateway's cache entries rely on it. An empty mask selects every column.
+def supplier_columns(read_mask):
+    paths = set(read_mask.paths)
+    if not paths:
+        return SUPPLIER_COLUMNS
+    unknown = paths - set(SUPPLIER_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown fields in read_mask: {', '.join(sorted(unknown))}")
+    return tuple(column for column in SUPPLIER_COLUMNS if column == 'id' or column in paths)
+
+
+def select_list(columns):
+    return ", ".join(columns)
+
+
+# Only the selected fields are set, so the others are not serialized at all
+def supplier_from_row(columns, row):
+    return service_pb2.Supplier(**dict(zip(columns, row)))
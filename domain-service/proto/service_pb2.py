@@ -22,27 +22,52 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\x12\x05proto\"S\n\x08Supplier\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x14\n\x0c\x63ompany_name\x18\x02 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\"7\n\x11SuppliersResponse\x12\"\n\tsuppliers\x18\x01 \x03(\x0b\x32\x0f.proto.Supplier\"T\n\x15\x43reateSupplierRequest\x12\x14\n\x0c\x63ompany_name\x18\x01 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x02 \x01(\t\x12\r\n\x05phone\x18\x03 \x01(\t\"`\n\x15UpdateSupplierRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x14\n\x0c\x63ompany_name\x18\x02 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\"#\n\x15\x44\x65leteSupplierRequest\x12\n\n\x02id\x18\x01 \x01(\x05\"\x07\n\x05\x45mpty2\x89\x02\n\x0fSupplierService\x12?\n\x0e\x43reateSupplier\x12\x1c.proto.CreateSupplierRequest\x1a\x0f.proto.Supplier\x12\x36\n\x0cGetSuppliers\x12\x0c.proto.Empty\x1a\x18.proto.SuppliersResponse\x12?\n\x0eUpdateSupplier\x12\x1c.proto.UpdateSupplierRequest\x1a\x0f.proto.Supplier\x12<\n\x0e\x44\x65leteSupplier\x12\x1c.proto.DeleteSupplierRequest\x1a\x0c.proto.Emptyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rservice.proto\x12\x05proto\x1a google/protobuf/field_mask.proto\"d\n\x08Supplier\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x14\n\x0c\x63ompany_name\x18\x02 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\x12\x0f\n\x07version\x18\x05 \x01(\x03\"7\n\x11SuppliersResponse\x12\"\n\tsuppliers\x18\x01 \x03(\x0b\x32\x0f.proto.Supplier\"D\n\x13GetSuppliersRequest\x12-\n\tread_mask\x18\x01 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"O\n\x12GetSupplierRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12-\n\tread_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"o\n\x17GetSuppliersPageRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\x12-\n\tread_mask\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"L\n\rSuppliersPage\x12\"\n\tsuppliers\x18\x01 \x03(\x0b\x32\x0f.proto.Supplier\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"[\n\x16StreamSuppliersRequest\x12\x12\n\nbatch_size\x18\x01 \x01(\x05\x12-\n\tread_mask\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"\xe4\x01\n\x16SearchSuppliersRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x32\n\x05match\x18\x02 \x01(\x0e\x32#.proto.SearchSuppliersRequest.Match\x12\r\n\x05phone\x18\x03 \x01(\t\x12\x11\n\tpage_size\x18\x04 \x01(\x05\x12\x12\n\npage_token\x18\x05 \x01(\t\x12-\n\tread_mask\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"\"\n\x05Match\x12\r\n\tSUBSTRING\x10\x00\x12\n\n\x06PREFIX\x10\x01\"B\n\x15WatchSuppliersRequest\x12\x15\n\rsince_version\x18\x01 \x01(\t\x12\x12\n\nbatch_size\x18\x02 \x01(\x05\"\x9d\x01\n\x0eSupplierChange\x12\x32\n\toperation\x18\x01 \x01(\x0e\x32\x1f.proto.SupplierChange.Operation\x12!\n\x08supplier\x18\x02 \x01(\x0b\x32\x0f.proto.Supplier\x12\x0f\n\x07version\x18\x03 \x01(\x03\"#\n\tOperation\x12\n\n\x06UPSERT\x10\x00\x12\n\n\x06\x44\x45LETE\x10\x01\"g\n\x0fSupplierChanges\x12&\n\x07\x63hanges\x18\x01 \x03(\x0b\x32\x15.proto.SupplierChange\x12\x0f\n\x07version\x18\x02 \x01(\t\x12\r\n\x05reset\x18\x03 \x01(\x08\x12\x0c\n\x04live\x18\x04 \x01(\x08\"T\n\x15\x43reateSupplierRequest\x12\x14\n\x0c\x63ompany_name\x18\x01 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x02 \x01(\t\x12\r\n\x05phone\x18\x03 \x01(\t\"^\n\x1b\x43reateSuppliersBatchRequest\x12/\n\tsuppliers\x18\x01 \x03(\x0b\x32\x1c.proto.CreateSupplierRequest\x12\x0e\n\x06job_id\x18\x02 \x01(\t\"`\n\x15UpdateSupplierRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x14\n\x0c\x63ompany_name\x18\x02 \x01(\t\x12\x16\n\x0e\x63ontact_person\x18\x03 \x01(\t\x12\r\n\x05phone\x18\x04 \x01(\t\"#\n\x15\x44\x65leteSupplierRequest\x12\n\n\x02id\x18\x01 \x01(\x05\"\x07\n\x05\x45mpty2\xfc\x04\n\x0fSupplierService\x12?\n\x0e\x43reateSupplier\x12\x1c.proto.CreateSupplierRequest\x1a\x0f.proto.Supplier\x12\x44\n\x0cGetSuppliers\x12\x1a.proto.GetSuppliersRequest\x1a\x18.proto.SuppliersResponse\x12H\n\x10GetSuppliersPage\x12\x1e.proto.GetSuppliersPageRequest\x1a\x14.proto.SuppliersPage\x12\x39\n\x0bGetSupplier\x12\x19.proto.GetSupplierRequest\x1a\x0f.proto.Supplier\x12?\n\x0eUpdateSupplier\x12\x1c.proto.UpdateSupplierRequest\x1a\x0f.proto.Supplier\x12<\n\x0e\x44\x65leteSupplier\x12\x1c.proto.DeleteSupplierRequest\x1a\x0c.proto.Empty\x12L\n\x0fStreamSuppliers\x12\x1d.proto.StreamSuppliersRequest\x1a\x18.proto.SuppliersResponse0\x01\x12\x46\n\x0fSearchSuppliers\x12\x1d.proto.SearchSuppliersRequest\x1a\x14.proto.SuppliersPage\x12H\n\x0eWatchSuppliers\x12\x1c.proto.WatchSuppliersRequest\x1a\x16.proto.SupplierChanges0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'service_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_SUPPLIER']._serialized_start=24
-  _globals['_SUPPLIER']._serialized_end=107
-  _globals['_SUPPLIERSRESPONSE']._serialized_start=109
-  _globals['_SUPPLIERSRESPONSE']._serialized_end=164
-  _globals['_CREATESUPPLIERREQUEST']._serialized_start=166
-  _globals['_CREATESUPPLIERREQUEST']._serialized_end=250
-  _globals['_UPDATESUPPLIERREQUEST']._serialized_start=252
-  _globals['_UPDATESUPPLIERREQUEST']._serialized_end=348
-  _globals['_DELETESUPPLIERREQUEST']._serialized_start=350
-  _globals['_DELETESUPPLIERREQUEST']._serialized_end=385
-  _globals['_EMPTY']._serialized_start=387
-  _globals['_EMPTY']._serialized_end=394
-  _globals['_SUPPLIERSERVICE']._serialized_start=397
-  _globals['_SUPPLIERSERVICE']._serialized_end=662
+  _globals['_SUPPLIER']._serialized_start=58
+  _globals['_SUPPLIER']._serialized_end=158
+  _globals['_SUPPLIERSRESPONSE']._serialized_start=160
+  _globals['_SUPPLIERSRESPONSE']._serialized_end=215
+  _globals['_GETSUPPLIERSREQUEST']._serialized_start=217
+  _globals['_GETSUPPLIERSREQUEST']._serialized_end=285
+  _globals['_GETSUPPLIERREQUEST']._serialized_start=287
+  _globals['_GETSUPPLIERREQUEST']._serialized_end=366
+  _globals['_GETSUPPLIERSPAGEREQUEST']._serialized_start=368
+  _globals['_GETSUPPLIERSPAGEREQUEST']._serialized_end=479
+  _globals['_SUPPLIERSPAGE']._serialized_start=481
+  _globals['_SUPPLIERSPAGE']._serialized_end=557
+  _globals['_STREAMSUPPLIERSREQUEST']._serialized_start=559
+  _globals['_STREAMSUPPLIERSREQUEST']._serialized_end=650
+  _globals['_SEARCHSUPPLIERSREQUEST']._serialized_start=653
+  _globals['_SEARCHSUPPLIERSREQUEST']._serialized_end=881
+  _globals['_SEARCHSUPPLIERSREQUEST_MATCH']._serialized_start=847
+  _globals['_SEARCHSUPPLIERSREQUEST_MATCH']._serialized_end=881
+  _globals['_WATCHSUPPLIERSREQUEST']._serialized_start=883
+  _globals['_WATCHSUPPLIERSREQUEST']._serialized_end=949
+  _globals['_SUPPLIERCHANGE']._serialized_start=952
+  _globals['_SUPPLIERCHANGE']._serialized_end=1109
+  _globals['_SUPPLIERCHANGE_OPERATION']._serialized_start=1074
+  _globals['_SUPPLIERCHANGE_OPERATION']._serialized_end=1109
+  _globals['_SUPPLIERCHANGES']._serialized_start=1111
+  _globals['_SUPPLIERCHANGES']._serialized_end=1214
+  _globals['_CREATESUPPLIERREQUEST']._serialized_start=1216
+  _globals['_CREATESUPPLIERREQUEST']._serialized_end=1300
+  _globals['_CREATESUPPLIERSBATCHREQUEST']._serialized_start=1302
+  _globals['_CREATESUPPLIERSBATCHREQUEST']._serialized_end=1396
+  _globals['_UPDATESUPPLIERREQUEST']._serialized_start=1398
+  _globals['_UPDATESUPPLIERREQUEST']._serialized_end=1494
+  _globals['_DELETESUPPLIERREQUEST']._serialized_start=1496
+  _globals['_DELETESUPPLIERREQUEST']._serialized_end=1531
+  _globals['_EMPTY']._serialized_start=1533
+  _globals['_EMPTY']._serialized_end=1540
+  _globals['_SUPPLIERSERVICE']._serialized_start=1543
+  _globals['_SUPPLIERSERVICE']._serialized_end=2179
 # @@protoc_insertion_point(module_scope)
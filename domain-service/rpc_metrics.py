@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import grpc
+from prometheus_client import Histogram
+
+# Handling time per RPC and status code. Streaming RPCs are measured until the
+# stream ends, so WatchSuppliers (open for as long as the gateway watches) lands
+# in the +Inf bucket and is best filtered out of latency panels.
+RPC_LATENCY = Histogram('grpc_server_handling_seconds', 'Time to handle an RPC', ['method', 'code'],
+                        buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+
+def _method(handler_call_details):
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+def _code(context, error=None):
+    code = context.code()
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    return 'UNKNOWN' if error is not None else 'OK'
+
+
+# Wraps the behavior of a unary or server-streaming handler; other handlers are left as they are
+def wrap_handler(handler, unary, stream):
+    if handler is None:
+        return None
+    if handler.unary_unary is not None:
+        return grpc.unary_unary_rpc_method_handler(unary(handler.unary_unary),
+                                                   request_deserializer=handler.request_deserializer,
+                                                   response_serializer=handler.response_serializer)
+    if handler.unary_stream is not None:
+        return grpc.unary_stream_rpc_method_handler(stream(handler.unary_stream),
+                                                    request_deserializer=handler.request_deserializer,
+                                                    response_serializer=handler.response_serializer)
+    return handler
+
+
+# Records RPC_LATENCY for the threaded server
+class RpcMetricsInterceptor(grpc.ServerInterceptor):
+    def intercept_service(self, continuation, handler_call_details):
+        method = _method(handler_call_details)
+
+        def unary(behavior):
+            def timed(request, context):
+                start, error = time.perf_counter(), None
+                try:
+                    return behavior(request, context)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    RPC_LATENCY.labels(method=method, code=_code(context, error)).observe(time.perf_counter() - start)
+            return timed
+
+        def stream(behavior):
+            def timed(request, context):
+                start, code = time.perf_counter(), None
+                try:
+                    yield from behavior(request, context)
+                except GeneratorExit:
+                    code = 'CANCELLED'
+                    raise
+                except Exception:
+                    code = _code(context, True)
+                    raise
+                finally:
+                    RPC_LATENCY.labels(method=method, code=code or _code(context)).observe(
+                        time.perf_counter() - start)
+            return timed
+
+        return wrap_handler(continuation(handler_call_details), unary, stream)
+
+
+# The same for grpc.aio; put it first so that calls rejected by other interceptors are measured too
+class AsyncRpcMetricsInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        method = _method(handler_call_details)
+
+        def unary(behavior):
+            async def timed(request, context):
+                start, error = time.perf_counter(), None
+                try:
+                    return await behavior(request, context)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    RPC_LATENCY.labels(method=method, code=_code(context, error)).observe(time.perf_counter() - start)
+            return timed
+
+        def stream(behavior):
+            async def timed(request, context):
+                start, code = time.perf_counter(), None
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                except asyncio.CancelledError:
+                    code = 'CANCELLED'
+                    raise
+                except Exception:
+                    code = _code(context, True)
+                    raise
+                finally:
+                    RPC_LATENCY.labels(method=method, code=code or _code(context)).observe(
+                        time.perf_counter() - start)
+            return timed
+
+        return wrap_handler(await continuation(handler_call_details), unary, stream)
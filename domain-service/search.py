@@ -0,0 +1,39 @@
+from proto import service_pb2
+
+
+# Escape LIKE wildcards so user input is matched literally (backslash is the default ESCAPE)
+def like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# SQL and parameters for a SearchSuppliers request. `placeholder(n)` renders the
+# n-th parameter for the driver: "%s" for psycopg2, "$n" for asyncpg.
+# Prefix search compares lower(column) so the text_pattern_ops indexes apply;
+# substring search uses ILIKE, served by the pg_trgm GIN indexes. Both come from
+# db/migrations/001_supplier_search_indexes.sql. Raises ValueError when neither
+# query nor phone is given.
+def search_query(request, columns, after_id, limit, placeholder):
+    params = []
+
+    def param(value):
+        params.append(value)
+        return placeholder(len(params))
+
+    conditions = []
+    query = request.query.strip()
+    if query:
+        if request.match == service_pb2.SearchSuppliersRequest.PREFIX:
+            pattern = like_escape(query.lower()) + '%'
+            conditions.append(f"(lower(company_name) LIKE {param(pattern)} "
+                              f"OR lower(contact_person) LIKE {param(pattern)})")
+        else:
+            pattern = '%' + like_escape(query) + '%'
+            conditions.append(f"(company_name ILIKE {param(pattern)} OR contact_person ILIKE {param(pattern)})")
+    if request.phone:
+        conditions.append(f"phone = {param(request.phone)}")
+    if not conditions:
+        raise ValueError("query or phone is required")
+
+    conditions.append(f"id > {param(after_id)}")
+    sql = f"SELECT {columns} FROM suppliers WHERE {' AND '.join(conditions)} ORDER BY id LIMIT {param(limit)}"
+    return sql, params
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules are imported as the service runs them, from its own directory; the
+# generated grpc stubs import service_pb2 from proto/ directly
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVICE_DIR, os.path.join(SERVICE_DIR, 'proto')]
@@ -0,0 +1,56 @@
+import threading
+from concurrent import futures
+
+import grpc
+import pytest
+
+from aio_server import ConcurrencyLimitInterceptor
+from proto import service_pb2, service_pb2_grpc
+
+
+# Each export sends one batch, then holds its worker thread until released
+class BlockingExports(service_pb2_grpc.SupplierServiceServicer):
+    def __init__(self):
+        self.release = threading.Event()
+
+    def StreamSuppliers(self, request, context):
+        yield service_pb2.SuppliersResponse(suppliers=[service_pb2.Supplier(id=1)])
+        self.release.wait(timeout=10)
+
+    def GetSupplier(self, request, context):
+        return service_pb2.Supplier(id=request.id)
+
+
+@pytest.fixture
+def stub():
+    servicer = BlockingExports()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8),
+                         interceptors=[ConcurrencyLimitInterceptor({'StreamSuppliers': 2})])
+    service_pb2_grpc.add_SupplierServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    channel = grpc.insecure_channel(f'127.0.0.1:{port}')
+    yield service_pb2_grpc.SupplierServiceStub(channel), servicer
+    servicer.release.set()
+    channel.close()
+    server.stop(grace=None)
+
+
+def test_third_concurrent_export_is_rejected(stub):
+    stub, servicer = stub
+    exports = [stub.StreamSuppliers(service_pb2.StreamSuppliersRequest()) for _ in range(2)]
+    for export in exports:
+        next(export)  # both exports are running and hold their slots
+
+    with pytest.raises(grpc.RpcError) as rejected:
+        next(stub.StreamSuppliers(service_pb2.StreamSuppliersRequest()))
+    assert rejected.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+    # Methods without a limit are not affected
+    assert stub.GetSupplier(service_pb2.GetSupplierRequest(id=7)).id == 7
+
+    # A finished export frees its slot
+    servicer.release.set()
+    for export in exports:
+        assert list(export) == []
+    assert next(stub.StreamSuppliers(service_pb2.StreamSuppliersRequest())).suppliers[0].id == 1
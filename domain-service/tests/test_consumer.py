@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+from prometheus_client import REGISTRY
+
+import consumer
+from consumer import apply_operations, coalesce_operations
+from proto import service_pb2
+
+
+def create(name):
+    return 'create_supplier', service_pb2.CreateSupplierRequest(company_name=name)
+
+
+def update(supplier_id, name):
+    return 'update_supplier', service_pb2.UpdateSupplierRequest(id=supplier_id, company_name=name)
+
+
+def delete(supplier_id):
+    return 'delete_supplier', service_pb2.DeleteSupplierRequest(id=supplier_id)
+
+
+def test_creates_are_all_kept_in_order():
+    operations = [create('a'), create('a'), create('b')]
+    assert coalesce_operations(operations) == operations
+
+
+def test_last_update_of_a_supplier_wins():
+    result = coalesce_operations([update(1, 'first'), update(2, 'other'), update(1, 'last')])
+    assert result == [update(1, 'last'), update(2, 'other')]
+
+
+def test_delete_overrides_earlier_updates():
+    assert coalesce_operations([update(1, 'a'), update(1, 'b'), delete(1)]) == [delete(1)]
+
+
+def test_delete_overrides_later_updates():
+    assert coalesce_operations([delete(1), update(1, 'a')]) == [delete(1)]
+
+
+def test_result_is_grouped_as_creates_updates_deletes():
+    operations = [delete(3), update(1, 'a'), create('x'), delete(2), update(4, 'b'), create('y')]
+    assert coalesce_operations(operations) == [create('x'), create('y'), update(1, 'a'), update(4, 'b'),
+                                               delete(3), delete(2)]
+
+
+def coalesced(kind):
+    return REGISTRY.get_sample_value('consumer_coalesced_messages_total', {'kind': kind}) or 0
+
+
+def test_coalesced_messages_are_counted():
+    before = coalesced('update_supplier')
+    coalesce_operations([update(1, 'a'), update(1, 'b'), delete(1)])
+    assert coalesced('update_supplier') == before + 2
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    calls = []
+    for kind in consumer.APPLIERS:
+        monkeypatch.setitem(consumer.APPLIERS, kind,
+                            lambda cur, requests, kind=kind: calls.append((kind, len(requests))) or [])
+    return calls
+
+
+def test_consecutive_operations_of_a_kind_share_a_statement(statements):
+    apply_operations(None, coalesce_operations([create('a'), update(1, 'a'), create('b'), delete(2), update(3, 'c')]))
+    assert statements == [('create_supplier', 2), ('update_supplier', 2), ('delete_supplier', 1)]
+
+
+def test_operations_are_applied_in_the_given_order(statements):
+    apply_operations(None, [create('a'), delete(1), create('b')])
+    assert statements == [('create_supplier', 1), ('delete_supplier', 1), ('create_supplier', 1)]
+
+
+class Channel:
+    def __init__(self):
+        self.settled = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.settled.append(('ack', delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.settled.append(('requeue' if requeue else 'reject', delivery_tag, multiple))
+
+
+class Cursor:
+    def execute(self, sql):
+        pass
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def cursor(self):
+        return Cursor()
+
+    def commit(self):
+        pass
+
+
+class Pool:
+    @contextmanager
+    def connection(self):
+        yield Connection()
+
+
+def delivery(tag, kind, grpc_request, headers=None):
+    method = SimpleNamespace(delivery_tag=tag, routing_key=kind)
+    properties = SimpleNamespace(type=kind, headers=headers)
+    return method, properties, grpc_request.SerializeToString(), kind, 0, None
+
+
+@pytest.fixture
+def batching_consumer(monkeypatch):
+    monkeypatch.setattr(consumer.time, 'sleep', lambda seconds: None)
+    progress = []
+    batching = consumer.BatchingConsumer(None, queues=[], db_pool=Pool(),
+                                         on_applied=lambda jobs, counter: progress.append((counter, jobs)))
+    batching._channel = Channel()
+    return batching, progress
+
+
+# apply_operations that fails the whole batch, then each operation by its error in `errors`
+def failing_operations(monkeypatch, errors):
+    def apply(cur, operations):
+        if len(operations) > 1:
+            raise psycopg2.IntegrityError('batch failed')
+        for _, grpc_request in operations:
+            error = errors.get(getattr(grpc_request, 'id', None) or grpc_request.company_name)
+            if error is not None:
+                raise error
+        return []
+    monkeypatch.setattr(consumer, 'apply_operations', apply)
+
+
+# A database outage during the per-message fallback requeues the rest of the batch instead of dropping it
+def test_fallback_requeues_the_rest_when_the_database_goes_away(batching_consumer, monkeypatch):
+    batching, _ = batching_consumer
+    failing_operations(monkeypatch, {2: psycopg2.OperationalError('connection lost')})
+    outcomes = batching._apply_batch([delivery(tag, 'update_supplier', update(tag, 'x')[1]) for tag in (1, 2, 3)])
+    assert batching._channel.settled == [('ack', 1, False), ('requeue', 3, True)]
+    assert outcomes == {2: 'requeue', 3: 'requeue'}
+
+
+def test_fallback_rejects_only_bad_messages(batching_consumer, monkeypatch):
+    batching, _ = batching_consumer
+    failing_operations(monkeypatch, {2: psycopg2.IntegrityError('bad row')})
+    outcomes = batching._apply_batch([delivery(tag, 'update_supplier', update(tag, 'x')[1]) for tag in (1, 2, 3)])
+    assert batching._channel.settled == [('ack', 1, False), ('reject', 2, False), ('ack', 3, False)]
+    assert outcomes == {2: 'reject'}
+
+
+def bulk_chunk(tag, job_id, names):
+    chunk = service_pb2.CreateSuppliersBatchRequest(job_id=job_id)
+    for name in names:
+        chunk.suppliers.add(company_name=name)
+    return delivery(tag, 'create_suppliers_batch', chunk)
+
+
+def test_bad_rows_of_a_bulk_chunk_are_reported_failed(batching_consumer, monkeypatch):
+    batching, progress = batching_consumer
+    failing_operations(monkeypatch, {'bad': psycopg2.DataError('bad row')})
+    outcomes = batching._apply_batch([bulk_chunk(1, 'job', ['a', 'bad', 'c'])])
+    assert batching._channel.settled == [('ack', 1, False)]
+    assert outcomes == {}
+    assert progress == [('rows_applied', {'job': 2}), ('rows_failed', {'job': 1})]
+
+
+# A lost connection requeues the chunk; none of its rows count as failed
+def test_lost_connection_requeues_a_bulk_chunk(batching_consumer, monkeypatch):
+    batching, progress = batching_consumer
+    failing_operations(monkeypatch, {'b': psycopg2.OperationalError('connection lost')})
+    outcomes = batching._apply_batch([bulk_chunk(1, 'job', ['a', 'b', 'c'])])
+    assert batching._channel.settled == [('requeue', 1, True)]
+    assert outcomes == {1: 'requeue'}
+    assert progress == []
@@ -0,0 +1,43 @@
+import fakeredis
+import pytest
+
+from events import SupplierChangeFeed, SupplierEventPublisher, supplier_event
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def publish(redis_client, *supplier_ids):
+    SupplierEventPublisher(redis_client).publish(
+        [supplier_event('delete', supplier_id, 1) for supplier_id in supplier_ids])
+
+
+def test_empty_stream_covers_nothing(redis_client):
+    feed = SupplierChangeFeed(redis_client)
+    assert feed.last_version() == '0-0'
+    assert not feed.covers('0-0')
+
+
+# A snapshot taken on an empty stream cannot resume: events may have been published and lost since
+def test_zero_version_is_not_covered_after_events(redis_client):
+    publish(redis_client, 1, 2)
+    assert not SupplierChangeFeed(redis_client).covers('0-0')
+
+
+def test_versions_held_by_the_stream_are_covered(redis_client):
+    publish(redis_client, 1, 2)
+    feed = SupplierChangeFeed(redis_client)
+    first, last = [entry_id.decode() for entry_id, _ in redis_client.xrange('suppliers:events')]
+    assert feed.covers(first) and feed.covers(last)
+    assert not feed.covers('99999999999999-0')
+    assert not feed.covers('not-a-version')
+
+
+def test_trimmed_version_is_not_covered(redis_client):
+    publish(redis_client, 1)
+    trimmed = SupplierChangeFeed(redis_client).last_version()
+    publish(redis_client, 2, 3)
+    redis_client.xtrim('suppliers:events', maxlen=1, approximate=False)
+    assert not SupplierChangeFeed(redis_client).covers(trimmed)
@@ -0,0 +1,63 @@
+import pytest
+
+import migrations
+from migrations import concurrent_index_name, split_statements
+
+
+def test_split_statements_drops_comments():
+    sql = "-- header; with a semicolon\nCREATE TABLE a (id INT);\n\n  -- note\nCREATE INDEX b ON a (id);\n"
+    assert split_statements(sql) == ["CREATE TABLE a (id INT)", "CREATE INDEX b ON a (id)"]
+
+
+@pytest.mark.parametrize('statement, name', [
+    ("CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_phone_idx\n    ON suppliers (phone)", 'suppliers_phone_idx'),
+    ("create unique index concurrently suppliers_x_idx on suppliers (x)", 'suppliers_x_idx'),
+    ("CREATE INDEX suppliers_y_idx ON suppliers (y)", None),
+    ("CREATE EXTENSION IF NOT EXISTS pg_trgm", None),
+])
+def test_concurrent_index_name(statement, name):
+    assert concurrent_index_name(statement) == name
+
+
+# Indexes as the catalog sees them: name -> valid; a build leaves `builds_valid`
+class Cursor:
+    def __init__(self, indexes, builds_valid=True):
+        self.indexes = dict(indexes)
+        self.builds_valid = builds_valid
+        self.executed = []
+        self._row = None
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self._row = None
+        if sql.startswith('SELECT NOT i.indisvalid'):
+            name = params[0]
+            self._row = (not self.indexes[name],) if name in self.indexes else None
+        elif sql.startswith('DROP INDEX CONCURRENTLY IF EXISTS '):
+            self.indexes.pop(sql.rsplit(' ', 1)[-1], None)
+        elif (name := concurrent_index_name(sql)) is not None and name not in self.indexes:
+            self.indexes[name] = self.builds_valid
+
+    def fetchone(self):
+        return self._row
+
+
+STATEMENT = "CREATE INDEX CONCURRENTLY IF NOT EXISTS suppliers_phone_idx ON suppliers (phone)"
+
+
+def test_invalid_index_from_a_failed_build_is_rebuilt():
+    cur = Cursor({'suppliers_phone_idx': False})
+    migrations._execute(cur, STATEMENT)
+    assert 'DROP INDEX CONCURRENTLY IF EXISTS suppliers_phone_idx' in cur.executed
+    assert cur.indexes == {'suppliers_phone_idx': True}
+
+
+def test_valid_index_is_kept():
+    cur = Cursor({'suppliers_phone_idx': True})
+    migrations._execute(cur, STATEMENT)
+    assert not any(sql.startswith('DROP') for sql in cur.executed)
+
+
+def test_index_still_invalid_after_the_build_fails_the_migration():
+    with pytest.raises(RuntimeError, match='suppliers_phone_idx'):
+        migrations._execute(Cursor({}, builds_valid=False), STATEMENT)
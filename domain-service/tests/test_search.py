@@ -0,0 +1,58 @@
+import pytest
+
+from proto import service_pb2
+from search import like_escape, search_query
+
+PREFIX = service_pb2.SearchSuppliersRequest.PREFIX
+SUBSTRING = service_pb2.SearchSuppliersRequest.SUBSTRING
+
+
+def psycopg2_placeholder(n):
+    return '%s'
+
+
+def asyncpg_placeholder(n):
+    return f'${n}'
+
+
+def test_like_escape_matches_wildcards_literally():
+    assert like_escape('50%_off') == '50\\%\\_off'
+
+
+def test_like_escape_escapes_the_escape_character_first():
+    assert like_escape('a\\%') == 'a\\\\\\%'
+
+
+def test_prefix_search_compares_lowercase_columns():
+    request = service_pb2.SearchSuppliersRequest(query='  Acme_ ', match=PREFIX)
+    sql, params = search_query(request, 'id, phone', 0, 10, psycopg2_placeholder)
+    assert sql == ("SELECT id, phone FROM suppliers WHERE (lower(company_name) LIKE %s OR lower(contact_person) "
+                   "LIKE %s) AND id > %s ORDER BY id LIMIT %s")
+    assert params == ['acme\\_%', 'acme\\_%', 0, 10]
+
+
+def test_substring_search_uses_ilike():
+    request = service_pb2.SearchSuppliersRequest(query='Acme', match=SUBSTRING)
+    sql, params = search_query(request, 'id', 5, 20, asyncpg_placeholder)
+    assert sql == ("SELECT id FROM suppliers WHERE (company_name ILIKE $1 OR contact_person ILIKE $2) "
+                   "AND id > $3 ORDER BY id LIMIT $4")
+    assert params == ['%Acme%', '%Acme%', 5, 20]
+
+
+def test_phone_is_matched_exactly_and_combined_with_query():
+    request = service_pb2.SearchSuppliersRequest(query='acme', match=PREFIX, phone='+7 900')
+    sql, params = search_query(request, 'id', 0, 10, asyncpg_placeholder)
+    assert 'phone = $3' in sql
+    assert params == ['acme%', 'acme%', '+7 900', 0, 10]
+
+
+def test_phone_alone_is_enough():
+    sql, params = search_query(service_pb2.SearchSuppliersRequest(phone='123'), 'id', 0, 10, psycopg2_placeholder)
+    assert sql == "SELECT id FROM suppliers WHERE phone = %s AND id > %s ORDER BY id LIMIT %s"
+    assert params == ['123', 0, 10]
+
+
+@pytest.mark.parametrize('query', ['', '   '])
+def test_query_or_phone_is_required(query):
+    with pytest.raises(ValueError):
+        search_query(service_pb2.SearchSuppliersRequest(query=query), 'id', 0, 10, psycopg2_placeholder)
@@ -0,0 +1,162 @@
+import os
+import time
+from contextlib import nullcontext
+
+import grpc
+from opentelemetry import propagate, trace
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import Link, SpanKind, Status, StatusCode
+
+from rpc_metrics import wrap_handler
+
+# Continues the gateway's traces: RPCs from the gRPC metadata, queued writes from
+# the AMQP message headers (W3C traceparent). Same settings as the gateway:
+# TRACE_EXPORTER is none, file (JSON lines in TRACE_FILE) or otlp (OTLP/HTTP to
+# TRACE_OTLP_ENDPOINT); spans are exported in batches by a BatchSpanProcessor
+# thread, tuned with the standard OTEL_BSP_* variables.
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+TRACE_FILE = os.getenv('TRACE_FILE', '/tmp/traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://jaeger:4318/v1/traces')
+# Only applies to traces started here; a propagated context keeps the gateway's decision
+TRACE_SAMPLE_RATIO = float(os.getenv('TRACE_SAMPLE_RATIO', '1.0'))
+
+DB_ATTRIBUTES = {'db.system': 'postgresql'}
+
+tracer = trace.get_tracer('domain-service')
+
+
+# One JSON span per line; each batch is a single O_APPEND write
+class JsonLinesSpanExporter(SpanExporter):
+    def __init__(self, path):
+        self._path = path
+
+    def export(self, spans):
+        data = ''.join(span.to_json(indent=None) + '\n' for span in spans).encode()
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Failed to write spans to {self._path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def setup_tracing(service_name):
+    if TRACE_EXPORTER == 'none':
+        return
+    if TRACE_EXPORTER == 'otlp':
+        exporter = OTLPSpanExporter(endpoint=TRACE_OTLP_ENDPOINT)
+    else:
+        exporter = JsonLinesSpanExporter(TRACE_FILE)
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}),
+                              sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+# Span for a statement, only inside a traced RPC or message: connection health
+# checks and migrations do not start traces of their own
+def db_span(operation):
+    if not trace.get_current_span().is_recording():
+        return nullcontext()
+    return tracer.start_as_current_span(f'db {operation}', kind=SpanKind.CLIENT,
+                                        attributes={**DB_ATTRIBUTES, 'db.operation': operation})
+
+
+# The same for asyncpg, whose query logger reports a statement after it finished
+def record_db_span(operation, elapsed):
+    if not trace.get_current_span().is_recording():
+        return
+    end = time.time_ns()
+    span = tracer.start_span(f'db {operation}', kind=SpanKind.CLIENT, start_time=end - int(elapsed * 1e9),
+                             attributes={**DB_ATTRIBUTES, 'db.operation': operation})
+    span.end(end_time=end)
+
+
+# Starts the span of a delivered message, continuing the trace of its publisher.
+# With the publish time (milliseconds since the epoch) the time the message
+# waited in the queue is recorded as a sibling span ending at delivery. The
+# caller ends the returned span once the message is acked.
+def start_consume_span(queue_name, properties, published_at=None, received_ns=None):
+    parent = propagate.extract(properties.headers or {})
+    received_ns = received_ns or time.time_ns()
+    attributes = {'messaging.system': 'rabbitmq', 'messaging.destination.name': queue_name,
+                  'messaging.message.type': properties.type or ''}
+    if published_at is not None:
+        wait = tracer.start_span(f'{queue_name} wait', context=parent, kind=SpanKind.INTERNAL, attributes=attributes,
+                                 start_time=min(int(published_at * 1e6), received_ns))
+        wait.end(end_time=received_ns)
+    return tracer.start_span(f'{queue_name} process', context=parent, kind=SpanKind.CONSUMER, attributes=attributes,
+                             start_time=received_ns)
+
+
+def end_consume_span(span, outcome):
+    span.set_attribute('messaging.outcome', outcome)
+    if outcome != 'ack':
+        span.set_status(Status(StatusCode.ERROR, outcome))
+    span.end()
+
+
+# Span of one consumer batch. Its messages may belong to different traces: the
+# batch joins the trace of the first sampled message and links to all of them,
+# so every message's trace leads to the statements and commit that applied it.
+def batch_span(name, message_spans):
+    contexts = [span.get_span_context() for span in message_spans]
+    parent = next((span for span in message_spans if span.get_span_context().trace_flags.sampled), None)
+    return tracer.start_as_current_span(name, context=trace.set_span_in_context(parent) if parent else None,
+                                        links=[Link(context) for context in contexts if context.is_valid],
+                                        attributes={'messaging.batch.message_count': len(message_spans)})
+
+
+def _rpc_span(handler_call_details):
+    method = handler_call_details.method.lstrip('/')
+    parent = propagate.extract({key: value for key, value in handler_call_details.invocation_metadata or ()})
+    return tracer.start_as_current_span(method, context=parent, kind=SpanKind.SERVER,
+                                        attributes={'rpc.system': 'grpc', 'rpc.method': method.rsplit('/', 1)[-1]})
+
+
+# Server span per RPC for the threaded server; a stream's span lasts until the stream ends
+class RpcTracingInterceptor(grpc.ServerInterceptor):
+    def intercept_service(self, continuation, handler_call_details):
+        def unary(behavior):
+            def traced(request, context):
+                with _rpc_span(handler_call_details):
+                    return behavior(request, context)
+            return traced
+
+        def stream(behavior):
+            def traced(request, context):
+                with _rpc_span(handler_call_details):
+                    yield from behavior(request, context)
+            return traced
+
+        return wrap_handler(continuation(handler_call_details), unary, stream)
+
+
+# The same for grpc.aio
+class AsyncRpcTracingInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        def unary(behavior):
+            async def traced(request, context):
+                with _rpc_span(handler_call_details):
+                    return await behavior(request, context)
+            return traced
+
+        def stream(behavior):
+            async def traced(request, context):
+                with _rpc_span(handler_call_details):
+                    async for response in behavior(request, context):
+                        yield response
+            return traced
+
+        return wrap_handler(await continuation(handler_call_details), unary, stream)
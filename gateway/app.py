@@ -1,44 +1,210 @@
 import sys
 sys.path.append('/app/proto')
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 import grpc
-import redis
-import json
+import itertools
 import pika
-import socket  # Добавляем импорт socket
-from prometheus_client import Counter, generate_latest
-from proto import service_pb2, service_pb2_grpc
+import json
+import os
+import time
+import atexit
+from prometheus_client import Counter, Histogram
+from proto import service_pb2
+from rabbitmq_publisher import (RabbitMQPublisherPool, SUPPLIERS_EXCHANGE, bulk_chunk_headers,
+                                declare_supplier_topology, jump_consistent_hash, publish_headers)
+from logstash_shipper import LogstashShipper
+from grpc_client import DomainServiceClient, parse_route_deadlines
+from bulk_import import BulkImportJobs, iter_rows
+from cache import LocalCache, SWRCache, SupplierEntryCache
+from suppliers import (DEFAULT_LIST_FIELDS, EXPORT_ERROR, FIELDS_ERROR, PAGE_ERROR, SEARCH_CACHE_TTL, SEARCH_ERROR,
+                       SEARCH_POPULAR_HITS, SEARCH_POPULAR_WINDOW, SUPPLIERS_LOCAL_KEYS, SUPPLIERS_PAGES_KEY,
+                       SUPPLIERS_SEARCHES_KEY, SupplierListRebuild, all_suppliers, event_changes, export_request,
+                       fetched_event, list_body, list_cache_key, ndjson_lines, page_body, page_cache_key, page_request,
+                       parse_export, parse_fields, parse_page, parse_search, response_variant, search_cache_key,
+                       search_request, supplier_entry, supplier_response_entry, supplier_to_dict, sync_write_error,
+                       sync_write_requested, uncached_entry)
+from supplier_events import SupplierEventListener
+from supplier_view import SupplierView
+from redis_metrics import InstrumentedRedis
+from multiprocess_metrics import metrics_payload
+from tracing import end_request_span, publish_span, setup_tracing, start_request_span
 # Убрали импорт logging_config
 
 app = Flask(__name__)
 
+# Трассировка (TRACE_EXPORTER, TRACE_SAMPLE_RATIO); в gunicorn - в каждом рабочем процессе
+setup_tracing('gateway')
+
 # Клиент Redis для кеширования
-redis_client = redis.Redis(host="redis", port=6379)
+redis_client = InstrumentedRedis(host="redis", port=6379)
+
+# Общий клиент domain-service (каналы переиспользуются, дедлайны задаются по маршрутам)
+domain_client = DomainServiceClient(
+    hosts=os.getenv('DOMAIN_SERVICE_HOST', 'domain-service'),  # можно перечислить реплики через запятую
+    port=os.getenv('DOMAIN_SERVICE_PORT', '50051'),
+    default_deadline=float(os.getenv('GRPC_DEADLINE_DEFAULT', '2.0')),
+    route_deadlines=parse_route_deadlines(os.getenv('GRPC_ROUTE_DEADLINES', '')),
+    hedge_delay=float(os.getenv('GRPC_HEDGE_DELAY_MS', '0')) / 1000,
+    hedge_max_attempts=int(os.getenv('GRPC_HEDGE_MAX_ATTEMPTS', '2')),
+)
 
 # Метрики для Prometheus
 REQUEST_COUNT = Counter('http_requests_total', 'Общее количество HTTP-запросов', ['method', 'endpoint'])
 
-# Функция для отправки gRPC-бинарников в RabbitMQ
-def send_grpc_to_rabbitmq(queue_name, grpc_message):
-    connection = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
-    channel = connection.channel()
-    channel.queue_declare(queue=queue_name)
-    channel.basic_publish(exchange='', routing_key=queue_name, body=grpc_message)
-    connection.close()
+# Время обработки запроса по шаблону маршрута (/suppliers/<int:id>, а не по
+# конкретному id) и коду ответа. У потоковых ответов (/suppliers/export)
+# замеряется время до начала ответа
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                            ['method', 'route', 'status'],
+                            buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Опросы Prometheus не трассируем
+    if request.path != '/metrics':
+        g.request_span = start_request_span(request.method, request_route(), request.headers)
+
+@app.after_request
+def observe_request_latency(response):
+    REQUEST_LATENCY.labels(method=request.method, route=request_route(), status=response.status_code).observe(
+        time.perf_counter() - g.request_start)
+    g.response_status = response.status_code
+    return response
+
+# Спан запроса завершается и после необработанного исключения
+@app.teardown_request
+def end_request_trace(error=None):
+    if 'request_span' in g:
+        end_request_span(*g.pop('request_span'), status_code=g.get('response_status'), error=error)
+
+# Число очередей-шардов; должно совпадать с SUPPLIER_SHARDS в domain-service
+SUPPLIER_SHARDS = int(os.getenv('SUPPLIER_SHARDS', '8'))
+
+# Пул долгоживущих соединений с RabbitMQ (exchange и шарды объявляются при открытии соединения)
+rabbitmq_publisher = RabbitMQPublisherPool(
+    host=os.getenv('RABBITMQ_HOST', 'rabbitmq'),
+    topology=lambda channel: declare_supplier_topology(channel, SUPPLIER_SHARDS),
+    size=int(os.getenv('RABBITMQ_POOL_SIZE', '4')),
+    confirms=os.getenv('RABBITMQ_CONFIRMS', '1') == '1',
+)
 
-# Функция отправки сообщений в Logstash
+# Создаваемые поставщики ещё не имеют id, их раскладываем по шардам по кругу
+create_shards = itertools.cycle(range(SUPPLIER_SHARDS))
+
+# Шард поставщика: все изменения одного поставщика попадают в одну очередь и применяются по порядку
+def supplier_shard(supplier_id=None):
+    if supplier_id is None:
+        return next(create_shards)
+    return jump_consistent_hash(supplier_id, SUPPLIER_SHARDS)
+
+# Функция для отправки gRPC-бинарников в RabbitMQ (тип операции передаётся в свойстве type)
+def send_grpc_to_rabbitmq(message_type, grpc_message, supplier_id=None, headers=None):
+    routing_key = str(supplier_shard(supplier_id))
+    with publish_span(SUPPLIERS_EXCHANGE, routing_key, message_type):
+        rabbitmq_publisher.publish(routing_key, grpc_message,
+                                   properties=pika.BasicProperties(type=message_type, headers=publish_headers(headers)),
+                                   exchange=SUPPLIERS_EXCHANGE)
+
+# Фоновая отправка событий в Logstash (очередь + постоянное соединение)
+logstash_shipper = LogstashShipper(
+    host=os.getenv('LOGSTASH_HOST', 'logstash'),  # Имя контейнера Logstash
+    port=int(os.getenv('LOGSTASH_PORT', '5044')),
+    max_queue=int(os.getenv('LOGSTASH_QUEUE_SIZE', '10000')),
+    batch_size=int(os.getenv('LOGSTASH_BATCH_SIZE', '500')),
+    overflow=os.getenv('LOGSTASH_OVERFLOW', 'drop'),  # drop или spill
+    spill_path=os.getenv('LOGSTASH_SPILL_PATH', '/tmp/logstash-spill.jsonl'),
+)
+atexit.register(logstash_shipper.close)
+
+# Функция отправки сообщений в Logstash (не блокирует обработчик запроса)
 def send_to_logstash(message):
-    host = 'logstash'  # Имя контейнера Logstash
-    port = 5044
-    try:
-        # Создаём TCP-сокет и подключаемся к Logstash
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((host, port))
-            s.sendall(message.encode('utf-8'))
-            print(f"Сообщение отправлено на {host}:{port}")
-    except Exception as e:
-        # Обработка ошибок
-        print(f"Ошибка при отправке сообщения в Logstash: {e}")
+    logstash_shipper.send(message)
+
+# Локальный кеш в памяти процесса перед Redis, сбрасывается на всех репликах через pub/sub
+local_cache = LocalCache(
+    redis_client,
+    max_entries=int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.getenv('CACHE_LOCAL_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl=int(os.getenv('CACHE_LOCAL_TTL', '30')),
+)
+
+# Кеш ответов: мягкий TTL - после него значение обновляется в фоне, жёсткий - после него удаляется
+suppliers_cache = SWRCache(
+    redis_client,
+    soft_ttl=int(os.getenv('CACHE_SOFT_TTL', '60')),
+    hard_ttl=int(os.getenv('CACHE_HARD_TTL', '600')),
+    lock_ttl=int(os.getenv('CACHE_LOCK_TTL', '10')),
+    encodings=os.getenv('CACHE_ENCODINGS', 'gzip,br').split(','),
+    local=local_cache,
+    version_key='suppliers:version',
+)
+
+# Задания массовой загрузки и размер пачки строк в одном сообщении RabbitMQ
+bulk_jobs = BulkImportJobs(redis_client)
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+
+# Записи отдельных поставщиков, из которых собирается список
+supplier_entries = SupplierEntryCache(redis_client, ttl=int(os.getenv('CACHE_HARD_TTL', '600')), local=local_cache)
+
+# Обновление кеша по событиям изменения из domain-service вместо сброса при публикации
+SUPPLIER_EVENTS_ENABLED = os.getenv('SUPPLIER_EVENTS', '1') == '1'
+
+# Сброс кеша: запись изменённого поставщика удаляется, список и страницы помечаются устаревшими
+def invalidate_suppliers_cache(supplier_id=None):
+    if supplier_id is not None:
+        supplier_entries.invalidate(supplier_id)
+    suppliers_cache.invalidate('suppliers', groups=[SUPPLIERS_PAGES_KEY, SUPPLIERS_SEARCHES_KEY])
+
+# Сброс кеша после публикации записи в RabbitMQ. Если включены события изменения
+# (SUPPLIER_EVENTS=1), кеш обновляется по ним после коммита в domain-service, а
+# сброс в момент публикации только вернул бы в кеш старые данные
+def invalidate_after_publish(supplier_id=None):
+    if not SUPPLIER_EVENTS_ENABLED:
+        invalidate_suppliers_cache(supplier_id)
+
+# События изменения поставщиков (id, operation, version), которые domain-service
+# публикует после коммита: записи поставщиков обновляются на месте с проверкой
+# версии, а версия кеша ответов увеличивается, поэтому списки, страницы и
+# результаты поиска, собранные раньше, обновляются при следующем чтении
+def apply_supplier_events(events):
+    supplier_entries.apply_changes(event_changes(events))
+    suppliers_cache.bump_version(local_keys=SUPPLIERS_LOCAL_KEYS)
+
+supplier_event_listener = SupplierEventListener(redis_client, apply_supplier_events)
+
+# Копия списка поставщиков в памяти процесса, которую поддерживает поток
+# WatchSuppliers из domain-service (SUPPLIER_VIEW=1). Пока поток открыт, полный
+# список (GET /suppliers без поиска и страниц) отдаётся из неё, иначе - через Redis
+SUPPLIER_VIEW_ENABLED = os.getenv('SUPPLIER_VIEW', '0') == '1'
+supplier_view = SupplierView(
+    domain_client,
+    batch_size=int(os.getenv('SUPPLIER_VIEW_BATCH_SIZE', '0')),
+    encodings=os.getenv('CACHE_ENCODINGS', 'gzip,br').split(','),
+)
+
+# Ответ из кеша: готовое тело отдаётся как есть, с ETag и подходящим сжатым вариантом
+def cached_response(entry):
+    body, etag, headers = response_variant(entry, request.if_none_match, request.accept_encodings)
+    if body is None:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
+
+# После синхронной записи запись поставщика обновляется на месте, а не удаляется;
+# список и страницы помечаются устаревшими
+def refresh_supplier_cache(supplier):
+    supplier_entries.refresh(supplier.id, supplier_entry(supplier), supplier.version)
+    suppliers_cache.invalidate('suppliers', groups=[SUPPLIERS_PAGES_KEY, SUPPLIERS_SEARCHES_KEY])
+
+def write_error_response(e, supplier_id=None):
+    error, status = sync_write_error(e, supplier_id)
+    return jsonify(error), status
 
 # Маршрут для создания поставщика (POST)
 @app.route('/suppliers', methods=['POST'])
@@ -46,13 +212,22 @@ def create_supplier():
     REQUEST_COUNT.labels(method='POST', endpoint='/suppliers').inc()
 
     data = request.get_json()
-    grpc_message = service_pb2.CreateSupplierRequest(
+    grpc_request = service_pb2.CreateSupplierRequest(
         company_name=data.get('company_name'),
         contact_person=data.get('contact_person'),
         phone=data.get('phone')
-    ).SerializeToString()
+    )
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            supplier = domain_client.call('CreateSupplier', grpc_request, route='create_supplier')
+        except grpc.RpcError as e:
+            return write_error_response(e)
+        refresh_supplier_cache(supplier)
+        send_to_logstash(json.dumps({"event": "create_supplier", "mode": "sync", **supplier_to_dict(supplier)}))
+        return jsonify({"data": supplier_to_dict(supplier)}), 201
 
-    send_grpc_to_rabbitmq('create_supplier', grpc_message)
+    send_grpc_to_rabbitmq('create_supplier', grpc_request.SerializeToString())
 
     data = request.get_json()
     company_name = data.get('company_name')
@@ -68,23 +243,95 @@ def create_supplier():
     })
     send_to_logstash(logstash_message)  # Отправляем сообщение в Logstash
 
-    redis_client.delete('suppliers')  # Очищаем кеш
+    invalidate_after_publish()  # Очищаем кеш
     return jsonify({"message": "Запрос на создание поставщика принят в обработку"}), 202
 
+# Маршрут для массовой загрузки поставщиков (POST, NDJSON или CSV). Тело читается
+# потоком, строки упаковываются в пачки CreateSuppliersBatchRequest и публикуются по мере чтения
+@app.route('/suppliers/bulk', methods=['POST'])
+def bulk_import_suppliers():
+    REQUEST_COUNT.labels(method='POST', endpoint='/suppliers/bulk').inc()
+
+    fmt = 'csv' if request.args.get('format') == 'csv' or request.mimetype == 'text/csv' else 'ndjson'
+    job_id = bulk_jobs.create(fmt)
+    progress = {counter: 0 for counter in ('rows_received', 'rows_published', 'rows_rejected', 'chunks_published')}
+    rejected_lines = []
+    chunk = service_pb2.CreateSuppliersBatchRequest(job_id=job_id)
+
+    def publish_chunk():
+        send_grpc_to_rabbitmq('create_suppliers_batch', chunk.SerializeToString(),
+                              headers=bulk_chunk_headers(job_id, len(chunk.suppliers)))
+        progress['rows_published'] += len(chunk.suppliers)
+        progress['chunks_published'] += 1
+        del chunk.suppliers[:]
+        bulk_jobs.update(job_id, **progress)
+
+    try:
+        for line_no, row in iter_rows(request.stream, fmt):
+            progress['rows_received'] += 1
+            if row is None or not row.get('company_name'):
+                progress['rows_rejected'] += 1
+                if len(rejected_lines) < 100:
+                    rejected_lines.append(line_no)
+                continue
+            chunk.suppliers.add(
+                company_name=str(row['company_name']),
+                contact_person=str(row.get('contact_person') or ''),
+                phone=str(row.get('phone') or ''),
+            )
+            if len(chunk.suppliers) >= BULK_CHUNK_SIZE:
+                publish_chunk()
+        if chunk.suppliers:
+            publish_chunk()
+    except Exception as e:
+        print(f"Ошибка при массовой загрузке поставщиков {job_id}: {e}")
+        bulk_jobs.update(job_id, status='failed', error=str(e), **progress)
+        return jsonify({"error": "Ошибка сервера, загрузка прервана", "job_id": job_id, **progress}), 500
+
+    bulk_jobs.update(job_id, status='queued', finished_at=time.time(), rejected_lines=json.dumps(rejected_lines),
+                     **progress)
+    invalidate_after_publish()  # Очищаем кеш один раз на всю загрузку
+
+    send_to_logstash(json.dumps({"event": "bulk_import_suppliers", "job_id": job_id, **progress}))
+    return jsonify({
+        "message": "Массовая загрузка поставщиков принята в обработку",
+        "job_id": job_id,
+        "rejected_lines": rejected_lines,
+        **progress
+    }), 202
+
+# Маршрут для получения прогресса массовой загрузки (GET)
+@app.route('/suppliers/bulk/<job_id>', methods=['GET'])
+def get_bulk_import(job_id):
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers/bulk').inc()
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Задание {job_id} не найдено"}), 404
+    return jsonify(job)
+
 # Маршрут для обновления поставщика (PUT)
 @app.route('/suppliers/<int:id>', methods=['PUT'])
 def update_supplier(id):
     REQUEST_COUNT.labels(method='PUT', endpoint='/suppliers').inc()
 
     data = request.get_json()
-    grpc_message = service_pb2.UpdateSupplierRequest(
+    grpc_request = service_pb2.UpdateSupplierRequest(
         id=id,
         company_name=data.get('company_name'),
         contact_person=data.get('contact_person'),
         phone=data.get('phone')
-    ).SerializeToString()
+    )
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            supplier = domain_client.call('UpdateSupplier', grpc_request, route='update_supplier')
+        except grpc.RpcError as e:
+            return write_error_response(e, id)
+        refresh_supplier_cache(supplier)
+        send_to_logstash(json.dumps({"event": "update_supplier", "mode": "sync", **supplier_to_dict(supplier)}))
+        return jsonify({"data": supplier_to_dict(supplier)}), 200
 
-    send_grpc_to_rabbitmq('update_supplier', grpc_message)
+    send_grpc_to_rabbitmq('update_supplier', grpc_request.SerializeToString(), id)
 
     data = request.get_json()
     company_name = data.get('company_name')
@@ -101,7 +348,7 @@ def update_supplier(id):
     })
     send_to_logstash(logstash_message)  # Отправляем сообщение в Logstash
 
-    redis_client.delete('suppliers')  # Очищаем кеш
+    invalidate_after_publish(id)  # Очищаем кеш
     return jsonify({"message": f"Запрос на обновление поставщика {id} принят в обработку"}), 202
 
 # Маршрут для удаления поставщика (DELETE)
@@ -109,8 +356,18 @@ def update_supplier(id):
 def delete_supplier(id):
     REQUEST_COUNT.labels(method='DELETE', endpoint='/suppliers').inc()
 
-    grpc_message = service_pb2.DeleteSupplierRequest(id=id).SerializeToString()
-    send_grpc_to_rabbitmq('delete_supplier', grpc_message)
+    grpc_request = service_pb2.DeleteSupplierRequest(id=id)
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            domain_client.call('DeleteSupplier', grpc_request, route='delete_supplier')
+        except grpc.RpcError as e:
+            return write_error_response(e, id)
+        invalidate_suppliers_cache(id)
+        send_to_logstash(json.dumps({"event": "delete_supplier", "mode": "sync", "id": id}))
+        return jsonify({"message": f"Поставщик {id} удалён"}), 200
+
+    send_grpc_to_rabbitmq('delete_supplier', grpc_request.SerializeToString(), id)
 
     # Отправляем в Logstash
     logstash_message = json.dumps({
@@ -119,49 +376,214 @@ def delete_supplier(id):
     })
     send_to_logstash(logstash_message)  # Отправляем сообщение в Logstash
 
-    redis_client.delete('suppliers')  # Очищаем кеш
+    invalidate_after_publish(id)  # Очищаем кеш
     return jsonify({"message": f"Запрос на удаление поставщика {id} принят в обработку"}), 202
 
 # Маршрут для получения данных о поставщиках (GET)
 @app.route('/suppliers', methods=['GET'])
 def get_suppliers():
     REQUEST_COUNT.labels(method='GET', endpoint='/suppliers').inc()  # Добавляем инкремент для GET
-    cached = redis_client.get('suppliers')
-
-    if cached:
-        # Логируем получение данных из кеша (выводим в консоль)
-        print('Возвращаем данные из кеша поставщиков')
-        return jsonify({"data": cached.decode('utf-8')})
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({"error": FIELDS_ERROR}), 400
+    if 'q' in request.args or 'phone' in request.args:
+        return search_suppliers(fields)
+    if 'limit' in request.args or 'after' in request.args:
+        return get_suppliers_page(fields)
+    if SUPPLIER_VIEW_ENABLED and supplier_view.ready:
+        return cached_response(supplier_view.response(fields))
 
     try:
-        with grpc.insecure_channel("domain-service:50051") as channel:
-            stub = service_pb2_grpc.SupplierServiceStub(channel)
-            response = stub.GetSuppliers(service_pb2.Empty())
-            suppliers = [{"id": s.id, "company_name": s.company_name} for s in response.suppliers]
-
-            # Устанавливаем новый кеш с временем жизни (например, 60 секунд)
-            redis_client.setex('suppliers', 60, str(suppliers))
-
-            # Логируем успешное получение данных (выводим в консоль)
-            print('Получены данные о поставщиках из сервисов домена')
-
-            # Отправляем в Logstash сообщение о том, что данные получены из сервиса
-            logstash_message = json.dumps({
-                "event": "get_suppliers",
-                "status": "fetched_from_service",
-                "data": suppliers
-            })
-            send_to_logstash(logstash_message)  # Отправляем сообщение в Logstash
-
-            return jsonify({"data": suppliers})
+        # Только один запрос на ключ обновляет кеш, остальные получают устаревшее значение.
+        # Каждая проекция списка (?fields=) кешируется под своим ключом в группе страниц
+        key, group = list_cache_key(fields)
+        cached = suppliers_cache.get(key, lambda: load_suppliers(fields), group=group)
     except Exception as e:
         print(f"Ошибка при получении данных о поставщиках: {e}")
         return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщиках"}), 500
+    return cached_response(cached)
+
+# Загрузка списка поставщиков (вызывается только при обновлении кеша): список
+# собирается из записей отдельных поставщиков, из domain-service дочитывается
+# только то, чего нет в кеше. Записи хранят все поля, поэтому любая проекция
+# строится из них без отдельного запроса
+def load_suppliers(fields=DEFAULT_LIST_FIELDS):
+    ids = supplier_entries.get_ids()
+    if ids is None:
+        suppliers = load_all_suppliers()
+    else:
+        suppliers = rebuild_suppliers(ids)
+    return list_body(suppliers, fields)
+
+# Полная загрузка списка: заполняет записи всех поставщиков и список id
+def load_all_suppliers():
+    response = domain_client.call('GetSuppliers', service_pb2.GetSuppliersRequest(), route='get_suppliers', hedge=True)
+    suppliers, entries, versions = all_suppliers(response)
+    supplier_entries.replace_all(entries, versions)
+
+    # Логируем успешное получение данных (выводим в консоль)
+    print('Получены данные о поставщиках из сервисов домена')
+
+    # Отправляем в Logstash сообщение о том, что данные получены из сервиса
+    send_to_logstash(fetched_event(suppliers))
+
+    return suppliers
+
+# Пересборка списка из закешированных записей
+def rebuild_suppliers(ids):
+    rebuild = SupplierListRebuild(ids, supplier_entries.get_many(ids))
+    if rebuild.too_many_missing:
+        return load_all_suppliers()
+
+    # Записи, сброшенные при обновлении или удалении, запрашиваем по одной
+    for supplier_id in rebuild.missing:
+        try:
+            supplier = domain_client.call('GetSupplier', service_pb2.GetSupplierRequest(id=supplier_id),
+                                          route='get_supplier', hedge=True)
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            rebuild.drop(supplier_id)
+            continue
+        rebuild.add(supplier)
+
+    grpc_request = rebuild.tail_request()
+    while grpc_request is not None:
+        page = domain_client.call('GetSuppliersPage', grpc_request, route='get_suppliers', hedge=True)
+        grpc_request = rebuild.add_page(page)
+
+    supplier_entries.put(rebuild.loaded, rebuild.versions)
+    if rebuild.ids is not None:
+        supplier_entries.set_ids(rebuild.ids)
+    return rebuild.suppliers()
+
+# Маршрут для получения одного поставщика (GET), запись кешируется отдельно
+@app.route('/suppliers/<int:id>', methods=['GET'])
+def get_supplier(id):
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers/<id>').inc()
+
+    entry = supplier_entries.get(id)
+    if entry is None:
+        try:
+            supplier = domain_client.call('GetSupplier', service_pb2.GetSupplierRequest(id=id), route='get_supplier',
+                                          hedge=True)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                return jsonify({"error": f"Поставщик {id} не найден"}), 404
+            print(f"Ошибка при получении поставщика {id}: {e}")
+            return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщике"}), 500
+        entry = supplier_entry(supplier).encode('utf-8')
+        supplier_entries.put({id: entry}, {id: supplier.version})
+
+    return cached_response(supplier_response_entry(entry))
+
+# Постраничная выдача поставщиков (?limit=&after=), каждая страница и проекция кешируется отдельно
+def get_suppliers_page(fields):
+    page = parse_page(request.args)
+    if page is None:
+        return jsonify({"error": PAGE_ERROR}), 400
+    limit, after = page
+
+    def load_page():
+        response = domain_client.call('GetSuppliersPage', page_request(limit, after, fields), route='get_suppliers',
+                                      hedge=True)
+        return page_body(response, fields)
+
+    try:
+        cached = suppliers_cache.get(page_cache_key(limit, after, fields), load_page, group=SUPPLIERS_PAGES_KEY)
+    except Exception as e:
+        print(f"Ошибка при получении страницы поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщиках"}), 500
+    return cached_response(cached)
+
+# Счётчик обращений к поисковому запросу в текущем окне: популярен ли он настолько, чтобы его кешировать
+def search_is_popular(key):
+    with redis_client.pipeline() as pipe:
+        pipe.incr(f"{key}:hits")
+        pipe.expire(f"{key}:hits", SEARCH_POPULAR_WINDOW, nx=True)
+        hits, _ = pipe.execute()
+    return hits >= SEARCH_POPULAR_HITS
+
+# Поиск поставщиков (?q=&match=contains|prefix&phone=&limit=&after=)
+def search_suppliers(fields):
+    search = parse_search(request.args)
+    if search is None:
+        return jsonify({"error": SEARCH_ERROR}), 400
+    page = parse_page(request.args)
+    if page is None:
+        return jsonify({"error": PAGE_ERROR}), 400
+    limit, after = page
+
+    def load_results():
+        response = domain_client.call('SearchSuppliers', search_request(search, limit, after, fields),
+                                      route='search_suppliers', hedge=True)
+        return page_body(response, fields)
 
-# Маршрут для метрик Prometheus
+    key = search_cache_key(search, limit, after, fields)
+    try:
+        if search_is_popular(key):
+            cached = suppliers_cache.get(key, load_results, group=SUPPLIERS_SEARCHES_KEY,
+                                         soft_ttl=SEARCH_CACHE_TTL, hard_ttl=2 * SEARCH_CACHE_TTL)
+        else:
+            cached = uncached_entry(load_results().encode('utf-8'))
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            return jsonify({"error": e.details()}), 400
+        print(f"Ошибка при поиске поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось найти поставщиков"}), 500
+    except Exception as e:
+        print(f"Ошибка при поиске поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось найти поставщиков"}), 500
+    return cached_response(cached)
+
+# Выгрузка всех поставщиков (GET) построчно в NDJSON: пачки строк из серверного
+# потока StreamSuppliers сразу отдаются клиенту, поэтому память не растёт с размером таблицы
+@app.route('/suppliers/export', methods=['GET'])
+def export_suppliers():
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers/export').inc()
+    export = parse_export(request.args)
+    if export is None:
+        return jsonify({"error": EXPORT_ERROR}), 400
+    batch_size, fields = export
+
+    responses = domain_client.stream('StreamSuppliers', export_request(batch_size, fields), route='export_suppliers')
+    # Первую пачку читаем до начала ответа, чтобы ошибку domain-service можно было вернуть кодом 500
+    try:
+        first = next(responses, None)
+    except grpc.RpcError as e:
+        print(f"Ошибка при выгрузке поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось выгрузить поставщиков"}), 500
+
+    def generate():
+        rows = 0
+        try:
+            chunk = first
+            while chunk is not None:
+                rows += len(chunk.suppliers)
+                yield ndjson_lines(chunk, fields)
+                chunk = next(responses, None)
+        except grpc.RpcError as e:
+            print(f"Выгрузка поставщиков прервана после {rows} строк: {e}")
+        finally:
+            # Клиент мог отключиться раньше времени: отменяем поток, чтобы освободить курсор в domain-service
+            responses.cancel()
+            send_to_logstash(json.dumps({"event": "export_suppliers", "rows": rows}))
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+# Маршрут для метрик Prometheus (в нескольких рабочих процессах - сумма по всем процессам)
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return generate_latest(), 200, {'Content-Type': 'text/plain'}
+    return metrics_payload(), 200, {'Content-Type': 'text/plain'}
+
+# Фоновые потоки процесса: при запуске через gunicorn стартуют в каждом рабочем
+# процессе после fork (post_worker_init в gunicorn.conf.py)
+def start_background_tasks():
+    if SUPPLIER_EVENTS_ENABLED:
+        supplier_event_listener.start()
+    if SUPPLIER_VIEW_ENABLED:
+        supplier_view.start()
 
 if __name__ == '__main__':
+    start_background_tasks()
     app.run(host='0.0.0.0', port=8080)
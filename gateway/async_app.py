@@ -0,0 +1,483 @@
+import sys
+sys.path.append('/app/proto')
+from quart import Quart, Response, g, jsonify, request
+import asyncio
+import grpc
+import itertools
+import json
+import os
+import atexit
+import time
+import uvicorn
+from prometheus_client import Counter, Histogram
+from proto import service_pb2
+from rabbitmq_publisher import SUPPLIERS_EXCHANGE, jump_consistent_hash
+from async_publisher import AsyncRabbitMQPublisher
+from logstash_shipper import LogstashShipper
+from grpc_client import AsyncDomainServiceClient, parse_route_deadlines
+from async_cache import AsyncSWRCache, AsyncSupplierEntryCache
+from suppliers import (DEFAULT_LIST_FIELDS, EXPORT_ERROR, FIELDS_ERROR, PAGE_ERROR, SEARCH_CACHE_TTL, SEARCH_ERROR,
+                       SEARCH_POPULAR_HITS, SEARCH_POPULAR_WINDOW, SUPPLIERS_LOCAL_KEYS, SUPPLIERS_PAGES_KEY,
+                       SUPPLIERS_SEARCHES_KEY, SupplierListRebuild, all_suppliers, event_changes, export_request,
+                       fetched_event, list_body, list_cache_key, ndjson_lines, page_body, page_cache_key, page_request,
+                       parse_export, parse_fields, parse_page, parse_search, response_variant, search_cache_key,
+                       search_request, supplier_entry, supplier_response_entry, supplier_to_dict, sync_write_error,
+                       sync_write_requested, uncached_entry)
+from supplier_events import AsyncSupplierEventListener
+from supplier_view import AsyncSupplierView
+from redis_metrics import AsyncInstrumentedRedis
+from multiprocess_metrics import metrics_payload, worker_exited
+from tracing import end_request_span, publish_span, setup_tracing, start_request_span
+
+# Шлюз на asyncio с теми же маршрутами /suppliers и /metrics, что и app.py.
+# Запускается ASGI-сервером uvicorn в GATEWAY_WORKERS рабочих процессах; каждый
+# процесс держит свои клиенты Redis, gRPC и RabbitMQ. Всё, что не делает ввода-вывода
+# (параметры, ключи кеша, тела ответов, пересборка списка), общее с app.py - в suppliers.py
+app = Quart(__name__)
+
+# Трассировка (TRACE_EXPORTER, TRACE_SAMPLE_RATIO), в каждом рабочем процессе
+setup_tracing('gateway')
+
+# Асинхронный клиент Redis для кеширования
+redis_client = AsyncInstrumentedRedis(host=os.getenv('REDIS_HOST', 'redis'), port=6379)
+
+# Клиент domain-service на grpc.aio (каналы создаются в цикле событий процесса)
+domain_client = AsyncDomainServiceClient(
+    hosts=os.getenv('DOMAIN_SERVICE_HOST', 'domain-service'),
+    port=os.getenv('DOMAIN_SERVICE_PORT', '50051'),
+    default_deadline=float(os.getenv('GRPC_DEADLINE_DEFAULT', '2.0')),
+    route_deadlines=parse_route_deadlines(os.getenv('GRPC_ROUTE_DEADLINES', '')),
+    hedge_delay=float(os.getenv('GRPC_HEDGE_DELAY_MS', '0')) / 1000,
+    hedge_max_attempts=int(os.getenv('GRPC_HEDGE_MAX_ATTEMPTS', '2')),
+)
+
+# Метрики для Prometheus
+REQUEST_COUNT = Counter('http_requests_total', 'Общее количество HTTP-запросов', ['method', 'endpoint'])
+
+# Время обработки запроса по шаблону маршрута и коду ответа (как в app.py)
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                            ['method', 'route', 'status'],
+                            buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+# Спан запроса - как в app.py
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request.path != '/metrics':
+        g.request_span = start_request_span(request.method, request_route(), request.headers)
+
+@app.after_request
+async def observe_request_latency(response):
+    REQUEST_LATENCY.labels(method=request.method, route=request_route(), status=response.status_code).observe(
+        time.perf_counter() - g.request_start)
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+async def end_request_trace(error=None):
+    if 'request_span' in g:
+        end_request_span(*g.pop('request_span'), status_code=g.get('response_status'), error=error)
+
+# Число очередей-шардов; должно совпадать с SUPPLIER_SHARDS в domain-service
+SUPPLIER_SHARDS = int(os.getenv('SUPPLIER_SHARDS', '8'))
+
+# Соединение с RabbitMQ открывается при старте рабочего процесса
+rabbitmq_publisher = AsyncRabbitMQPublisher(
+    host=os.getenv('RABBITMQ_HOST', 'rabbitmq'),
+    shards=SUPPLIER_SHARDS,
+    confirms=os.getenv('RABBITMQ_CONFIRMS', '1') == '1',
+)
+
+# Создаваемые поставщики ещё не имеют id, их раскладываем по шардам по кругу
+create_shards = itertools.cycle(range(SUPPLIER_SHARDS))
+
+# Шард поставщика: все изменения одного поставщика попадают в одну очередь и применяются по порядку
+def supplier_shard(supplier_id=None):
+    if supplier_id is None:
+        return next(create_shards)
+    return jump_consistent_hash(supplier_id, SUPPLIER_SHARDS)
+
+async def send_grpc_to_rabbitmq(message_type, grpc_message, supplier_id=None):
+    routing_key = str(supplier_shard(supplier_id))
+    with publish_span(SUPPLIERS_EXCHANGE, routing_key, message_type):
+        await rabbitmq_publisher.publish(routing_key, grpc_message, message_type)
+
+# Фоновая отправка событий в Logstash (очередь + постоянное соединение)
+logstash_shipper = LogstashShipper(
+    host=os.getenv('LOGSTASH_HOST', 'logstash'),
+    port=int(os.getenv('LOGSTASH_PORT', '5044')),
+    max_queue=int(os.getenv('LOGSTASH_QUEUE_SIZE', '10000')),
+    batch_size=int(os.getenv('LOGSTASH_BATCH_SIZE', '500')),
+    overflow=os.getenv('LOGSTASH_OVERFLOW', 'drop'),
+    spill_path=os.getenv('LOGSTASH_SPILL_PATH', '/tmp/logstash-spill.jsonl'),
+)
+atexit.register(logstash_shipper.close)
+
+# Отправка в Logstash только кладёт событие в очередь, поэтому не ждёт сети
+async def send_to_logstash(message):
+    logstash_shipper.send(message)
+
+# Кеш ответов в том же формате, что и у синхронного шлюза
+suppliers_cache = AsyncSWRCache(
+    redis_client,
+    soft_ttl=int(os.getenv('CACHE_SOFT_TTL', '60')),
+    hard_ttl=int(os.getenv('CACHE_HARD_TTL', '600')),
+    lock_ttl=int(os.getenv('CACHE_LOCK_TTL', '10')),
+    encodings=os.getenv('CACHE_ENCODINGS', 'gzip,br').split(','),
+    version_key='suppliers:version',
+)
+
+supplier_entries = AsyncSupplierEntryCache(redis_client, ttl=int(os.getenv('CACHE_HARD_TTL', '600')))
+
+# Обновление кеша по событиям изменения из domain-service вместо сброса при публикации
+SUPPLIER_EVENTS_ENABLED = os.getenv('SUPPLIER_EVENTS', '1') == '1'
+
+@app.before_serving
+async def startup():
+    await rabbitmq_publisher.connect()
+    if SUPPLIER_EVENTS_ENABLED:
+        supplier_event_listener.start()
+    if SUPPLIER_VIEW_ENABLED:
+        supplier_view.start()
+
+@app.after_serving
+async def shutdown():
+    await asyncio.gather(supplier_event_listener.stop(), supplier_view.stop())
+    await asyncio.gather(rabbitmq_publisher.close(), domain_client.close(), redis_client.aclose())
+    # У uvicorn нет хука завершения рабочего процесса в главном процессе, поэтому процесс отмечает себя сам
+    worker_exited(os.getpid())
+
+async def invalidate_suppliers_cache(supplier_id=None):
+    if supplier_id is not None:
+        await supplier_entries.invalidate(supplier_id)
+    await suppliers_cache.invalidate('suppliers', groups=[SUPPLIERS_PAGES_KEY, SUPPLIERS_SEARCHES_KEY])
+
+# События изменения поставщиков из domain-service (как apply_supplier_events синхронного шлюза)
+async def apply_supplier_events(events):
+    await supplier_entries.apply_changes(event_changes(events))
+    await suppliers_cache.bump_version(local_keys=SUPPLIERS_LOCAL_KEYS)
+
+supplier_event_listener = AsyncSupplierEventListener(redis_client, apply_supplier_events)
+
+# Копия списка поставщиков в памяти процесса (как supplier_view синхронного шлюза)
+SUPPLIER_VIEW_ENABLED = os.getenv('SUPPLIER_VIEW', '0') == '1'
+supplier_view = AsyncSupplierView(
+    domain_client,
+    batch_size=int(os.getenv('SUPPLIER_VIEW_BATCH_SIZE', '0')),
+    encodings=os.getenv('CACHE_ENCODINGS', 'gzip,br').split(','),
+)
+
+# Публикация, отправка в Logstash и сброс кеша выполняются одновременно. С событиями
+# изменения кеш не сбрасывается: он обновится после коммита в domain-service
+async def dispatch_write(message_type, grpc_message, logstash_message, supplier_id=None):
+    await asyncio.gather(
+        send_grpc_to_rabbitmq(message_type, grpc_message, supplier_id),
+        send_to_logstash(logstash_message),
+        *([] if SUPPLIER_EVENTS_ENABLED else [invalidate_suppliers_cache(supplier_id)]),
+    )
+
+# Запись поставщика обновляется на месте, отправка в Logstash идёт одновременно со сбросом списка
+async def refresh_supplier_cache(supplier, logstash_message):
+    await asyncio.gather(
+        supplier_entries.refresh(supplier.id, supplier_entry(supplier), supplier.version),
+        suppliers_cache.invalidate('suppliers', groups=[SUPPLIERS_PAGES_KEY, SUPPLIERS_SEARCHES_KEY]),
+        send_to_logstash(logstash_message),
+    )
+
+def write_error_response(e, supplier_id=None):
+    error, status = sync_write_error(e, supplier_id)
+    return jsonify(error), status
+
+def cached_response(entry):
+    body, etag, headers = response_variant(entry, request.if_none_match, request.accept_encodings)
+    if body is None:
+        response = Response('', status=304)
+    else:
+        response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
+
+# Маршрут для создания поставщика (POST)
+@app.route('/suppliers', methods=['POST'])
+async def create_supplier():
+    REQUEST_COUNT.labels(method='POST', endpoint='/suppliers').inc()
+
+    data = await request.get_json()
+    company_name = data.get('company_name')
+    contact_person = data.get('contact_person')
+    phone = data.get('phone')
+    grpc_request = service_pb2.CreateSupplierRequest(
+        company_name=company_name,
+        contact_person=contact_person,
+        phone=phone
+    )
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            supplier = await domain_client.call('CreateSupplier', grpc_request, route='create_supplier')
+        except grpc.aio.AioRpcError as e:
+            return write_error_response(e)
+        await refresh_supplier_cache(supplier, json.dumps({"event": "create_supplier", "mode": "sync",
+                                                           **supplier_to_dict(supplier)}))
+        return jsonify({"data": supplier_to_dict(supplier)}), 201
+
+    await dispatch_write('create_supplier', grpc_request.SerializeToString(), json.dumps({
+        "event": "create_supplier",
+        "company_name": company_name,
+        "contact_person": contact_person,
+        "phone": phone
+    }))
+    return jsonify({"message": "Запрос на создание поставщика принят в обработку"}), 202
+
+# Маршрут для обновления поставщика (PUT)
+@app.route('/suppliers/<int:id>', methods=['PUT'])
+async def update_supplier(id):
+    REQUEST_COUNT.labels(method='PUT', endpoint='/suppliers').inc()
+
+    data = await request.get_json()
+    company_name = data.get('company_name')
+    contact_person = data.get('contact_person')
+    phone = data.get('phone')
+    grpc_request = service_pb2.UpdateSupplierRequest(
+        id=id,
+        company_name=company_name,
+        contact_person=contact_person,
+        phone=phone
+    )
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            supplier = await domain_client.call('UpdateSupplier', grpc_request, route='update_supplier')
+        except grpc.aio.AioRpcError as e:
+            return write_error_response(e, id)
+        await refresh_supplier_cache(supplier, json.dumps({"event": "update_supplier", "mode": "sync",
+                                                           **supplier_to_dict(supplier)}))
+        return jsonify({"data": supplier_to_dict(supplier)}), 200
+
+    await dispatch_write('update_supplier', grpc_request.SerializeToString(), json.dumps({
+        "event": "update_supplier",
+        "id": id,
+        "company_name": company_name,
+        "contact_person": contact_person,
+        "phone": phone
+    }), id)
+    return jsonify({"message": f"Запрос на обновление поставщика {id} принят в обработку"}), 202
+
+# Маршрут для удаления поставщика (DELETE)
+@app.route('/suppliers/<int:id>', methods=['DELETE'])
+async def delete_supplier(id):
+    REQUEST_COUNT.labels(method='DELETE', endpoint='/suppliers').inc()
+
+    grpc_request = service_pb2.DeleteSupplierRequest(id=id)
+
+    if sync_write_requested(request.headers, request.args):
+        try:
+            await domain_client.call('DeleteSupplier', grpc_request, route='delete_supplier')
+        except grpc.aio.AioRpcError as e:
+            return write_error_response(e, id)
+        await asyncio.gather(
+            invalidate_suppliers_cache(id),
+            send_to_logstash(json.dumps({"event": "delete_supplier", "mode": "sync", "id": id})),
+        )
+        return jsonify({"message": f"Поставщик {id} удалён"}), 200
+
+    await dispatch_write('delete_supplier', grpc_request.SerializeToString(),
+                         json.dumps({"event": "delete_supplier", "id": id}), id)
+    return jsonify({"message": f"Запрос на удаление поставщика {id} принят в обработку"}), 202
+
+# Маршрут для получения данных о поставщиках (GET)
+@app.route('/suppliers', methods=['GET'])
+async def get_suppliers():
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers').inc()
+    fields = parse_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({"error": FIELDS_ERROR}), 400
+    if 'q' in request.args or 'phone' in request.args:
+        return await search_suppliers(fields)
+    if 'limit' in request.args or 'after' in request.args:
+        return await get_suppliers_page(fields)
+    if SUPPLIER_VIEW_ENABLED and supplier_view.ready:
+        return cached_response(await supplier_view.response(fields))
+
+    try:
+        key, group = list_cache_key(fields)
+        cached = await suppliers_cache.get(key, lambda: load_suppliers(fields), group=group)
+    except Exception as e:
+        print(f"Ошибка при получении данных о поставщиках: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщиках"}), 500
+    return cached_response(cached)
+
+async def load_suppliers(fields=DEFAULT_LIST_FIELDS):
+    ids = await supplier_entries.get_ids()
+    if ids is None:
+        suppliers = await load_all_suppliers()
+    else:
+        suppliers = await rebuild_suppliers(ids)
+    return list_body(suppliers, fields)
+
+async def load_all_suppliers():
+    response = await domain_client.call('GetSuppliers', service_pb2.GetSuppliersRequest(), route='get_suppliers',
+                                        hedge=True)
+    suppliers, entries, versions = all_suppliers(response)
+    await supplier_entries.replace_all(entries, versions)
+
+    print('Получены данные о поставщиках из сервисов домена')
+    await send_to_logstash(fetched_event(suppliers))
+    return suppliers
+
+async def fetch_supplier(supplier_id):
+    try:
+        return await domain_client.call('GetSupplier', service_pb2.GetSupplierRequest(id=supplier_id),
+                                        route='get_supplier', hedge=True)
+    except grpc.aio.AioRpcError as e:
+        if e.code() != grpc.StatusCode.NOT_FOUND:
+            raise
+        return None
+
+# Пересборка списка из закешированных записей; сброшенные записи запрашиваются параллельно
+async def rebuild_suppliers(ids):
+    rebuild = SupplierListRebuild(ids, await supplier_entries.get_many(ids))
+    if rebuild.too_many_missing:
+        return await load_all_suppliers()
+
+    missing = rebuild.missing
+    for supplier_id, supplier in zip(missing, await asyncio.gather(*(fetch_supplier(i) for i in missing))):
+        if supplier is None:
+            rebuild.drop(supplier_id)
+        else:
+            rebuild.add(supplier)
+
+    grpc_request = rebuild.tail_request()
+    while grpc_request is not None:
+        page = await domain_client.call('GetSuppliersPage', grpc_request, route='get_suppliers', hedge=True)
+        grpc_request = rebuild.add_page(page)
+
+    await supplier_entries.put(rebuild.loaded, rebuild.versions)
+    if rebuild.ids is not None:
+        await supplier_entries.set_ids(rebuild.ids)
+    return rebuild.suppliers()
+
+# Маршрут для получения одного поставщика (GET)
+@app.route('/suppliers/<int:id>', methods=['GET'])
+async def get_supplier(id):
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers/<id>').inc()
+
+    entry = await supplier_entries.get(id)
+    if entry is None:
+        try:
+            supplier = await fetch_supplier(id)
+        except grpc.aio.AioRpcError as e:
+            print(f"Ошибка при получении поставщика {id}: {e}")
+            return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщике"}), 500
+        if supplier is None:
+            return jsonify({"error": f"Поставщик {id} не найден"}), 404
+        entry = supplier_entry(supplier).encode('utf-8')
+        await supplier_entries.put({id: entry}, {id: supplier.version})
+
+    return cached_response(supplier_response_entry(entry))
+
+# Постраничная выдача поставщиков (?limit=&after=), каждая страница и проекция кешируется отдельно
+async def get_suppliers_page(fields):
+    page = parse_page(request.args)
+    if page is None:
+        return jsonify({"error": PAGE_ERROR}), 400
+    limit, after = page
+
+    async def load_page():
+        response = await domain_client.call('GetSuppliersPage', page_request(limit, after, fields),
+                                            route='get_suppliers', hedge=True)
+        return page_body(response, fields)
+
+    try:
+        cached = await suppliers_cache.get(page_cache_key(limit, after, fields), load_page, group=SUPPLIERS_PAGES_KEY)
+    except Exception as e:
+        print(f"Ошибка при получении страницы поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось получить данные о поставщиках"}), 500
+    return cached_response(cached)
+
+async def search_is_popular(key):
+    async with redis_client.pipeline() as pipe:
+        pipe.incr(f"{key}:hits")
+        pipe.expire(f"{key}:hits", SEARCH_POPULAR_WINDOW, nx=True)
+        hits, _ = await pipe.execute()
+    return hits >= SEARCH_POPULAR_HITS
+
+# Поиск поставщиков (?q=&match=contains|prefix&phone=&limit=&after=)
+async def search_suppliers(fields):
+    search = parse_search(request.args)
+    if search is None:
+        return jsonify({"error": SEARCH_ERROR}), 400
+    page = parse_page(request.args)
+    if page is None:
+        return jsonify({"error": PAGE_ERROR}), 400
+    limit, after = page
+
+    async def load_results():
+        response = await domain_client.call('SearchSuppliers', search_request(search, limit, after, fields),
+                                            route='search_suppliers', hedge=True)
+        return page_body(response, fields)
+
+    key = search_cache_key(search, limit, after, fields)
+    try:
+        if await search_is_popular(key):
+            cached = await suppliers_cache.get(key, load_results, group=SUPPLIERS_SEARCHES_KEY,
+                                               soft_ttl=SEARCH_CACHE_TTL, hard_ttl=2 * SEARCH_CACHE_TTL)
+        else:
+            cached = uncached_entry((await load_results()).encode('utf-8'))
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            return jsonify({"error": e.details()}), 400
+        print(f"Ошибка при поиске поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось найти поставщиков"}), 500
+    except Exception as e:
+        print(f"Ошибка при поиске поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось найти поставщиков"}), 500
+    return cached_response(cached)
+
+# Выгрузка всех поставщиков (GET) построчно в NDJSON из серверного потока StreamSuppliers
+@app.route('/suppliers/export', methods=['GET'])
+async def export_suppliers():
+    REQUEST_COUNT.labels(method='GET', endpoint='/suppliers/export').inc()
+    export = parse_export(request.args)
+    if export is None:
+        return jsonify({"error": EXPORT_ERROR}), 400
+    batch_size, fields = export
+
+    call = domain_client.stream('StreamSuppliers', export_request(batch_size, fields), route='export_suppliers')
+    chunks = call.__aiter__()
+    try:
+        first = await anext(chunks, None)
+    except grpc.aio.AioRpcError as e:
+        print(f"Ошибка при выгрузке поставщиков: {e}")
+        return jsonify({"error": "Ошибка сервера, не удалось выгрузить поставщиков"}), 500
+
+    async def generate():
+        rows = 0
+        try:
+            chunk = first
+            while chunk is not None:
+                rows += len(chunk.suppliers)
+                yield ndjson_lines(chunk, fields).encode('utf-8')
+                chunk = await anext(chunks, None)
+        except grpc.aio.AioRpcError as e:
+            print(f"Выгрузка поставщиков прервана после {rows} строк: {e}")
+        finally:
+            call.cancel()
+            await send_to_logstash(json.dumps({"event": "export_suppliers", "rows": rows}))
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    # Выгрузка может идти дольше RESPONSE_TIMEOUT, её ограничивает дедлайн маршрута export_suppliers
+    response.timeout = None
+    return response
+
+# Маршрут для метрик Prometheus
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    # Чтение файлов метрик всех процессов не должно останавливать цикл событий
+    return await asyncio.to_thread(metrics_payload), 200, {'Content-Type': 'text/plain'}
+
+if __name__ == '__main__':
+    uvicorn.run('async_app:app', host='0.0.0.0', port=8080, workers=int(os.getenv('GATEWAY_WORKERS', '4')))
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+
+from redis.exceptions import LockError
+
+from cache import (APPLY_CHUNK_SIZE, APPLY_VERSIONED_SCRIPT, CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES,
+                   build_cache_entry, mark_outdated, parse_cache_entry, versioned_script_args)
+
+
+# Асинхронный вариант SWRCache для шлюза на asyncio (redis.asyncio). Формат
+# записей и ключей тот же, поэтому синхронные и асинхронные реплики шлюза
+# пользуются одним кешем. Локального уровня нет, но сброс ключей рассылается
+# в канал pub/sub, чтобы синхронные реплики сбросили свои локальные копии.
+# version_key - как у SWRCache.
+class AsyncSWRCache:
+    def __init__(self, redis_client, soft_ttl=60, hard_ttl=600, lock_ttl=10, encodings=('gzip',),
+                 min_compress_size=1024, channel='cache:invalidate', version_key=None):
+        self._redis = redis_client
+        self._version_key = version_key
+        self._soft_ttl = soft_ttl
+        self._hard_ttl = hard_ttl
+        self._lock_ttl = lock_ttl
+        self._encodings = tuple(encodings)
+        self._min_compress_size = min_compress_size
+        self._channel = channel
+        # Загрузки, идущие в этом процессе: ключ -> задача
+        self._inflight = {}
+
+    async def _read(self, key):
+        if self._version_key is None:
+            return parse_cache_entry(await self._redis.hgetall(key))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.get(self._version_key)
+            raw, version = await pipe.execute()
+        return mark_outdated(parse_cache_entry(raw), version)
+
+    async def version(self):
+        if self._version_key is None:
+            return 0
+        return int(await self._redis.get(self._version_key) or 0)
+
+    # Новая версия данных; локальные копии синхронных реплик сбрасываются через канал
+    async def bump_version(self, local_keys=()):
+        async with self._redis.pipeline() as pipe:
+            pipe.incr(self._version_key)
+            if local_keys:
+                pipe.publish(self._channel, json.dumps(list(local_keys)))
+            version, *_ = await pipe.execute()
+        return version
+
+    async def _fill(self, key, loader, group, soft_ttl, hard_ttl):
+        version = await self.version()
+        return await self._store(key, await loader(), group, soft_ttl, hard_ttl, version)
+
+    async def _store(self, key, body, group=None, soft_ttl=None, hard_ttl=None, version=0):
+        soft_ttl = self._soft_ttl if soft_ttl is None else soft_ttl
+        hard_ttl = self._hard_ttl if hard_ttl is None else hard_ttl
+        entry = build_cache_entry(body, soft_ttl, self._encodings, self._min_compress_size, version)
+        async with self._redis.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=entry)
+            pipe.expire(key, hard_ttl)
+            if group:
+                pipe.sadd(group, key)
+                pipe.expire(group, hard_ttl)
+            await pipe.execute()
+        return entry
+
+    async def _acquire_lock(self, key):
+        lock = self._redis.lock(f"lock:{key}", timeout=self._lock_ttl, blocking=False, thread_local=False)
+        return lock if await lock.acquire() else None
+
+    async def _release_lock(self, lock):
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+    # Одна задача на ключ в пределах процесса: остальные корутины ждут её результата
+    def _single_flight(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def get(self, key, loader, group=None, soft_ttl=None, hard_ttl=None):
+        entry = await self._read(key)
+        if entry is not None:
+            CACHE_HITS.labels(tier='redis').inc()
+            if entry['soft'] <= time.time() and key not in self._inflight:
+                self._single_flight(key, lambda: self._refresh(key, loader, group, soft_ttl, hard_ttl))
+            return entry
+        CACHE_MISSES.labels(tier='redis').inc()
+        # shield: отмена одного ожидающего запроса не отменяет загрузку для остальных
+        return await asyncio.shield(
+            self._single_flight(key, lambda: self._load(key, loader, group, soft_ttl, hard_ttl)))
+
+    async def _load(self, key, loader, group, soft_ttl, hard_ttl):
+        lock = await self._acquire_lock(key)
+        if lock is not None:
+            try:
+                return await self._fill(key, loader, group, soft_ttl, hard_ttl)
+            finally:
+                await self._release_lock(lock)
+
+        # Значение уже загружает другая реплика: ждём его появления в Redis
+        deadline = time.monotonic() + self._lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await self._read(key)
+            if entry is not None:
+                return entry
+        return await self._fill(key, loader, group, soft_ttl, hard_ttl)
+
+    async def _refresh(self, key, loader, group, soft_ttl, hard_ttl):
+        lock = await self._acquire_lock(key)
+        if lock is None:
+            return
+        try:
+            await self._fill(key, loader, group, soft_ttl, hard_ttl)
+        except Exception as e:
+            print(f"Ошибка при фоновом обновлении кеша {key}: {e}")
+        finally:
+            await self._release_lock(lock)
+
+    async def invalidate(self, *keys, groups=()):
+        keys = list(keys)
+        for group in groups:
+            keys.extend(member.decode() for member in await self._redis.smembers(group))
+        async with self._redis.pipeline() as pipe:
+            for key in keys:
+                pipe.hset(key, 'soft', 0)
+                pipe.expire(key, self._hard_ttl, nx=True)
+            if keys:
+                pipe.publish(self._channel, json.dumps(keys))
+            await pipe.execute()
+        CACHE_EVICTIONS.labels(tier='redis', reason='invalidated').inc(len(keys))
+
+
+# Асинхронный вариант SupplierEntryCache с тем же форматом ключей
+class AsyncSupplierEntryCache:
+    def __init__(self, redis_client, key='suppliers:by_id', ids_key='suppliers:ids',
+                 versions_key='suppliers:versions', ttl=600, channel='cache:invalidate'):
+        self._redis = redis_client
+        self._key = key
+        self._ids_key = ids_key
+        self._versions_key = versions_key
+        self._ttl = ttl
+        self._channel = channel
+        self._apply_script = redis_client.register_script(APPLY_VERSIONED_SCRIPT)
+
+    def _local_key(self, supplier_id):
+        return f"{self._key}:{supplier_id}"
+
+    async def get(self, supplier_id):
+        entry = await self._redis.hget(self._key, supplier_id)
+        if entry is None:
+            CACHE_MISSES.labels(tier='redis').inc()
+            return None
+        CACHE_HITS.labels(tier='redis').inc()
+        return entry
+
+    async def get_many(self, supplier_ids):
+        if not supplier_ids:
+            return []
+        return await self._redis.hmget(self._key, supplier_ids)
+
+    async def _apply(self, changes):
+        applied = []
+        for start in range(0, len(changes), APPLY_CHUNK_SIZE):
+            chunk = changes[start:start + APPLY_CHUNK_SIZE]
+            applied += await self._apply_script(keys=[self._key, self._versions_key],
+                                                args=versioned_script_args(self._ttl, chunk), client=self._redis)
+        return [int(supplier_id) for supplier_id in applied]
+
+    async def _publish_local(self, supplier_ids):
+        if supplier_ids:
+            await self._redis.publish(self._channel,
+                                      json.dumps([self._local_key(supplier_id) for supplier_id in supplier_ids]))
+
+    async def put(self, entries, versions=None):
+        if not entries:
+            return
+        versions = versions or {}
+        await self._apply([(supplier_id, versions.get(supplier_id), entry) for supplier_id, entry in entries.items()])
+
+    async def refresh(self, supplier_id, entry, version=0):
+        await self._publish_local(await self._apply([(supplier_id, version, entry)]))
+
+    async def apply_changes(self, changes):
+        applied = await self._apply(changes)
+        if applied:
+            CACHE_EVICTIONS.labels(tier='redis', reason='changed').inc(len(applied))
+            await self._publish_local(applied)
+        return applied
+
+    async def replace_all(self, entries, versions=None):
+        versions = versions or {}
+        newest = max(versions.values(), default=0)
+        absent = {int(supplier_id) for supplier_id in await self._redis.hkeys(self._key)} - set(entries)
+        await self._apply([(supplier_id, versions.get(supplier_id), entry) for supplier_id, entry in entries.items()] +
+                          [(supplier_id, newest, None) for supplier_id in absent])
+        async with self._redis.pipeline() as pipe:
+            pipe.expire(self._key, self._ttl)
+            pipe.expire(self._versions_key, self._ttl)
+            pipe.set(self._ids_key, json.dumps(list(entries)), ex=self._ttl)
+            pipe.publish(self._channel, json.dumps([self._local_key('*')]))
+            await pipe.execute()
+
+    async def get_ids(self):
+        raw = await self._redis.get(self._ids_key)
+        return None if raw is None else json.loads(raw)
+
+    async def set_ids(self, supplier_ids):
+        await self._redis.set(self._ids_key, json.dumps(supplier_ids), ex=self._ttl)
+
+    async def invalidate(self, *supplier_ids):
+        if supplier_ids:
+            async with self._redis.pipeline() as pipe:
+                pipe.hdel(self._key, *supplier_ids)
+                pipe.publish(self._channel, json.dumps([self._local_key(supplier_id) for supplier_id in supplier_ids]))
+                await pipe.execute()
+            CACHE_EVICTIONS.labels(tier='redis', reason='invalidated').inc(len(supplier_ids))
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import aio_pika
+from aio_pika.exceptions import AMQPError, ChannelInvalidStateError
+
+from rabbitmq_publisher import PUBLISH_LATENCY, SUPPLIERS_EXCHANGE, publish_headers, shard_queue_name
+
+
+# То же объявление exchange и очередей-шардов, что и declare_supplier_topology, для aio-pika
+async def declare_supplier_topology(channel, shards):
+    exchange = await channel.declare_exchange(SUPPLIERS_EXCHANGE, aio_pika.ExchangeType.DIRECT)
+    for shard in range(shards):
+        queue = await channel.declare_queue(shard_queue_name(shard), arguments={'x-single-active-consumer': True})
+        await queue.bind(exchange, routing_key=str(shard))
+    return exchange
+
+
+# Публикация в RabbitMQ для шлюза на asyncio: одно восстанавливающееся соединение
+# и один канал на рабочий процесс. Подтверждения приходят асинхронно, поэтому
+# одновременные публикации из разных запросов не ждут друг друга.
+class AsyncRabbitMQPublisher:
+    def __init__(self, host, shards, confirms=True, heartbeat=60):
+        self._host = host
+        self._shards = shards
+        self._confirms = confirms
+        self._heartbeat = heartbeat
+        self._connection = None
+        self._channel = None
+        self._exchange = None
+
+    async def connect(self):
+        self._connection = await aio_pika.connect_robust(host=self._host, heartbeat=self._heartbeat)
+        self._channel = await self._connection.channel(publisher_confirms=self._confirms)
+        self._exchange = await declare_supplier_topology(self._channel, self._shards)
+
+    async def publish(self, routing_key, body, message_type):
+        start = time.perf_counter()
+        message = aio_pika.Message(body, type=message_type, headers=publish_headers())
+        for attempt in range(2):
+            try:
+                await self._exchange.publish(message, routing_key=routing_key)
+                break
+            except (AMQPError, ChannelInvalidStateError):
+                # Соединение восстанавливается в фоне: повторяем один раз после паузы
+                if attempt == 1:
+                    raise
+                await asyncio.sleep(0.5)
+        PUBLISH_LATENCY.labels(routing_key=routing_key).observe(time.perf_counter() - start)
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import time
+import uuid
+
+# Разбор тела запроса построчно, без загрузки целиком в память.
+# Возвращает пары (номер строки, словарь полей или None, если строку не удалось разобрать).
+def iter_rows(stream, fmt):
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(text), start=2):
+            yield line_no, row
+        return
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+
+# Состояние заданий массовой загрузки в Redis. Шлюз пишет число принятых и
+# опубликованных строк, domain-service увеличивает rows_applied после коммита и
+# rows_failed для строк, которые не удалось записать. Задание завершено, когда
+# каждая опубликованная строка либо записана, либо отброшена.
+class BulkImportJobs:
+    COUNTERS = ('rows_received', 'rows_published', 'rows_rejected', 'rows_applied', 'rows_failed',
+                'chunks_published')
+
+    def __init__(self, redis_client, ttl=24 * 60 * 60):
+        self._redis = redis_client
+        self._ttl = ttl
+
+    def _key(self, job_id):
+        return f"bulk:job:{job_id}"
+
+    def create(self, fmt):
+        job_id = uuid.uuid4().hex
+        self.update(job_id, status='receiving', format=fmt, started_at=time.time())
+        return job_id
+
+    def update(self, job_id, **fields):
+        with self._redis.pipeline() as pipe:
+            pipe.hset(self._key(job_id), mapping=fields)
+            pipe.expire(self._key(job_id), self._ttl)
+            pipe.execute()
+
+    def get(self, job_id):
+        raw = self._redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {field.decode(): value.decode() for field, value in raw.items()}
+        for counter in self.COUNTERS:
+            job[counter] = int(job.get(counter, 0))
+        job['rejected_lines'] = json.loads(job.get('rejected_lines', '[]'))
+        job['job_id'] = job_id
+        job['done'] = (job.get('status') == 'queued'
+                       and job['rows_applied'] + job['rows_failed'] >= job['rows_published'])
+        return job
@@ -0,0 +1,503 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter
+from redis.exceptions import LockError, RedisError
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него хранится только gzip-вариант
+    brotli = None
+
+# Метрики кеша по уровням: local - память процесса, redis - общий кеш
+CACHE_HITS = Counter('cache_hits_total', 'Количество попаданий в кеш', ['tier'])
+CACHE_MISSES = Counter('cache_misses_total', 'Количество промахов кеша', ['tier'])
+CACHE_EVICTIONS = Counter('cache_evictions_total', 'Количество вытесненных записей кеша', ['tier', 'reason'])
+
+
+# Хеш содержимого, используется как ETag
+def content_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+# Запись кеша ответа: тело, его etag, момент мягкого устаревания, версия данных,
+# из которых она собрана, и сжатые варианты
+def build_cache_entry(body, soft_ttl, encodings=('gzip',), min_compress_size=1024, version=0):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    entry = {
+        'body': body,
+        'etag': content_etag(body),
+        'soft': time.time() + soft_ttl,
+        'version': version,
+    }
+    if len(body) >= min_compress_size:
+        if 'gzip' in encodings:
+            entry['gzip'] = gzip.compress(body, compresslevel=6)
+        if 'br' in encodings and brotli is not None:
+            entry['br'] = brotli.compress(body)
+    return entry
+
+
+# Разбор hash-ключа записи, прочитанного из Redis (None, если записи нет)
+def parse_cache_entry(raw):
+    if b'body' not in raw:
+        return None
+    entry = {field.decode(): value for field, value in raw.items()}
+    entry['soft'] = float(entry.get('soft', 0))
+    entry['etag'] = entry.get('etag', b'').decode()
+    entry['version'] = int(entry.get('version', 0))
+    return entry
+
+
+# Запись, собранная до последнего изменения данных (текущей версии), считается устаревшей
+def mark_outdated(entry, current_version):
+    if entry is not None and entry['version'] < int(current_version or 0):
+        entry['soft'] = 0
+    return entry
+
+
+# Обновление записей поставщиков с проверкой версии: запись меняется, только если
+# её версия не меньше сохранённой, поэтому опоздавшая загрузка или событие не
+# затирают более новые данные. Пустая запись - удаление; версия удалённого
+# поставщика остаётся в хеше версий. Версия 0 (неизвестна) пишется только туда,
+# где версии ещё нет. Хеш версий живёт не меньше хеша записей.
+# KEYS: записи, версии; ARGV: TTL, затем тройки id, версия, запись. Возвращает применённые id.
+APPLY_VERSIONED_SCRIPT = """
+local applied = {}
+for i = 2, #ARGV, 3 do
+    local id, version, entry = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    local current = redis.call('HGET', KEYS[2], id)
+    if not current or tonumber(version) >= tonumber(current) then
+        if entry == '' then
+            redis.call('HDEL', KEYS[1], id)
+        else
+            redis.call('HSET', KEYS[1], id, entry)
+        end
+        if tonumber(version) > 0 then
+            redis.call('HSET', KEYS[2], id, version)
+        end
+        applied[#applied + 1] = id
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1], 'NX')
+local remaining = redis.call('TTL', KEYS[1])
+if remaining > 0 and redis.call('TTL', KEYS[2]) < remaining then
+    redis.call('EXPIRE', KEYS[2], remaining)
+end
+return applied
+"""
+# Сколько записей применяется одним вызовом скрипта, чтобы не блокировать Redis надолго
+APPLY_CHUNK_SIZE = 1000
+
+
+def versioned_script_args(ttl, changes):
+    args = [ttl]
+    for supplier_id, version, entry in changes:
+        args += [supplier_id, version or 0, '' if entry is None else entry]
+    return args
+
+
+def _entry_size(value):
+    if isinstance(value, dict):
+        return sum(len(item) for item in value.values() if isinstance(item, (bytes, str)))
+    return len(value)
+
+
+# Ключи из сообщения канала сброса (JSON-список строк) или None, если сообщение испорчено
+def invalidated_keys(data):
+    try:
+        keys = json.loads(data)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        return None
+    return keys
+
+
+# Локальный LRU-кеш с TTL в памяти процесса, стоит перед Redis. Ограничен числом
+# записей и суммарным размером. Записи сбрасываются на всех репликах шлюза через
+# канал Redis pub/sub; ключ, оканчивающийся на '*', сбрасывает все ключи с этим префиксом.
+class LocalCache:
+    def __init__(self, redis_client, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=30,
+                 channel='cache:invalidate'):
+        self._redis = redis_client
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._channel = channel
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                self._remove(key)
+                CACHE_EVICTIONS.labels(tier='local', reason='expired').inc()
+                item = None
+            if item is None:
+                CACHE_MISSES.labels(tier='local').inc()
+                return None
+            self._entries.move_to_end(key)
+        CACHE_HITS.labels(tier='local').inc()
+        return item[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        if ttl <= 0:
+            return
+        self._ensure_listening()
+        size = _entry_size(value)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                CACHE_EVICTIONS.labels(tier='local', reason='capacity').inc()
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def evict(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key.endswith('*'):
+                    matched = [cached for cached in self._entries if cached.startswith(key[:-1])]
+                else:
+                    matched = [key] if key in self._entries else []
+                for cached in matched:
+                    self._remove(cached)
+                    CACHE_EVICTIONS.labels(tier='local', reason='invalidated').inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # Сброс ключей в своём процессе и рассылка остальным репликам
+    def invalidate(self, keys):
+        if not keys:
+            return
+        self.evict(*keys)
+        self._redis.publish(self._channel, json.dumps(list(keys)))
+
+    def _ensure_listening(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # Пока подписки не было, сообщения о сбросе могли потеряться
+                self.clear()
+                for message in pubsub.listen():
+                    # Испорченное сообщение пропускаем: остановка потока оставила бы процесс без сброса
+                    keys = invalidated_keys(message['data'])
+                    if keys is None:
+                        print(f"Некорректное сообщение в канале сброса кеша: {message['data']!r}")
+                        continue
+                    self.evict(*keys)
+            except RedisError as e:
+                print(f"Ошибка подписки на канал сброса кеша: {e}")
+                time.sleep(1)
+
+
+# Кеш поверх Redis со схемой stale-while-revalidate и single-flight.
+# Запись хранится в hash-ключе: поле body с данными и поле soft с моментом
+# "мягкого" устаревания. Жёсткий TTL задаётся через EXPIRE ключа: до него
+# устаревшее значение ещё отдаётся клиентам, пока идёт фоновое обновление.
+# В body лежит готовое тело HTTP-ответа, рядом - его хеш (etag) и, если тело
+# достаточно большое, сжатые варианты gzip/br, чтобы попадание в кеш отдавалось
+# без повторного кодирования.
+#
+# Если задан version_key, в нём хранится версия данных (счётчик изменений).
+# Запись помечается версией, прочитанной до загрузки, и считается устаревшей,
+# если версия с тех пор выросла, - даже если её сохранила загрузка, начавшаяся
+# до изменения и закончившаяся после сброса.
+class SWRCache:
+    def __init__(self, redis_client, soft_ttl=60, hard_ttl=600, lock_ttl=10, encodings=('gzip',),
+                 min_compress_size=1024, local=None, version_key=None):
+        self._redis = redis_client
+        self._local = local
+        self._version_key = version_key
+        self._soft_ttl = soft_ttl
+        self._hard_ttl = hard_ttl
+        self._lock_ttl = lock_ttl
+        self._encodings = tuple(encodings)
+        self._min_compress_size = min_compress_size
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _read(self, key):
+        if self._version_key is None:
+            return parse_cache_entry(self._redis.hgetall(key))
+        with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.get(self._version_key)
+            raw, version = pipe.execute()
+        return mark_outdated(parse_cache_entry(raw), version)
+
+    def version(self):
+        if self._version_key is None:
+            return 0
+        return int(self._redis.get(self._version_key) or 0)
+
+    # Новая версия данных: все записи, собранные раньше, при чтении считаются устаревшими.
+    # Локальные копии сбрасываются по ключам или префиксам ('...*') на всех репликах
+    def bump_version(self, local_keys=()):
+        version = self._redis.incr(self._version_key)
+        if self._local is not None and local_keys:
+            self._local.invalidate(list(local_keys))
+        return version
+
+    # Загрузка и сохранение значения. Если версия изменилась во время загрузки,
+    # запись сразу устаревшая и в локальный кеш не попадает
+    def _fill(self, key, loader, group, soft_ttl, hard_ttl):
+        version = self.version()
+        entry = self._store(key, loader(), group, soft_ttl, hard_ttl, version)
+        if self._version_key is not None and self.version() != version:
+            entry['soft'] = 0
+        return entry
+
+    def _store(self, key, body, group=None, soft_ttl=None, hard_ttl=None, version=0):
+        soft_ttl = self._soft_ttl if soft_ttl is None else soft_ttl
+        hard_ttl = self._hard_ttl if hard_ttl is None else hard_ttl
+        entry = build_cache_entry(body, soft_ttl, self._encodings, self._min_compress_size, version)
+        with self._redis.pipeline() as pipe:
+            # Удаляем старую запись целиком, чтобы не остались сжатые варианты прежнего тела
+            pipe.delete(key)
+            pipe.hset(key, mapping=entry)
+            pipe.expire(key, hard_ttl)
+            if group:
+                pipe.sadd(group, key)
+                pipe.expire(group, hard_ttl)
+            pipe.execute()
+        return entry
+
+    # Локальная (в пределах процесса) регистрация загрузки ключа: первый поток
+    # становится ведущим, остальные ждут его результата
+    def _begin(self, key):
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return event, False
+            event = threading.Event()
+            self._inflight[key] = event
+            return event, True
+
+    def _end(self, key, event):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        event.set()
+
+    # Распределённая блокировка, чтобы обновление шло только на одной реплике шлюза
+    def _acquire_lock(self, key):
+        lock = self._redis.lock(f"lock:{key}", timeout=self._lock_ttl, blocking=False, thread_local=False)
+        return lock if lock.acquire() else None
+
+    def _release_lock(self, lock):
+        try:
+            lock.release()
+        except LockError:
+            pass
+
+    def get(self, key, loader, group=None, soft_ttl=None, hard_ttl=None):
+        if self._local is not None:
+            entry = self._local.get(key)
+            if entry is not None:
+                return entry
+        entry = self._read(key)
+        if entry is not None:
+            CACHE_HITS.labels(tier='redis').inc()
+            if entry['soft'] <= time.time():
+                self._refresh_async(key, loader, group, soft_ttl, hard_ttl)
+            else:
+                self._remember(key, entry)
+            return entry
+        CACHE_MISSES.labels(tier='redis').inc()
+        entry = self._load(key, loader, group, soft_ttl, hard_ttl)
+        self._remember(key, entry)
+        return entry
+
+    # В локальный кеш попадают только свежие записи и не дольше их мягкого TTL
+    def _remember(self, key, entry):
+        if self._local is not None:
+            self._local.set(key, entry, ttl=entry['soft'] - time.time())
+
+    def _load(self, key, loader, group, soft_ttl, hard_ttl):
+        event, leader = self._begin(key)
+        if not leader:
+            event.wait(self._lock_ttl)
+            entry = self._read(key)
+            return entry if entry is not None else self._fill(key, loader, group, soft_ttl, hard_ttl)
+
+        try:
+            lock = self._acquire_lock(key)
+            if lock is not None:
+                try:
+                    return self._fill(key, loader, group, soft_ttl, hard_ttl)
+                finally:
+                    self._release_lock(lock)
+
+            # Значение уже загружает другая реплика: ждём его появления в Redis
+            deadline = time.monotonic() + self._lock_ttl
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = self._read(key)
+                if entry is not None:
+                    return entry
+            return self._fill(key, loader, group, soft_ttl, hard_ttl)
+        finally:
+            self._end(key, event)
+
+    def _refresh_async(self, key, loader, group, soft_ttl, hard_ttl):
+        event, leader = self._begin(key)
+        if not leader:
+            return
+        lock = self._acquire_lock(key)
+        if lock is None:
+            self._end(key, event)
+            return
+
+        def refresh():
+            try:
+                self._fill(key, loader, group, soft_ttl, hard_ttl)
+            except Exception as e:
+                print(f"Ошибка при фоновом обновлении кеша {key}: {e}")
+            finally:
+                self._release_lock(lock)
+                self._end(key, event)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{key}", daemon=True).start()
+
+    # Помечает ключи (и все ключи групп) устаревшими: до жёсткого TTL клиенты
+    # получают старое значение, а первое же чтение запускает обновление
+    def invalidate(self, *keys, groups=()):
+        keys = list(keys)
+        for group in groups:
+            keys.extend(member.decode() for member in self._redis.smembers(group))
+        with self._redis.pipeline() as pipe:
+            for key in keys:
+                pipe.hset(key, 'soft', 0)
+                pipe.expire(key, self._hard_ttl, nx=True)
+            pipe.execute()
+        CACHE_EVICTIONS.labels(tier='redis', reason='invalidated').inc(len(keys))
+        if self._local is not None:
+            self._local.invalidate(keys)
+
+
+# Записи отдельных поставщиков: одно поле hash-ключа на поставщика (JSON) и
+# отдельный ключ со списком id, из которых собирается общий список. Запись
+# поставщика сбрасывается только при изменении именно этого поставщика. Версии
+# записей хранятся в отдельном хеше, запись не заменяется более старой.
+class SupplierEntryCache:
+    def __init__(self, redis_client, key='suppliers:by_id', ids_key='suppliers:ids', versions_key='suppliers:versions',
+                 ttl=600, local=None):
+        self._redis = redis_client
+        self._local = local
+        self._key = key
+        self._ids_key = ids_key
+        self._versions_key = versions_key
+        self._ttl = ttl
+        self._apply_script = redis_client.register_script(APPLY_VERSIONED_SCRIPT)
+
+    def _local_key(self, supplier_id):
+        return f"{self._key}:{supplier_id}"
+
+    def get(self, supplier_id):
+        if self._local is not None:
+            entry = self._local.get(self._local_key(supplier_id))
+            if entry is not None:
+                return entry
+        entry = self._redis.hget(self._key, supplier_id)
+        if entry is None:
+            CACHE_MISSES.labels(tier='redis').inc()
+            return None
+        CACHE_HITS.labels(tier='redis').inc()
+        if self._local is not None:
+            self._local.set(self._local_key(supplier_id), entry)
+        return entry
+
+    def get_many(self, supplier_ids):
+        if not supplier_ids:
+            return []
+        return self._redis.hmget(self._key, supplier_ids)
+
+    # Изменения (id, версия, запись или None для удаления) с проверкой версии; возвращает применённые id
+    def _apply(self, changes):
+        applied = []
+        for start in range(0, len(changes), APPLY_CHUNK_SIZE):
+            chunk = changes[start:start + APPLY_CHUNK_SIZE]
+            applied += self._apply_script(keys=[self._key, self._versions_key],
+                                          args=versioned_script_args(self._ttl, chunk), client=self._redis)
+        return [int(supplier_id) for supplier_id in applied]
+
+    # Записи, загруженные из domain-service; versions - версии тех же поставщиков
+    def put(self, entries, versions=None):
+        if not entries:
+            return
+        versions = versions or {}
+        self._apply([(supplier_id, versions.get(supplier_id), entry) for supplier_id, entry in entries.items()])
+
+    # Запись поставщика обновляется на месте (после синхронной записи в domain-service),
+    # локальные копии на репликах сбрасываются
+    def refresh(self, supplier_id, entry, version=0):
+        if self._apply([(supplier_id, version, entry)]) and self._local is not None:
+            self._local.invalidate([self._local_key(supplier_id)])
+
+    # Изменения из событий domain-service: (id, версия, запись или None для удаления)
+    def apply_changes(self, changes):
+        applied = self._apply(changes)
+        if applied:
+            CACHE_EVICTIONS.labels(tier='redis', reason='changed').inc(len(applied))
+            if self._local is not None:
+                self._local.invalidate([self._local_key(supplier_id) for supplier_id in applied])
+        return applied
+
+    # Замена записей и списка id после загрузки всего списка. Записи поставщиков,
+    # которых нет в списке, удаляются, если они не новее самого списка
+    def replace_all(self, entries, versions=None):
+        versions = versions or {}
+        newest = max(versions.values(), default=0)
+        absent = {int(supplier_id) for supplier_id in self._redis.hkeys(self._key)} - set(entries)
+        self._apply([(supplier_id, versions.get(supplier_id), entry) for supplier_id, entry in entries.items()] +
+                    [(supplier_id, newest, None) for supplier_id in absent])
+        with self._redis.pipeline() as pipe:
+            pipe.expire(self._key, self._ttl)
+            pipe.expire(self._versions_key, self._ttl)
+            pipe.set(self._ids_key, json.dumps(list(entries)), ex=self._ttl)
+            pipe.execute()
+        if self._local is not None:
+            self._local.invalidate([self._local_key('*')])
+
+    def get_ids(self):
+        raw = self._redis.get(self._ids_key)
+        return None if raw is None else json.loads(raw)
+
+    def set_ids(self, supplier_ids):
+        self._redis.set(self._ids_key, json.dumps(supplier_ids), ex=self._ttl)
+
+    def invalidate(self, *supplier_ids):
+        if supplier_ids:
+            self._redis.hdel(self._key, *supplier_ids)
+            CACHE_EVICTIONS.labels(tier='redis', reason='invalidated').inc(len(supplier_ids))
+            if self._local is not None:
+                self._local.invalidate([self._local_key(supplier_id) for supplier_id in supplier_ids])
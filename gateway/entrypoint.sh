@@ -0,0 +1,17 @@
+#!/bin/sh
+set -e
+
+# Каталог метрик многопроцессного режима очищается до запуска рабочих процессов:
+# файлы прошлого запуска иначе попали бы в суммы
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# GATEWAY_SERVER: asgi - шлюз на asyncio (uvicorn), gunicorn - app.py в нескольких
+# процессах, flask - app.py на встроенном сервере в одном процессе
+case "$GATEWAY_SERVER" in
+    asgi) exec python async_app.py ;;
+    gunicorn) exec gunicorn -c gunicorn.conf.py app:app ;;
+    *) exec python app.py ;;
+esac
@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+
+import grpc
+from prometheus_client import Counter, Histogram
+
+from proto import service_pb2_grpc
+from tracing import grpc_client_span, grpc_metadata
+
+GRPC_HEDGED_REQUESTS = Counter('grpc_hedged_requests_total', 'Количество дополнительных (хеджированных) gRPC-вызовов',
+                               ['method'])
+GRPC_CLIENT_LATENCY = Histogram('grpc_client_latency_seconds', 'Время унарного вызова domain-service (с хеджированием)',
+                                ['method', 'code'],
+                                buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+
+def _status_name(error):
+    code = error.code() if isinstance(error, grpc.RpcError) else None
+    return code.name if code is not None else 'UNKNOWN'
+
+
+# Разбор строки вида "get_suppliers=1.5,get_supplier=0.5" в словарь дедлайнов по маршрутам
+def parse_route_deadlines(value):
+    deadlines = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        route, seconds = item.split('=', 1)
+        deadlines[route.strip()] = float(seconds)
+    return deadlines
+
+
+def channel_targets(hosts, port):
+    return [f"dns:///{host.strip()}:{port}" for host in hosts.split(',') if host.strip()]
+
+
+def channel_options(keepalive_ms):
+    return [
+        ('grpc.lb_policy_name', 'round_robin'),
+        ('grpc.keepalive_time_ms', keepalive_ms),
+        ('grpc.keepalive_timeout_ms', 10000),
+        ('grpc.keepalive_permit_without_calls', 0),
+        ('grpc.http2.max_pings_without_data', 0),
+    ]
+
+
+# Общий на процесс клиент domain-service: каналы и стабы создаются один раз и
+# переиспользуются всеми запросами. Каждый хост из списка резолвится через DNS, и
+# внутри канала вызовы распределяются round-robin по всем репликам.
+class DomainServiceClient:
+    def __init__(self, hosts, port, default_deadline=2.0, route_deadlines=None, hedge_delay=0.0,
+                 hedge_max_attempts=2, keepalive_ms=30000):
+        self._targets = channel_targets(hosts, port)
+        self._options = channel_options(keepalive_ms)
+        self._default_deadline = default_deadline
+        self._route_deadlines = route_deadlines or {}
+        self._hedge_delay = hedge_delay
+        self._hedge_max_attempts = hedge_max_attempts
+        self._stubs = None
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def _next_stub(self):
+        if self._stubs is None:
+            with self._lock:
+                if self._stubs is None:
+                    channels = [grpc.insecure_channel(target, options=self._options) for target in self._targets]
+                    stubs = [service_pb2_grpc.SupplierServiceStub(channel) for channel in channels]
+                    self._cycle = itertools.cycle(stubs)
+                    self._stubs = stubs
+        with self._lock:
+            return next(self._cycle)
+
+    def deadline_for(self, route):
+        return self._route_deadlines.get(route, self._default_deadline)
+
+    # Вызов метода domain-service с дедлайном маршрута; hedge=True разрешает
+    # хеджирование (только для идемпотентных чтений). Контекст трассировки
+    # передаётся в метаданных, хеджированные копии вызова - в том же спане
+    def call(self, method, request, route=None, hedge=False):
+        timeout = self.deadline_for(route)
+        start, code = time.perf_counter(), 'OK'
+        with grpc_client_span(method):
+            metadata = grpc_metadata()
+            try:
+                if not hedge or self._hedge_delay <= 0 or self._hedge_max_attempts < 2:
+                    return getattr(self._next_stub(), method)(request, timeout=timeout, metadata=metadata)
+                return self._hedged_call(method, request, timeout, metadata)
+            except Exception as e:
+                code = _status_name(e)
+                raise
+            finally:
+                GRPC_CLIENT_LATENCY.labels(method=method, code=code).observe(time.perf_counter() - start)
+
+    # Серверный поток: возвращает итератор ответов, дедлайн маршрута действует на
+    # весь поток. Отдельного спана нет, поток продолжает трассировку запроса
+    def stream(self, method, request, route=None):
+        return getattr(self._next_stub(), method)(request, timeout=self.deadline_for(route),
+                                                  metadata=grpc_metadata())
+
+    # Если первый вызов не ответил за hedge_delay, отправляем такой же вызов на
+    # следующую реплику и берём первый успешный ответ, остальные отменяем
+    def _hedged_call(self, method, request, timeout, metadata=None):
+        done = queue.Queue()
+        calls = []
+        deadline = time.monotonic() + timeout
+
+        def launch():
+            remaining = max(deadline - time.monotonic(), 0.001)
+            call = getattr(self._next_stub(), method).future(request, timeout=remaining, metadata=metadata)
+            call.add_done_callback(done.put)
+            calls.append(call)
+
+        launch()
+        finished = 0
+        while True:
+            can_hedge = len(calls) < self._hedge_max_attempts
+            try:
+                call = done.get(timeout=self._hedge_delay if can_hedge else None)
+            except queue.Empty:
+                GRPC_HEDGED_REQUESTS.labels(method=method).inc()
+                launch()
+                continue
+            finished += 1
+            error = call.exception()
+            if error is None:
+                for other in calls:
+                    if other is not call:
+                        other.cancel()
+                return call.result()
+            if finished == len(calls):
+                if can_hedge and error.code() == grpc.StatusCode.UNAVAILABLE:
+                    GRPC_HEDGED_REQUESTS.labels(method=method).inc()
+                    launch()
+                    continue
+                raise error
+
+
+# Тот же клиент на grpc.aio для шлюза на asyncio. Каналы создаются при первом
+# вызове, уже внутри цикла событий рабочего процесса.
+class AsyncDomainServiceClient:
+    def __init__(self, hosts, port, default_deadline=2.0, route_deadlines=None, hedge_delay=0.0,
+                 hedge_max_attempts=2, keepalive_ms=30000):
+        self._targets = channel_targets(hosts, port)
+        self._options = channel_options(keepalive_ms)
+        self._default_deadline = default_deadline
+        self._route_deadlines = route_deadlines or {}
+        self._hedge_delay = hedge_delay
+        self._hedge_max_attempts = hedge_max_attempts
+        self._channels = None
+        self._cycle = None
+
+    def _next_stub(self):
+        if self._channels is None:
+            self._channels = [grpc.aio.insecure_channel(target, options=self._options) for target in self._targets]
+            self._cycle = itertools.cycle([service_pb2_grpc.SupplierServiceStub(channel) for channel in self._channels])
+        return next(self._cycle)
+
+    def deadline_for(self, route):
+        return self._route_deadlines.get(route, self._default_deadline)
+
+    async def call(self, method, request, route=None, hedge=False):
+        timeout = self.deadline_for(route)
+        start, code = time.perf_counter(), 'OK'
+        with grpc_client_span(method):
+            metadata = grpc_metadata()
+            try:
+                if not hedge or self._hedge_delay <= 0 or self._hedge_max_attempts < 2:
+                    return await getattr(self._next_stub(), method)(request, timeout=timeout, metadata=metadata)
+                return await self._hedged_call(method, request, timeout, metadata)
+            except asyncio.CancelledError:
+                code = 'CANCELLED'
+                raise
+            except Exception as e:
+                code = _status_name(e)
+                raise
+            finally:
+                GRPC_CLIENT_LATENCY.labels(method=method, code=code).observe(time.perf_counter() - start)
+
+    # Серверный поток: объект вызова читается через async for
+    def stream(self, method, request, route=None):
+        return getattr(self._next_stub(), method)(request, timeout=self.deadline_for(route),
+                                                  metadata=grpc_metadata())
+
+    async def _hedged_call(self, method, request, timeout, metadata=None):
+        deadline = time.monotonic() + timeout
+        pending = set()
+
+        def launch():
+            remaining = max(deadline - time.monotonic(), 0.001)
+            pending.add(asyncio.ensure_future(getattr(self._next_stub(), method)(request, timeout=remaining,
+                                                                                  metadata=metadata)))
+
+        launch()
+        launched = 1
+        try:
+            while True:
+                can_hedge = launched < self._hedge_max_attempts
+                done, _ = await asyncio.wait(pending, timeout=self._hedge_delay if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    GRPC_HEDGED_REQUESTS.labels(method=method).inc()
+                    launch()
+                    launched += 1
+                    continue
+                for call in done:
+                    pending.discard(call)
+                    error = call.exception()
+                    if error is None:
+                        return call.result()
+                if not pending:
+                    if can_hedge and error.code() == grpc.StatusCode.UNAVAILABLE:
+                        GRPC_HEDGED_REQUESTS.labels(method=method).inc()
+                        launch()
+                        launched += 1
+                        continue
+                    raise error
+        finally:
+            for call in pending:
+                call.cancel()
+
+    async def close(self):
+        if self._channels is not None:
+            await asyncio.gather(*(channel.close() for channel in self._channels))
+            self._channels = None
@@ -0,0 +1,23 @@
+import os
+
+from multiprocess_metrics import worker_exited
+
+# Синхронный шлюз (app.py) в GATEWAY_WORKERS рабочих процессах, каждый с
+# GATEWAY_THREADS потоками. Приложение импортируется в каждом процессе после
+# fork (без preload_app), поэтому соединения и фоновые потоки у каждого свои.
+bind = '0.0.0.0:8080'
+workers = int(os.getenv('GATEWAY_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GATEWAY_THREADS', '8'))
+# Длинные ответы (/suppliers/export) не должны обрываться таймаутом рабочего процесса
+timeout = int(os.getenv('GATEWAY_WORKER_TIMEOUT', '120'))
+
+
+def post_worker_init(worker):
+    import app
+    app.start_background_tasks()
+
+
+# Вызывается в главном процессе, в том числе после аварийного завершения рабочего
+def child_exit(server, worker):
+    worker_exited(worker.pid)
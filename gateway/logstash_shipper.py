@@ -0,0 +1,129 @@
+import queue
+import socket
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Метрики фоновой отправки событий в Logstash
+LOGSTASH_QUEUE_DEPTH = Gauge('logstash_queue_depth', 'Количество событий в очереди на отправку в Logstash',
+                             multiprocess_mode='livesum')
+LOGSTASH_DROPPED = Counter('logstash_dropped_events_total', 'Количество событий, отброшенных при переполнении очереди')
+LOGSTASH_SPILLED = Counter('logstash_spilled_events_total', 'Количество событий, сохранённых в локальный файл')
+LOGSTASH_SENT = Counter('logstash_sent_events_total', 'Количество событий, отправленных в Logstash')
+LOGSTASH_FLUSH_LATENCY = Histogram('logstash_flush_latency_seconds', 'Время отправки пачки событий в Logstash')
+
+_STOP = object()
+
+
+# Фоновая отправка событий в Logstash: обработчики запросов только кладут событие
+# в ограниченную очередь, а один поток пишет пачки по постоянному TCP-соединению
+# в формате json_lines (одно событие на строку).
+class LogstashShipper:
+    def __init__(self, host, port, max_queue=10000, batch_size=500, overflow='drop', spill_path=None,
+                 max_backoff=30.0):
+        self._address = (host, port)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._overflow = overflow
+        self._spill_path = spill_path
+        self._spill_lock = threading.Lock()
+        self._max_backoff = max_backoff
+        self._socket = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='logstash-shipper', daemon=True)
+                self._thread.start()
+
+    # Не блокирует обработчик запроса: при переполнении событие отбрасывается или сохраняется в файл
+    def send(self, message):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._handle_overflow(message)
+        LOGSTASH_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _handle_overflow(self, message):
+        if self._overflow == 'spill' and self._spill_path:
+            try:
+                with self._spill_lock, open(self._spill_path, 'a', encoding='utf-8') as f:
+                    f.write(message + '\n')
+                LOGSTASH_SPILLED.inc()
+                return
+            except OSError as e:
+                print(f"Ошибка при записи события Logstash в файл {self._spill_path}: {e}")
+        LOGSTASH_DROPPED.inc()
+
+    def _connect(self):
+        self._socket = socket.create_connection(self._address, timeout=5)
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+
+    def _flush(self, batch):
+        payload = ''.join(message + '\n' for message in batch).encode('utf-8')
+        start = time.perf_counter()
+        if self._socket is None:
+            self._connect()
+        self._socket.sendall(payload)
+        LOGSTASH_FLUSH_LATENCY.observe(time.perf_counter() - start)
+        LOGSTASH_SENT.inc(len(batch))
+
+    def _next_batch(self):
+        # Ждём первое событие, затем забираем всё, что уже накопилось, не больше batch_size
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        while len(batch) < self._batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        LOGSTASH_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    def _run(self):
+        backoff = 0.5
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            # Пачку не теряем: повторяем отправку с экспоненциальной задержкой, пока Logstash недоступен
+            while True:
+                try:
+                    self._flush(batch)
+                    backoff = 0.5
+                    break
+                except OSError as e:
+                    print(f"Ошибка при отправке сообщений в Logstash: {e}")
+                    self._disconnect()
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self._max_backoff)
+        self._disconnect()
+
+    # Отправляет оставшиеся события и останавливает поток (используется при завершении процесса)
+    def close(self, timeout=5.0):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
@@ -0,0 +1,82 @@
+import fcntl
+import os
+from contextlib import contextmanager
+
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.mmap_dict import MmapedDict
+
+# Многопроцессный режим метрик (шлюз в нескольких рабочих процессах): каждый
+# процесс пишет значения в свои mmap-файлы в PROMETHEUS_MULTIPROC_DIR, а /metrics
+# любого процесса суммирует файлы всех процессов. Переменная должна быть задана
+# до импорта prometheus_client, а каталог - очищен до запуска процессов
+# (это делает entrypoint.sh)
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Накопительные метрики завершившегося процесса остаются в общих итогах
+ACCUMULATED_TYPES = ('counter', 'histogram', 'summary')
+# Файлы завершившихся процессов сливаются в файл "<тип>_archive.db", поэтому
+# число файлов (и время сбора) зависит от числа живых процессов, а не от того,
+# сколько их перезапускалось
+ARCHIVE_ID = 'archive'
+
+
+def metrics_payload():
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=MULTIPROC_DIR)
+    # Файл завершившегося процесса может пропасть между поиском файлов и чтением
+    for attempt in range(3):
+        try:
+            return generate_latest(registry)
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+
+
+# Учёт завершения рабочего процесса: его live-gauge перестают учитываться, а
+# счётчики и гистограммы переносятся в архивные файлы
+def worker_exited(pid, path=MULTIPROC_DIR):
+    if not path:
+        return
+    multiprocess.mark_process_dead(pid, path)
+    with _exclusive(path):
+        for typ in ACCUMULATED_TYPES:
+            _archive(path, typ, pid)
+
+
+# Процессы могут завершаться одновременно, архив обновляется под файловой блокировкой
+@contextmanager
+def _exclusive(path):
+    with open(os.path.join(path, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Значения в файлах не накопительные (в том числе бакеты гистограмм), поэтому
+# архив - это сумма значений по ключу. Новый архив подменяет старый атомарно,
+# сразу после этого удаляется файл процесса
+def _archive(path, typ, pid):
+    source = os.path.join(path, f'{typ}_{pid}.db')
+    if not os.path.exists(source):
+        return
+    archive = os.path.join(path, f'{typ}_{ARCHIVE_ID}.db')
+    totals = {}
+    for filename in (archive, source):
+        if os.path.exists(filename):
+            for key, value, _, _ in MmapedDict.read_all_values_from_file(filename):
+                totals[key] = totals.get(key, 0.0) + value
+    staging = f'{archive}.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+    merged = MmapedDict(staging)
+    try:
+        for key, value in totals.items():
+            merged.write_value(key, value, 0.0)
+    finally:
+        merged.close()
+    os.replace(staging, archive)
+    os.remove(source)
@@ -41,9 +41,19 @@ class SupplierServiceStub(object):
                 _registered_method=True)
         self.GetSuppliers = channel.unary_unary(
                 '/proto.SupplierService/GetSuppliers',
-                request_serializer=service__pb2.Empty.SerializeToString,
+                request_serializer=service__pb2.GetSuppliersRequest.SerializeToString,
                 response_deserializer=service__pb2.SuppliersResponse.FromString,
                 _registered_method=True)
+        self.GetSuppliersPage = channel.unary_unary(
+                '/proto.SupplierService/GetSuppliersPage',
+                request_serializer=service__pb2.GetSuppliersPageRequest.SerializeToString,
+                response_deserializer=service__pb2.SuppliersPage.FromString,
+                _registered_method=True)
+        self.GetSupplier = channel.unary_unary(
+                '/proto.SupplierService/GetSupplier',
+                request_serializer=service__pb2.GetSupplierRequest.SerializeToString,
+                response_deserializer=service__pb2.Supplier.FromString,
+                _registered_method=True)
         self.UpdateSupplier = channel.unary_unary(
                 '/proto.SupplierService/UpdateSupplier',
                 request_serializer=service__pb2.UpdateSupplierRequest.SerializeToString,
@@ -54,6 +64,21 @@ class SupplierServiceStub(object):
                 request_serializer=service__pb2.DeleteSupplierRequest.SerializeToString,
                 response_deserializer=service__pb2.Empty.FromString,
                 _registered_method=True)
+        self.StreamSuppliers = channel.unary_stream(
+                '/proto.SupplierService/StreamSuppliers',
+                request_serializer=service__pb2.StreamSuppliersRequest.SerializeToString,
+                response_deserializer=service__pb2.SuppliersResponse.FromString,
+                _registered_method=True)
+        self.SearchSuppliers = channel.unary_unary(
+                '/proto.SupplierService/SearchSuppliers',
+                request_serializer=service__pb2.SearchSuppliersRequest.SerializeToString,
+                response_deserializer=service__pb2.SuppliersPage.FromString,
+                _registered_method=True)
+        self.WatchSuppliers = channel.unary_stream(
+                '/proto.SupplierService/WatchSuppliers',
+                request_serializer=service__pb2.WatchSuppliersRequest.SerializeToString,
+                response_deserializer=service__pb2.SupplierChanges.FromString,
+                _registered_method=True)
 
 
 class SupplierServiceServicer(object):
@@ -71,6 +96,18 @@ class SupplierServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetSuppliersPage(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetSupplier(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def UpdateSupplier(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -83,6 +120,24 @@ class SupplierServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamSuppliers(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SearchSuppliers(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchSuppliers(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_SupplierServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -93,9 +148,19 @@ def add_SupplierServiceServicer_to_server(servicer, server):
             ),
             'GetSuppliers': grpc.unary_unary_rpc_method_handler(
                     servicer.GetSuppliers,
-                    request_deserializer=service__pb2.Empty.FromString,
+                    request_deserializer=service__pb2.GetSuppliersRequest.FromString,
                     response_serializer=service__pb2.SuppliersResponse.SerializeToString,
             ),
+            'GetSuppliersPage': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetSuppliersPage,
+                    request_deserializer=service__pb2.GetSuppliersPageRequest.FromString,
+                    response_serializer=service__pb2.SuppliersPage.SerializeToString,
+            ),
+            'GetSupplier': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetSupplier,
+                    request_deserializer=service__pb2.GetSupplierRequest.FromString,
+                    response_serializer=service__pb2.Supplier.SerializeToString,
+            ),
             'UpdateSupplier': grpc.unary_unary_rpc_method_handler(
                     servicer.UpdateSupplier,
                     request_deserializer=service__pb2.UpdateSupplierRequest.FromString,
@@ -106,6 +171,21 @@ def add_SupplierServiceServicer_to_server(servicer, server):
                     request_deserializer=service__pb2.DeleteSupplierRequest.FromString,
                     response_serializer=service__pb2.Empty.SerializeToString,
             ),
+            'StreamSuppliers': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamSuppliers,
+                    request_deserializer=service__pb2.StreamSuppliersRequest.FromString,
+                    response_serializer=service__pb2.SuppliersResponse.SerializeToString,
+            ),
+            'SearchSuppliers': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchSuppliers,
+                    request_deserializer=service__pb2.SearchSuppliersRequest.FromString,
+                    response_serializer=service__pb2.SuppliersPage.SerializeToString,
+            ),
+            'WatchSuppliers': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchSuppliers,
+                    request_deserializer=service__pb2.WatchSuppliersRequest.FromString,
+                    response_serializer=service__pb2.SupplierChanges.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'proto.SupplierService', rpc_method_handlers)
@@ -159,7 +239,7 @@ class SupplierService(object):
             request,
             target,
             '/proto.SupplierService/GetSuppliers',
-            service__pb2.Empty.SerializeToString,
+            service__pb2.GetSuppliersRequest.SerializeToString,
             service__pb2.SuppliersResponse.FromString,
             options,
             channel_credentials,
@@ -171,6 +251,60 @@ class SupplierService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GetSuppliersPage(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/proto.SupplierService/GetSuppliersPage',
+            service__pb2.GetSuppliersPageRequest.SerializeToString,
+            service__pb2.SuppliersPage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetSupplier(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/proto.SupplierService/GetSupplier',
+            service__pb2.GetSupplierRequest.SerializeToString,
+            service__pb2.Supplier.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def UpdateSupplier(request,
             target,
@@ -224,3 +358,84 @@ class SupplierService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamSuppliers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/proto.SupplierService/StreamSuppliers',
+            service__pb2.StreamSuppliersRequest.SerializeToString,
+            service__pb2.SuppliersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SearchSuppliers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/proto.SupplierService/SearchSuppliers',
+            service__pb2.SearchSuppliersRequest.SerializeToString,
+            service__pb2.SuppliersPage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchSuppliers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/proto.SupplierService/WatchSuppliers',
+            service__pb2.WatchSuppliersRequest.SerializeToString,
+            service__pb2.SupplierChanges.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
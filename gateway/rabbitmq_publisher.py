@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+
+import pika
+from pika.exceptions import AMQPError
+from prometheus_client import Gauge, Histogram
+
+from tracing import trace_headers
+
+# Метрики пула публикации в RabbitMQ
+PUBLISHER_POOL_SIZE = Gauge('rabbitmq_publisher_pool_size', 'Количество открытых соединений в пуле публикации RabbitMQ',
+                            multiprocess_mode='livesum')
+PUBLISHER_POOL_IN_USE = Gauge('rabbitmq_publisher_pool_in_use', 'Количество соединений пула, занятых публикацией',
+                              multiprocess_mode='livesum')
+PUBLISH_LATENCY = Histogram('rabbitmq_publish_latency_seconds', 'Время публикации пачки сообщений в RabbitMQ',
+                            ['routing_key'])
+
+# Все записи о поставщиках идут через один exchange и раскладываются по очередям-шардам
+SUPPLIERS_EXCHANGE = 'suppliers'
+
+# Заголовок с моментом публикации (мс Unix-времени): по нему domain-service
+# считает, сколько сообщение ждало в очереди. Должен совпадать с domain-service
+PUBLISHED_AT_HEADER = 'x-published-at'
+# Задание и число строк пачки массовой загрузки: если пачку не удастся даже
+# разобрать, domain-service всё равно засчитает её строки заданию как rows_failed.
+# Должны совпадать с domain-service
+BULK_JOB_HEADER = 'x-bulk-job-id'
+BULK_ROWS_HEADER = 'x-bulk-rows'
+
+
+# Заголовки сообщения: момент публикации, контекст трассировки (traceparent) и extra
+def publish_headers(extra=None):
+    return trace_headers({PUBLISHED_AT_HEADER: int(time.time() * 1000), **(extra or {})})
+
+
+def bulk_chunk_headers(job_id, rows):
+    return {BULK_JOB_HEADER: job_id, BULK_ROWS_HEADER: rows}
+
+
+def shard_queue_name(shard):
+    return f"suppliers.shard.{shard}"
+
+
+# Объявление exchange и очередей-шардов. Должно совпадать с объявлением в domain-service:
+# x-single-active-consumer гарантирует, что каждую очередь читает только один потребитель
+def declare_supplier_topology(channel, shards):
+    channel.exchange_declare(exchange=SUPPLIERS_EXCHANGE, exchange_type='direct')
+    for shard in range(shards):
+        queue_name = shard_queue_name(shard)
+        channel.queue_declare(queue=queue_name, arguments={'x-single-active-consumer': True})
+        channel.queue_bind(queue=queue_name, exchange=SUPPLIERS_EXCHANGE, routing_key=str(shard))
+
+
+# Jump consistent hash (Lamping, Veach): при изменении числа шардов
+# переезжает только минимально необходимая доля поставщиков
+def jump_consistent_hash(key, buckets):
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+# Долгоживущее соединение с каналом, которое переиспользуется между запросами
+class _PooledChannel:
+    def __init__(self, parameters, topology, confirms):
+        self.connection = pika.BlockingConnection(parameters)
+        self.channel = self.connection.channel()
+        # Exchange и очереди объявляем один раз при открытии соединения, а не на каждую публикацию
+        if topology is not None:
+            topology(self.channel)
+        if confirms:
+            self.channel.confirm_delivery()
+
+    def is_open(self):
+        return self.connection.is_open and self.channel.is_open
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except AMQPError:
+            pass
+
+
+# Потокобезопасный пул соединений для публикации gRPC-бинарников в RabbitMQ
+class RabbitMQPublisherPool:
+    def __init__(self, host, topology=None, size=4, confirms=True, heartbeat=60):
+        self._parameters = pika.ConnectionParameters(host, heartbeat=heartbeat)
+        self._topology = topology
+        self._confirms = confirms
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _open(self):
+        pooled = _PooledChannel(self._parameters, self._topology, self._confirms)
+        with self._lock:
+            self._opened += 1
+            PUBLISHER_POOL_SIZE.set(self._opened)
+        return pooled
+
+    def _discard(self, pooled):
+        pooled.close()
+        with self._lock:
+            self._opened -= 1
+            PUBLISHER_POOL_SIZE.set(self._opened)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    pooled = self._open()
+                    break
+                try:
+                    # Обслуживаем heartbeat простаивавшего соединения и проверяем, что оно живо
+                    pooled.connection.process_data_events(0)
+                except AMQPError:
+                    self._discard(pooled)
+                    continue
+                if pooled.is_open():
+                    break
+                self._discard(pooled)
+        except Exception:
+            self._slots.release()
+            raise
+        PUBLISHER_POOL_IN_USE.inc()
+        return pooled
+
+    def _release(self, pooled, broken=False):
+        if broken or not pooled.is_open():
+            self._discard(pooled)
+        else:
+            self._idle.put(pooled)
+        PUBLISHER_POOL_IN_USE.dec()
+        self._slots.release()
+
+    def publish(self, routing_key, body, properties=None, exchange=''):
+        self.publish_batch(routing_key, [body], properties, exchange)
+
+    # Публикация пачки сообщений через одно соединение. В режиме подтверждений
+    # пачка считается опубликованной только после подтверждения каждого сообщения;
+    # при обрыве соединения неподтверждённый хвост пачки отправляется повторно.
+    def publish_batch(self, routing_key, bodies, properties=None, exchange=''):
+        bodies = list(bodies)
+        sent = 0
+        start = time.perf_counter()
+        for attempt in range(2):
+            pooled = self._acquire()
+            try:
+                while sent < len(bodies):
+                    pooled.channel.basic_publish(exchange=exchange, routing_key=routing_key, body=bodies[sent],
+                                                 properties=properties)
+                    sent += 1
+            except AMQPError:
+                self._release(pooled, broken=True)
+                if attempt == 1:
+                    raise
+                continue
+            self._release(pooled)
+            break
+        PUBLISH_LATENCY.labels(routing_key=routing_key).observe(time.perf_counter() - start)
+
+    def close(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
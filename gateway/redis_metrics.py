@@ -0,0 +1,70 @@
+import time
+
+import redis
+import redis.asyncio as aioredis
+from prometheus_client import Histogram
+
+REDIS_COMMAND_LATENCY = Histogram('redis_command_latency_seconds', 'Время выполнения команды Redis', ['command'],
+                                  buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+
+
+def _command_name(args):
+    name = args[0]
+    if isinstance(name, bytes):
+        name = name.decode()
+    return str(name).lower()
+
+
+# Блокирующее чтение (XREADGROUP ... BLOCK) большую часть времени ждёт данных, а не Redis
+def _blocking(args):
+    return any(arg in ('BLOCK', b'BLOCK') for arg in args)
+
+
+def _observe(args, start):
+    if not _blocking(args):
+        REDIS_COMMAND_LATENCY.labels(command=_command_name(args)).observe(time.perf_counter() - start)
+
+
+# Клиент Redis, который замеряет время каждой команды (скрипты - как evalsha),
+# пайплайн замеряется целиком как команда "pipeline"
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe(args, start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _observe(('pipeline',), start)
+
+
+# То же для redis.asyncio
+class AsyncInstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe(args, start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return AsyncInstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class AsyncInstrumentedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe(('pipeline',), start)
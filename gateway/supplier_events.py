@@ -0,0 +1,263 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+from prometheus_client import Counter
+from redis.exceptions import RedisError, ResponseError
+
+# Поток событий изменения поставщиков, который domain-service пополняет после
+# каждого коммита (id, operation, version и запись поставщика для create/update)
+SUPPLIER_EVENTS_STREAM = 'suppliers:events'
+# Общая группа потребителей: каждое событие применяет к общему кешу одна реплика шлюза,
+# локальные копии остальных реплик сбрасываются через pub/sub
+SUPPLIER_EVENTS_GROUP = 'gateway-cache'
+
+EVENTS_APPLIED = Counter('supplier_events_applied_total', 'Количество применённых событий изменения поставщиков',
+                         ['operation'])
+EVENTS_FAILED = Counter('supplier_events_failed_total', 'Количество событий, которые не удалось применить')
+EVENTS_DROPPED = Counter('supplier_events_dropped_total',
+                         'Количество событий, подтверждённых без применения после max_deliveries попыток')
+
+
+def consumer_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# Записи потока, обрезанные по MAXLEN до подтверждения, приходят без полей и пропускаются
+def parse_events(entries):
+    return [{
+        'id': int(fields[b'id']),
+        'operation': fields[b'operation'].decode(),
+        'version': int(fields[b'version']),
+        'supplier': fields.get(b'supplier', b'').decode() or None,
+    } for _, fields in entries if fields]
+
+
+def _group_exists(error):
+    return str(error).startswith('BUSYGROUP')
+
+
+# Чтение событий в фоновом потоке (синхронный шлюз). Сначала дочитываются свои
+# неподтверждённые события (после перезапуска), затем новые; события реплик,
+# которые перестали отвечать, забираются через XAUTOCLAIM после claim_idle_ms.
+# Событие подтверждается (XACK) только после того, как handler его применил.
+# Если пачка не применяется, события применяются по одному (handler проверяет
+# версии, поэтому порядок не важен); событие, которое не удалось применить
+# max_deliveries раз (счётчик доставок из XPENDING), записывается в лог и
+# подтверждается, чтобы одно испорченное событие не останавливало обновление кеша.
+class SupplierEventListener:
+    def __init__(self, redis_client, handler, stream=SUPPLIER_EVENTS_STREAM, group=SUPPLIER_EVENTS_GROUP,
+                 consumer=None, batch_size=100, block_ms=5000, claim_idle_ms=60000, max_deliveries=5):
+        self._redis = redis_client
+        self._handler = handler
+        self._stream = stream
+        self._group = group
+        self._consumer = consumer or consumer_name()
+        self._batch_size = batch_size
+        self._block_ms = block_ms
+        self._claim_idle_ms = claim_idle_ms
+        self._max_deliveries = max_deliveries
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='supplier-events', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _ensure_group(self):
+        try:
+            self._redis.xgroup_create(self._stream, self._group, id='$', mkstream=True)
+        except ResponseError as e:
+            if not _group_exists(e):
+                raise
+
+    def _handle(self, entries):
+        events = parse_events(entries)
+        self._handler(events)
+        self._redis.xack(self._stream, self._group, *[entry_id for entry_id, _ in entries])
+        for event in events:
+            EVENTS_APPLIED.labels(operation=event['operation']).inc()
+
+    def _apply(self, entries):
+        if not entries:
+            return
+        try:
+            self._handle(entries)
+        except RedisError:
+            raise
+        except Exception as e:
+            if len(entries) == 1:
+                self._drop_if_exhausted(entries[0], e)
+                raise
+            print(f"Ошибка применения пачки событий изменения поставщиков ({e}), применяем по одному")
+            error = None
+            for entry in entries:
+                try:
+                    self._handle([entry])
+                except RedisError:
+                    raise
+                except Exception as e:
+                    if not self._drop_if_exhausted(entry, e):
+                        error = e
+            if error is not None:
+                raise error
+
+    # Событие, которое уже max_deliveries раз не удалось применить, подтверждается без применения
+    def _drop_if_exhausted(self, entry, error):
+        entry_id, fields = entry
+        pending = self._redis.xpending_range(self._stream, self._group, min=entry_id, max=entry_id, count=1)
+        if not pending or pending[0]['times_delivered'] < self._max_deliveries:
+            return False
+        print(f"Событие {entry_id!r} пропущено после {self._max_deliveries} попыток: {error}; {fields!r}")
+        self._redis.xack(self._stream, self._group, entry_id)
+        EVENTS_DROPPED.inc()
+        return True
+
+    def _claim(self):
+        _, entries, *_ = self._redis.xautoclaim(self._stream, self._group, self._consumer, self._claim_idle_ms,
+                                                start_id='0-0', count=self._batch_size)
+        self._apply(entries)
+
+    def _run(self):
+        pending, ready = True, False
+        next_claim = 0
+        while not self._stopping.is_set():
+            try:
+                if not ready:
+                    self._ensure_group()
+                    ready = True
+                if time.monotonic() >= next_claim:
+                    self._claim()
+                    next_claim = time.monotonic() + self._claim_idle_ms / 2000
+                response = self._redis.xreadgroup(self._group, self._consumer, {self._stream: '0' if pending else '>'},
+                                                  count=self._batch_size, block=None if pending else self._block_ms)
+                entries = response[0][1] if response else []
+                if pending and not entries:
+                    pending = False
+                self._apply(entries)
+            except RedisError as e:
+                # Группа или поток могли пропасть вместе с данными Redis: при повторе создаются заново
+                print(f"Ошибка чтения событий изменения поставщиков: {e}")
+                ready = False
+                self._stopping.wait(1)
+            except Exception as e:
+                # Неприменённые события остаются неподтверждёнными и читаются повторно
+                EVENTS_FAILED.inc()
+                print(f"Ошибка применения событий изменения поставщиков: {e}")
+                pending = True
+                self._stopping.wait(1)
+
+
+# То же для шлюза на asyncio (redis.asyncio): чтение идёт в фоновой задаче, handler - корутина
+class AsyncSupplierEventListener:
+    def __init__(self, redis_client, handler, stream=SUPPLIER_EVENTS_STREAM, group=SUPPLIER_EVENTS_GROUP,
+                 consumer=None, batch_size=100, block_ms=5000, claim_idle_ms=60000, max_deliveries=5):
+        self._redis = redis_client
+        self._handler = handler
+        self._stream = stream
+        self._group = group
+        self._consumer = consumer or consumer_name()
+        self._batch_size = batch_size
+        self._block_ms = block_ms
+        self._claim_idle_ms = claim_idle_ms
+        self._max_deliveries = max_deliveries
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _ensure_group(self):
+        try:
+            await self._redis.xgroup_create(self._stream, self._group, id='$', mkstream=True)
+        except ResponseError as e:
+            if not _group_exists(e):
+                raise
+
+    async def _handle(self, entries):
+        events = parse_events(entries)
+        await self._handler(events)
+        await self._redis.xack(self._stream, self._group, *[entry_id for entry_id, _ in entries])
+        for event in events:
+            EVENTS_APPLIED.labels(operation=event['operation']).inc()
+
+    async def _apply(self, entries):
+        if not entries:
+            return
+        try:
+            await self._handle(entries)
+        except RedisError:
+            raise
+        except Exception as e:
+            if len(entries) == 1:
+                await self._drop_if_exhausted(entries[0], e)
+                raise
+            print(f"Ошибка применения пачки событий изменения поставщиков ({e}), применяем по одному")
+            error = None
+            for entry in entries:
+                try:
+                    await self._handle([entry])
+                except RedisError:
+                    raise
+                except Exception as e:
+                    if not await self._drop_if_exhausted(entry, e):
+                        error = e
+            if error is not None:
+                raise error
+
+    async def _drop_if_exhausted(self, entry, error):
+        entry_id, fields = entry
+        pending = await self._redis.xpending_range(self._stream, self._group, min=entry_id, max=entry_id, count=1)
+        if not pending or pending[0]['times_delivered'] < self._max_deliveries:
+            return False
+        print(f"Событие {entry_id!r} пропущено после {self._max_deliveries} попыток: {error}; {fields!r}")
+        await self._redis.xack(self._stream, self._group, entry_id)
+        EVENTS_DROPPED.inc()
+        return True
+
+    async def _claim(self):
+        _, entries, *_ = await self._redis.xautoclaim(self._stream, self._group, self._consumer,
+                                                      self._claim_idle_ms, start_id='0-0', count=self._batch_size)
+        await self._apply(entries)
+
+    async def _run(self):
+        pending, ready = True, False
+        next_claim = 0
+        while True:
+            try:
+                if not ready:
+                    await self._ensure_group()
+                    ready = True
+                if time.monotonic() >= next_claim:
+                    await self._claim()
+                    next_claim = time.monotonic() + self._claim_idle_ms / 2000
+                response = await self._redis.xreadgroup(self._group, self._consumer,
+                                                        {self._stream: '0' if pending else '>'},
+                                                        count=self._batch_size,
+                                                        block=None if pending else self._block_ms)
+                entries = response[0][1] if response else []
+                if pending and not entries:
+                    pending = False
+                await self._apply(entries)
+            except RedisError as e:
+                print(f"Ошибка чтения событий изменения поставщиков: {e}")
+                ready = False
+                await asyncio.sleep(1)
+            except Exception as e:
+                EVENTS_FAILED.inc()
+                print(f"Ошибка применения событий изменения поставщиков: {e}")
+                pending = True
+                await asyncio.sleep(1)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import threading
+
+import grpc
+from prometheus_client import Counter, Gauge
+
+from cache import CACHE_HITS, build_cache_entry
+from proto import service_pb2
+
+# В многопроцессном режиме: 0, если копия не готова хотя бы в одном живом процессе
+SUPPLIER_VIEW_READY = Gauge('supplier_view_ready', 'Копия списка поставщиков в памяти актуальна (1) или нет (0)',
+                            multiprocess_mode='livemin')
+SUPPLIER_VIEW_SIZE = Gauge('supplier_view_size', 'Количество поставщиков в копии списка в памяти',
+                           multiprocess_mode='livemax')
+SUPPLIER_VIEW_SNAPSHOTS = Counter('supplier_view_snapshots_total', 'Количество полных снимков, полученных WatchSuppliers')
+SUPPLIER_VIEW_RECONNECTS = Counter('supplier_view_reconnects_total', 'Количество переподключений потока WatchSuppliers')
+
+SUPPLIER_FIELDS = ('company_name', 'contact_person', 'phone')
+
+
+# Копия таблицы поставщиков в памяти процесса, которую поддерживает поток
+# WatchSuppliers: сначала снимок, затем изменения. Изменение применяется, только
+# если его версия не меньше версии строки (или удаления), поэтому изменения,
+# повторённые после снимка, ничего не портят. Снимок собирается отдельно и
+# подменяет копию целиком, когда приходит его последняя пачка (live). Позиция
+# для возобновления запоминается только вне снимка: поток, оборванный посреди
+# снимка, начинается заново. Готовые тела ответов хранятся по набору полей до
+# следующего изменения.
+class SupplierViewState:
+    def __init__(self, encodings=('gzip',), min_compress_size=1024):
+        self._encodings = tuple(encodings)
+        self._min_compress_size = min_compress_size
+        self._suppliers = {}
+        self._deleted = {}
+        self._staging = None
+        self._position = ''
+        self._generation = 0
+        self._responses = {}
+        self._connected = False
+        self._lock = threading.Lock()
+
+    @property
+    def position(self):
+        return self._position
+
+    # Копия отвечает на запросы, только пока поток открыт (от него пришло сообщение) и снимок получен целиком
+    @property
+    def ready(self):
+        return self._connected and self._staging is None and bool(self._position)
+
+    def disconnected(self):
+        with self._lock:
+            self._connected = False
+            self._staging = None
+        SUPPLIER_VIEW_READY.set(0)
+
+    def apply(self, message):
+        with self._lock:
+            self._connected = True
+            if message.reset:
+                self._staging = ({}, {})
+            suppliers, deleted = self._staging or (self._suppliers, self._deleted)
+            for change in message.changes:
+                supplier_id = change.supplier.id
+                current = suppliers[supplier_id][0] if supplier_id in suppliers else deleted.get(supplier_id, 0)
+                if change.version < current:
+                    continue
+                if change.operation == service_pb2.SupplierChange.DELETE:
+                    suppliers.pop(supplier_id, None)
+                    deleted[supplier_id] = change.version
+                else:
+                    suppliers[supplier_id] = (change.version, {'id': supplier_id, **{
+                        field: getattr(change.supplier, field) for field in SUPPLIER_FIELDS}})
+                    deleted.pop(supplier_id, None)
+            if message.live and self._staging is not None:
+                self._suppliers, self._deleted = self._staging
+                self._staging = None
+                SUPPLIER_VIEW_SNAPSHOTS.inc()
+            if self._staging is None:
+                self._position = message.version
+            if message.changes or message.reset:
+                self._generation += 1
+                self._responses = {}
+            ready = self.ready
+        SUPPLIER_VIEW_SIZE.set(len(self._suppliers))
+        SUPPLIER_VIEW_READY.set(1 if ready else 0)
+
+    def cached(self, fields):
+        entry = self._responses.get(fields)
+        if entry is not None:
+            CACHE_HITS.labels(tier='view').inc()
+        return entry
+
+    # Тело ответа в формате GET /suppliers (по возрастанию id); собирается вне
+    # блокировки и сохраняется, если за это время копия не изменилась
+    def build(self, fields):
+        with self._lock:
+            generation = self._generation
+            rows = [supplier for _, supplier in self._suppliers.values()]
+        rows.sort(key=lambda supplier: supplier['id'])
+        body = json.dumps({"data": [{"id": s["id"], **{field: s[field] for field in fields}} for s in rows]})
+        entry = build_cache_entry(body, 0, self._encodings, self._min_compress_size)
+        with self._lock:
+            if generation == self._generation:
+                self._responses[fields] = entry
+        return entry
+
+    def response(self, fields):
+        return self.cached(fields) or self.build(fields)
+
+
+# Поток WatchSuppliers в фоновом потоке (синхронный шлюз). После обрыва поток
+# открывается заново с запомненной позиции (domain-service повторит снимок, если
+# её уже нет в потоке событий) с экспоненциальной задержкой; пока он не
+# восстановлен, ready ложно и список читается обычным путём через Redis и gRPC.
+# Дедлайн маршрута watch_suppliers ограничивает один поток, после него поток
+# открывается сразу и с новым снимком: событие, потерянное между коммитом и
+# публикацией (сбой Redis или domain-service), иначе оставило бы копию неверной
+# навсегда, а так её возраст ограничен дедлайном, как возраст кеша в Redis - TTL.
+class SupplierView:
+    def __init__(self, domain_client, batch_size=0, encodings=('gzip',), min_compress_size=1024,
+                 retry_delay=1.0, max_retry_delay=30.0):
+        self._client = domain_client
+        self._batch_size = batch_size
+        self._state = SupplierViewState(encodings, min_compress_size)
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._stopping = threading.Event()
+        self._call = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._state.ready
+
+    def response(self, fields):
+        return self._state.response(fields)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='supplier-view', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._call is not None:
+            self._call.cancel()
+
+    def _run(self):
+        delay, resume = self._retry_delay, True
+        while not self._stopping.is_set():
+            since_version = self._state.position if resume else ''
+            request = service_pb2.WatchSuppliersRequest(since_version=since_version, batch_size=self._batch_size)
+            self._call = self._client.stream('WatchSuppliers', request, route='watch_suppliers')
+            try:
+                for message in self._call:
+                    self._state.apply(message)
+                    delay, resume = self._retry_delay, True
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    delay, resume = 0, False
+                elif not self._stopping.is_set():
+                    print(f"Поток WatchSuppliers прерван: {e.code()} {e.details()}")
+            except Exception as e:
+                print(f"Ошибка применения изменений поставщиков: {e}")
+            finally:
+                self._call.cancel()
+                self._state.disconnected()
+            SUPPLIER_VIEW_RECONNECTS.inc()
+            self._stopping.wait(delay)
+            delay = min(max(delay, self._retry_delay) * 2, self._max_retry_delay)
+
+
+# То же для шлюза на asyncio: поток читается в фоновой задаче, тело ответа
+# собирается в пуле потоков, чтобы сжатие не останавливало цикл событий
+class AsyncSupplierView:
+    def __init__(self, domain_client, batch_size=0, encodings=('gzip',), min_compress_size=1024,
+                 retry_delay=1.0, max_retry_delay=30.0):
+        self._client = domain_client
+        self._batch_size = batch_size
+        self._state = SupplierViewState(encodings, min_compress_size)
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._task = None
+
+    @property
+    def ready(self):
+        return self._state.ready
+
+    async def response(self, fields):
+        return self._state.cached(fields) or await asyncio.to_thread(self._state.build, fields)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay, resume = self._retry_delay, True
+        while True:
+            since_version = self._state.position if resume else ''
+            request = service_pb2.WatchSuppliersRequest(since_version=since_version, batch_size=self._batch_size)
+            call = self._client.stream('WatchSuppliers', request, route='watch_suppliers')
+            try:
+                async for message in call:
+                    self._state.apply(message)
+                    delay, resume = self._retry_delay, True
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    delay, resume = 0, False
+                else:
+                    print(f"Поток WatchSuppliers прерван: {e.code()} {e.details()}")
+            except Exception as e:
+                print(f"Ошибка применения изменений поставщиков: {e}")
+            finally:
+                call.cancel()
+                self._state.disconnected()
+            SUPPLIER_VIEW_RECONNECTS.inc()
+            await asyncio.sleep(delay)
+            delay = min(max(delay, self._retry_delay) * 2, self._max_retry_delay)
@@ -0,0 +1,277 @@
+import json
+import os
+
+import grpc
+from google.protobuf import field_mask_pb2
+
+from cache import content_etag
+from proto import service_pb2
+
+# Маршруты /suppliers без ввода-вывода, общие для app.py (Flask) и async_app.py
+# (Quart): разбор параметров, ключи кеша, запросы к domain-service, тела ответов
+# и пересборка списка из записей. Шлюзы только выполняют вызовы Redis, gRPC и
+# RabbitMQ - каждый по-своему (в потоке или через await)
+
+# Множество ключей закешированных страниц, чтобы сбрасывать все страницы разом
+SUPPLIERS_PAGES_KEY = 'suppliers:pages'
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+
+# Поля поставщика, которые можно запросить через ?fields= (id возвращается всегда)
+SUPPLIER_FIELDS = ('company_name', 'contact_person', 'phone')
+DEFAULT_LIST_FIELDS = ('company_name',)
+
+# Поиск (?q=&phone=): популярные запросы (не меньше SEARCH_POPULAR_HITS за окно
+# SEARCH_POPULAR_WINDOW секунд) кешируются под своими ключами с коротким TTL,
+# остальные идут сразу в domain-service и не вытесняют из кеша полезные записи
+SUPPLIERS_SEARCHES_KEY = 'suppliers:searches'
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '15'))
+SEARCH_POPULAR_HITS = int(os.getenv('SEARCH_POPULAR_HITS', '3'))
+SEARCH_POPULAR_WINDOW = int(os.getenv('SEARCH_POPULAR_WINDOW', '60'))
+SEARCH_MATCH_MODES = {
+    'contains': service_pb2.SearchSuppliersRequest.SUBSTRING,
+    'prefix': service_pb2.SearchSuppliersRequest.PREFIX,
+}
+MAX_SEARCH_QUERY_LENGTH = 255
+
+# Если сброшенных записей больше этого числа, список перечитывается целиком
+MAX_MISSING_ENTRIES = int(os.getenv('CACHE_MAX_MISSING_ENTRIES', '50'))
+
+# Ответы, собранные из таблицы поставщиков: при событии изменения сбрасываются их локальные копии
+SUPPLIERS_LOCAL_KEYS = ('suppliers', 'suppliers:fields:*', 'suppliers:page:*', 'suppliers:search:*')
+
+# Тексты ошибок в параметрах запроса (ответ 400)
+FIELDS_ERROR = f"fields может содержать только id, {', '.join(SUPPLIER_FIELDS)}"
+PAGE_ERROR = f"limit должен быть от 1 до {MAX_PAGE_SIZE}, after - неотрицательный id"
+SEARCH_ERROR = f"нужен q (до {MAX_SEARCH_QUERY_LENGTH} символов) или phone, match - contains или prefix"
+EXPORT_ERROR = "batch_size должен быть неотрицательным числом, fields - списком полей поставщика"
+
+
+# Разбор ?fields=: поля в каноническом порядке (от него зависит ключ кеша) или None, если есть неизвестные
+def parse_fields(value, default=DEFAULT_LIST_FIELDS):
+    if value is None:
+        return default
+    fields = {field.strip() for field in value.split(',') if field.strip()} - {'id'}
+    if fields - set(SUPPLIER_FIELDS):
+        return None
+    return tuple(field for field in SUPPLIER_FIELDS if field in fields)
+
+
+def read_mask(fields):
+    return field_mask_pb2.FieldMask(paths=['id', *fields])
+
+
+# Поставщик (словарь или protobuf) с выбранными полями
+def project(supplier, fields):
+    if isinstance(supplier, dict):
+        return {"id": supplier["id"], **{field: supplier[field] for field in fields}}
+    return {"id": supplier.id, **{field: getattr(supplier, field) for field in fields}}
+
+
+def supplier_to_dict(supplier):
+    return {
+        "id": supplier.id,
+        "company_name": supplier.company_name,
+        "contact_person": supplier.contact_person,
+        "phone": supplier.phone,
+    }
+
+
+# Запись поставщика в кеше - все его поля в JSON
+def supplier_entry(supplier):
+    return json.dumps(supplier_to_dict(supplier))
+
+
+# Изменения записей (id, версия, поставщик) из пачки событий SupplierEventListener
+def event_changes(events):
+    return [(e['id'], e['version'], e['supplier']) for e in events]
+
+
+# Синхронный режим записи (заголовок X-Write-Mode: sync или ?sync=1): запрос идёт
+# напрямую в domain-service, клиент сразу получает сохранённого поставщика с id
+def sync_write_requested(headers, args):
+    return headers.get('X-Write-Mode', '').lower() == 'sync' or args.get('sync') in ('1', 'true')
+
+
+# Тело и код ответа на ошибку синхронной записи
+def sync_write_error(e, supplier_id=None):
+    if e.code() == grpc.StatusCode.NOT_FOUND:
+        return {"error": f"Поставщик {supplier_id} не найден"}, 404
+    if e.code() in (grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.UNAVAILABLE):
+        return {"error": "Сервис временно перегружен, повторите запрос позже"}, 503
+    print(f"Ошибка при синхронной записи поставщика: {e}")
+    return {"error": "Ошибка сервера, не удалось сохранить поставщика"}, 500
+
+
+# Вариант закешированного ответа для запроса: (тело, etag, заголовки). Тело None -
+# у клиента уже есть один из вариантов (304); иначе готовое тело отдаётся как есть,
+# сжатое подходящим клиенту способом
+def response_variant(entry, if_none_match, accept_encodings):
+    etag = entry['etag']
+    variants = [etag, f"{etag}-br", f"{etag}-gzip"]
+    if any(if_none_match.contains(tag) for tag in variants):
+        return None, etag, {}
+
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    body = entry['body']
+    for encoding in ('br', 'gzip'):
+        if encoding in entry and accept_encodings[encoding]:
+            body = entry[encoding]
+            etag = f"{etag}-{encoding}"
+            headers['Content-Encoding'] = encoding
+            break
+    return body, etag, headers
+
+
+# Ответ, который не кешируется (поставщик по id, непопулярный поиск), в формате записи кеша
+def uncached_entry(body):
+    return {'body': body, 'etag': content_etag(body)}
+
+
+# Ответ GET /suppliers/<id> из записи поставщика
+def supplier_response_entry(entry):
+    return uncached_entry(b'{"data": ' + entry + b'}')
+
+
+# Ключ кеша полного списка с проекцией fields и группа, в которой он сбрасывается
+def list_cache_key(fields):
+    if fields == DEFAULT_LIST_FIELDS:
+        return 'suppliers', None
+    return f"suppliers:fields:{','.join(fields)}", SUPPLIERS_PAGES_KEY
+
+
+def list_body(suppliers, fields):
+    return json.dumps({"data": [project(s, fields) for s in suppliers]})
+
+
+# Полный список из ответа GetSuppliers: поставщики, их записи и версии
+def all_suppliers(response):
+    suppliers = [supplier_to_dict(s) for s in response.suppliers]
+    entries = {s["id"]: json.dumps(s) for s in suppliers}
+    return suppliers, entries, {s.id: s.version for s in response.suppliers}
+
+
+def fetched_event(suppliers):
+    return json.dumps({
+        "event": "get_suppliers",
+        "status": "fetched_from_service",
+        "data": [{"id": s["id"], "company_name": s["company_name"]} for s in suppliers]
+    })
+
+
+# Пересборка списка из закешированных записей. Шлюз дочитывает из domain-service
+# поставщиков из missing (add или drop, если поставщик удалён), затем хвост таблицы
+# страницами с tail_request, пока add_page возвращает следующий запрос, и сохраняет
+# loaded, versions и ids
+class SupplierListRebuild:
+    def __init__(self, ids, cached_entries):
+        self._ids = ids
+        self.entries = dict(zip(ids, cached_entries))
+        self.missing = [supplier_id for supplier_id, entry in self.entries.items() if entry is None]
+        self.loaded, self.versions = {}, {}
+        # Новые поставщики получают id больше наибольшего известного: дочитываем только хвост таблицы
+        self._after = max(ids) if ids else 0
+
+    @property
+    def too_many_missing(self):
+        return len(self.missing) > MAX_MISSING_ENTRIES
+
+    def add(self, supplier):
+        self.loaded[supplier.id] = self.entries[supplier.id] = supplier_entry(supplier)
+        self.versions[supplier.id] = supplier.version
+
+    def drop(self, supplier_id):
+        del self.entries[supplier_id]
+
+    def tail_request(self):
+        return service_pb2.GetSuppliersPageRequest(page_size=MAX_PAGE_SIZE,
+                                                   page_token=str(self._after) if self._after else '')
+
+    # Следующий запрос хвоста или None, если страница последняя
+    def add_page(self, page):
+        for supplier in page.suppliers:
+            self.add(supplier)
+        if not page.next_page_token:
+            return None
+        self._after = int(page.next_page_token)
+        return self.tail_request()
+
+    # Новый список id или None, если он не изменился
+    @property
+    def ids(self):
+        ids = list(self.entries)
+        return ids if ids != self._ids else None
+
+    def suppliers(self):
+        return [json.loads(entry) for entry in self.entries.values()]
+
+
+# Разбор ?limit=&after=: (limit, after) или None, если значения недопустимы
+def parse_page(args):
+    limit = args.get('limit', '100')
+    after = args.get('after', '0')
+    limit = int(limit) if limit.isdigit() else None
+    after = int(after) if after.isdigit() else None
+    if limit is None or not 1 <= limit <= MAX_PAGE_SIZE or after is None:
+        return None
+    return limit, after
+
+
+# Страница (?limit=&after=): domain-service выбирает из таблицы только запрошенные столбцы
+def page_request(limit, after, fields):
+    return service_pb2.GetSuppliersPageRequest(page_size=limit, page_token=str(after) if after else '',
+                                               read_mask=read_mask(fields))
+
+
+def page_cache_key(limit, after, fields):
+    return f"suppliers:page:{after}:{limit}:{','.join(fields)}"
+
+
+# Тело страницы (списка или результатов поиска) со ссылкой на следующую
+def page_body(response, fields):
+    return json.dumps({
+        "data": [project(s, fields) for s in response.suppliers],
+        "next": int(response.next_page_token) if response.next_page_token else None,
+    })
+
+
+# Разбор поиска ?q=&match=contains|prefix&phone=: (q, match, phone) или None.
+# q ищется без учёта регистра в company_name и contact_person, phone сравнивается точно
+def parse_search(args):
+    query = args.get('q', '').strip()
+    phone = args.get('phone', '').strip()
+    match = args.get('match', 'contains')
+    if not (query or phone) or len(query) > MAX_SEARCH_QUERY_LENGTH or match not in SEARCH_MATCH_MODES:
+        return None
+    return query, match, phone
+
+
+def search_request(search, limit, after, fields):
+    query, match, phone = search
+    return service_pb2.SearchSuppliersRequest(query=query, match=SEARCH_MATCH_MODES[match], phone=phone,
+                                              page_size=limit, page_token=str(after) if after else '',
+                                              read_mask=read_mask(fields))
+
+
+# Регистр q на результат не влияет, поэтому в ключ идёт строка в нижнем регистре
+def search_cache_key(search, limit, after, fields):
+    query, match, phone = search
+    params = json.dumps([query.lower(), match, phone, after, limit, fields])
+    return f"suppliers:search:{content_etag(params.encode('utf-8'))}"
+
+
+# Разбор параметров выгрузки ?batch_size=&fields=: (batch_size, fields) или None
+def parse_export(args):
+    batch_size = args.get('batch_size', '0')
+    fields = parse_fields(args.get('fields'), default=SUPPLIER_FIELDS)
+    if not batch_size.isdigit() or fields is None:
+        return None
+    return int(batch_size), fields
+
+
+def export_request(batch_size, fields):
+    return service_pb2.StreamSuppliersRequest(batch_size=batch_size, read_mask=read_mask(fields))
+
+
+# Пачка потока StreamSuppliers строками NDJSON
+def ndjson_lines(chunk, fields):
+    return ''.join(json.dumps(project(s, fields)) + '\n' for s in chunk.suppliers)
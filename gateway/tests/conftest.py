@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Модули импортируются так же, как при запуске шлюза из его каталога;
+# сгенерированные gRPC-стабы импортируют service_pb2 из proto/ напрямую
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [GATEWAY_DIR, os.path.join(GATEWAY_DIR, 'proto')]
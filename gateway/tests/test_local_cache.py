@@ -0,0 +1,42 @@
+import time
+
+import fakeredis
+import pytest
+
+from cache import LocalCache, invalidated_keys
+
+
+@pytest.mark.parametrize('data, expected', [
+    (b'["suppliers", "suppliers:page:*"]', ['suppliers', 'suppliers:page:*']),
+    (b'[]', []),
+    (b'not json', None),
+    (b'"suppliers"', None),
+    (b'[1]', None),
+    (b'[null]', None),
+    (b'{"suppliers": 1}', None),
+])
+def test_invalidated_keys(data, expected):
+    assert invalidated_keys(data) == expected
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+# Испорченное сообщение не останавливает поток: следующий сброс применяется
+def test_listener_survives_malformed_messages():
+    redis_client = fakeredis.FakeRedis()
+    cache = LocalCache(redis_client)
+    # Подписавшись, поток очищает кеш: после этого сообщения уже не теряются
+    cache.set('warmup', b'x')
+    wait_for(lambda: cache.get('warmup') is None)
+
+    cache.set('suppliers', b'body')
+    redis_client.publish('cache:invalidate', '[1]')
+    redis_client.publish('cache:invalidate', '[null]')
+    redis_client.publish('cache:invalidate', '["suppliers"]')
+    wait_for(lambda: cache.get('suppliers') is None)
+    assert cache._listener.is_alive()
@@ -0,0 +1,41 @@
+from collections import Counter
+
+import pytest
+
+from rabbitmq_publisher import jump_consistent_hash, shard_queue_name
+
+KEYS = range(1, 20001)
+
+
+# Шард поставщика должен совпадать у всех версий шлюза: иначе во время
+# обновления изменения одного поставщика попадут в разные очереди
+def test_known_shards_do_not_change():
+    assert [jump_consistent_hash(key, 8) for key in (0, 1, 2, 3, 42, 1000, 123456789)] == [0, 6, 6, 3, 2, 5, 7]
+
+
+def test_single_bucket_takes_every_key():
+    assert {jump_consistent_hash(key, 1) for key in KEYS} == {0}
+
+
+@pytest.mark.parametrize('buckets', [2, 8, 13])
+def test_keys_are_spread_evenly(buckets):
+    counts = Counter(jump_consistent_hash(key, buckets) for key in KEYS)
+    assert set(counts) == set(range(buckets))
+    expected = len(KEYS) / buckets
+    assert all(abs(count - expected) < expected * 0.1 for count in counts.values())
+
+
+# При добавлении шарда поставщик либо остаётся на месте, либо переезжает в новый шард
+@pytest.mark.parametrize('buckets', [1, 7, 8, 16])
+def test_adding_a_shard_moves_keys_only_to_it(buckets):
+    moved = 0
+    for key in KEYS:
+        before, after = jump_consistent_hash(key, buckets), jump_consistent_hash(key, buckets + 1)
+        if before != after:
+            assert after == buckets
+            moved += 1
+    assert moved < len(KEYS) / (buckets + 1) * 1.1
+
+
+def test_shard_queue_name():
+    assert shard_queue_name(3) == 'suppliers.shard.3'
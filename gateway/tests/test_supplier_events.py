@@ -0,0 +1,44 @@
+import time
+
+import fakeredis
+
+from supplier_events import SUPPLIER_EVENTS_GROUP, SUPPLIER_EVENTS_STREAM, SupplierEventListener
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def event(supplier_id):
+    return {'id': supplier_id, 'operation': 'update', 'version': 1, 'supplier': '{}'}
+
+
+# Событие, которое не применяется, подтверждается после max_deliveries попыток,
+# остальные события пачки применяются и подтверждаются
+def test_poison_event_is_acked_after_max_deliveries():
+    redis_client = fakeredis.FakeRedis()
+    applied = []
+
+    def handler(events):
+        if any(e['id'] == 2 for e in events):
+            raise ValueError('испорченное событие')
+        applied.extend(e['id'] for e in events)
+
+    listener = SupplierEventListener(redis_client, handler, consumer='test', block_ms=10, max_deliveries=2)
+    listener.start()
+    try:
+        wait_for(lambda: redis_client.exists(SUPPLIER_EVENTS_STREAM))
+        for supplier_id in (1, 2, 3):
+            redis_client.xadd(SUPPLIER_EVENTS_STREAM, event(supplier_id))
+
+        wait_for(lambda: sorted(applied) == [1, 3] and
+                 redis_client.xpending(SUPPLIER_EVENTS_STREAM, SUPPLIER_EVENTS_GROUP)['pending'] == 0)
+
+        redis_client.xadd(SUPPLIER_EVENTS_STREAM, event(4))
+        wait_for(lambda: 4 in applied)
+        assert listener._thread.is_alive()
+    finally:
+        listener.stop()
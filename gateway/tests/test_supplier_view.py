@@ -0,0 +1,62 @@
+import grpc
+
+from proto import service_pb2
+from supplier_view import SupplierView
+
+
+class WatchError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._code.name
+
+
+# Снимок из одного поставщика, после которого поток обрывается с ошибкой code
+class Watch:
+    def __init__(self, code, version):
+        self._code = code
+        self._version = version
+
+    def __iter__(self):
+        supplier = service_pb2.Supplier(id=1, company_name='Acme', version=1)
+        yield service_pb2.SupplierChanges(changes=[service_pb2.SupplierChange(supplier=supplier, version=1)],
+                                          version=self._version, reset=True, live=True)
+        raise WatchError(self._code)
+
+    def cancel(self):
+        pass
+
+
+class FakeDomainClient:
+    def __init__(self, view, codes):
+        self.view = view
+        self.codes = list(codes)
+        self.requested = []
+
+    def stream(self, method, request, route=None):
+        self.requested.append(request.since_version)
+        if not self.codes:
+            self.view.stop()
+            return Watch(grpc.StatusCode.CANCELLED, '9-0')
+        return Watch(self.codes.pop(0), f'{len(self.requested)}-0')
+
+
+def watch_requests(codes):
+    view = SupplierView(None, retry_delay=0)
+    client = view._client = FakeDomainClient(view, codes)
+    view._run()
+    return client.requested
+
+
+# После обрыва (перезапуск domain-service) поток возобновляется с позиции копии
+def test_unplanned_reconnect_resumes_from_position():
+    assert watch_requests([grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.UNAVAILABLE]) == ['', '1-0', '2-0']
+
+
+# По дедлайну маршрута копия собирается заново, чтобы потерянные события не копились в ней
+def test_deadline_reconnect_requests_new_snapshot():
+    assert watch_requests([grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.UNAVAILABLE]) == ['', '', '2-0']
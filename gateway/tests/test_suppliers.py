@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from werkzeug.datastructures import Accept, ETags
+
+from proto import service_pb2
+from suppliers import (MAX_MISSING_ENTRIES, MAX_PAGE_SIZE, SupplierListRebuild, parse_fields, parse_page,
+                       parse_search, response_variant, search_cache_key, supplier_entry)
+
+
+def supplier(supplier_id, name=None):
+    return service_pb2.Supplier(id=supplier_id, company_name=name or f'Company {supplier_id}', version=1)
+
+
+def page(ids, next_page_token=''):
+    return service_pb2.SuppliersPage(suppliers=[supplier(i) for i in ids], next_page_token=next_page_token)
+
+
+def test_parse_fields_keeps_canonical_order():
+    assert parse_fields(None) == ('company_name',)
+    assert parse_fields('phone, id,company_name') == ('company_name', 'phone')
+    assert parse_fields('company_name,password') is None
+
+
+@pytest.mark.parametrize('args, expected', [
+    ({}, (100, 0)),
+    ({'limit': '5', 'after': '10'}, (5, 10)),
+    ({'limit': '0'}, None),
+    ({'limit': str(MAX_PAGE_SIZE + 1)}, None),
+    ({'after': '-1'}, None),
+])
+def test_parse_page(args, expected):
+    assert parse_page(args) == expected
+
+
+def test_parse_search():
+    assert parse_search({'q': ' Acme '}) == ('Acme', 'contains', '')
+    assert parse_search({'phone': '123', 'match': 'prefix'}) == ('', 'prefix', '123')
+    assert parse_search({'q': ' '}) is None
+    assert parse_search({'q': 'Acme', 'match': 'regex'}) is None
+
+
+# Регистр q на результат не влияет, поэтому запросы делят одну запись кеша
+def test_search_cache_key_ignores_case():
+    fields = ('company_name',)
+    assert search_cache_key(('ACME', 'contains', ''), 10, 0, fields) == \
+        search_cache_key(('acme', 'contains', ''), 10, 0, fields)
+    assert search_cache_key(('acme', 'contains', ''), 10, 0, fields) != \
+        search_cache_key(('acme', 'prefix', ''), 10, 0, fields)
+
+
+def test_response_variant():
+    entry = {'body': b'plain', 'gzip': b'zipped', 'etag': 'abc'}
+    assert response_variant(entry, ETags(['abc-gzip']), Accept()) == (None, 'abc', {})
+
+    body, etag, headers = response_variant(entry, ETags(), Accept([('gzip', 1), ('br', 1)]))
+    assert (body, etag, headers['Content-Encoding']) == (b'zipped', 'abc-gzip', 'gzip')
+
+    body, etag, headers = response_variant(entry, ETags(), Accept())
+    assert (body, etag) == (b'plain', 'abc') and 'Content-Encoding' not in headers
+
+
+# Сброшенные записи дочитываются по одной, удалённые выпадают из списка, новые
+# поставщики дочитываются страницами после наибольшего известного id
+def test_rebuild_merges_missing_entries_and_tail():
+    rebuild = SupplierListRebuild([1, 2, 3], [supplier_entry(supplier(1)), None, None])
+    assert rebuild.missing == [2, 3]
+    rebuild.add(supplier(2, 'Renamed'))
+    rebuild.drop(3)
+
+    assert rebuild.tail_request().page_token == '3'
+    next_request = rebuild.add_page(page([4, 5], next_page_token='5'))
+    assert next_request.page_token == '5'
+    assert rebuild.add_page(page([6])) is None
+
+    assert [s['id'] for s in rebuild.suppliers()] == [1, 2, 4, 5, 6]
+    assert rebuild.suppliers()[1]['company_name'] == 'Renamed'
+    assert rebuild.ids == [1, 2, 4, 5, 6]
+    assert set(rebuild.loaded) == {2, 4, 5, 6}
+    assert json.loads(rebuild.loaded[2])['company_name'] == 'Renamed'
+
+
+def test_rebuild_without_changes_keeps_ids():
+    ids = [1, 2]
+    rebuild = SupplierListRebuild(ids, [supplier_entry(supplier(i)) for i in ids])
+    assert rebuild.add_page(page([])) is None
+    assert rebuild.ids is None and rebuild.loaded == {}
+
+
+def test_rebuild_gives_up_on_too_many_missing_entries():
+    ids = list(range(1, MAX_MISSING_ENTRIES + 2))
+    assert SupplierListRebuild(ids, [None] * len(ids)).too_many_missing
+    assert not SupplierListRebuild(ids[:-1], [None] * (len(ids) - 1)).too_many_missing
+
+
+def test_empty_list_reads_table_from_start():
+    assert SupplierListRebuild([], []).tail_request().page_token == ''
@@ -0,0 +1,107 @@
+import os
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+# Сквозная трассировка: шлюз начинает трассировку на HTTP-запрос и передаёт её
+# контекст (W3C traceparent) в метаданных gRPC и в заголовках сообщений
+# RabbitMQ, domain-service продолжает её до фиксации транзакции.
+# TRACE_EXPORTER: none (выключена), file (JSON Lines в TRACE_FILE) или otlp
+# (OTLP/HTTP на TRACE_OTLP_ENDPOINT). Спаны отправляются пачками фоновым потоком
+# BatchSpanProcessor; размер очереди и пачки - стандартные переменные OTEL_BSP_*
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+TRACE_FILE = os.getenv('TRACE_FILE', '/tmp/traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://jaeger:4318/v1/traces')
+# Доля записываемых трассировок; решение принимает шлюз, domain-service ему следует
+TRACE_SAMPLE_RATIO = float(os.getenv('TRACE_SAMPLE_RATIO', '1.0'))
+
+# Пока setup_tracing не вызван (или трассировка выключена), спаны ничего не стоят и не передаются
+tracer = trace.get_tracer('gateway')
+
+
+# Спаны в файл, по строке JSON на спан. Пачка дописывается одним вызовом write
+# в режиме O_APPEND, поэтому рабочие процессы могут писать в один файл
+class JsonLinesSpanExporter(SpanExporter):
+    def __init__(self, path):
+        self._path = path
+
+    def export(self, spans):
+        data = ''.join(span.to_json(indent=None) + '\n' for span in spans).encode()
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Не удалось записать спаны в {self._path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def setup_tracing(service_name):
+    if TRACE_EXPORTER == 'none':
+        return
+    if TRACE_EXPORTER == 'otlp':
+        exporter = OTLPSpanExporter(endpoint=TRACE_OTLP_ENDPOINT)
+    else:
+        exporter = JsonLinesSpanExporter(TRACE_FILE)
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}),
+                              sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+# Заголовки с контекстом текущего спана (traceparent, tracestate)
+def trace_headers(carrier=None):
+    carrier = {} if carrier is None else carrier
+    propagate.inject(carrier)
+    return carrier
+
+
+# Метаданные gRPC-вызова; None, если передавать нечего
+def grpc_metadata():
+    return tuple(trace_headers().items()) or None
+
+
+# Спан входящего HTTP-запроса, текущий до end_request_span. Продолжает
+# трассировку клиента, если тот прислал traceparent
+def start_request_span(method, route, headers):
+    span = tracer.start_span(f'{method} {route}', context=propagate.extract(headers), kind=SpanKind.SERVER,
+                             attributes={'http.request.method': method, 'http.route': route})
+    return span, context.attach(trace.set_span_in_context(span))
+
+
+def end_request_span(span, token, status_code=None, error=None):
+    if status_code is not None:
+        span.set_attribute('http.response.status_code', status_code)
+        if status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+    if error is not None:
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+    context.detach(token)
+    span.end()
+
+
+# Спан вызова domain-service; метаданные для вызова берутся уже внутри него
+def grpc_client_span(method):
+    return tracer.start_as_current_span(f'SupplierService/{method}', kind=SpanKind.CLIENT,
+                                        attributes={'rpc.system': 'grpc', 'rpc.method': method})
+
+
+# Спан публикации в RabbitMQ; заголовки сообщения (trace_headers) собираются
+# внутри него, поэтому domain-service продолжает трассировку от публикации
+def publish_span(exchange, routing_key, message_type):
+    return tracer.start_as_current_span(f'{exchange} publish', kind=SpanKind.PRODUCER, attributes={
+        'messaging.system': 'rabbitmq', 'messaging.destination.name': exchange,
+        'messaging.rabbitmq.destination.routing_key': routing_key, 'messaging.message.type': message_type})
+